@@ -7,7 +7,7 @@ import Step3Shipping from './components/Steps/Step3Shipping';
 import Purchase from './components/Steps/Purchase';
 import Success from './components/Steps/Success';
 import Placeholder from './components/Placeholder';
-import { Shipment } from './types';
+import { ShipmentTotals } from './types';
 import { shipmentsAPI } from './services/api';
 import './App.css';
 
@@ -23,86 +23,52 @@ function UploadPage() {
 
 function Step2Page() {
   const navigate = useNavigate();
-  const [shipments, setShipments] = useState<Shipment[]>([]);
-
-  const loadShipments = useCallback(async () => {
-    try {
-      const response = await shipmentsAPI.getAll();
-      setShipments(response.data);
-    } catch (error) {
-      console.error('Failed to load shipments:', error);
-    }
-  }, []);
-
-  useEffect(() => {
-    loadShipments();
-  }, [loadShipments]);
-
-  const handleContinue = (updatedShipments: Shipment[]) => {
-    setShipments(updatedShipments);
-    navigate('/step3');
-  };
 
   return (
     <Step2Review
-      shipments={shipments}
       onBack={() => {
         if (window.confirm('Going back will lose your current data. Continue?')) {
           navigate('/upload');
         }
       }}
-      onContinue={handleContinue}
+      onContinue={() => navigate('/step3')}
     />
   );
 }
 
 function Step3Page() {
   const navigate = useNavigate();
-  const [shipments, setShipments] = useState<Shipment[]>([]);
-
-  const loadShipments = useCallback(async () => {
-    try {
-      const response = await shipmentsAPI.getAll();
-      setShipments(response.data);
-    } catch (error) {
-      console.error('Failed to load shipments:', error);
-    }
-  }, []);
-
-  useEffect(() => {
-    loadShipments();
-  }, [loadShipments]);
-
-  const handleContinue = (updatedShipments: Shipment[]) => {
-    setShipments(updatedShipments);
-    navigate('/purchase');
-  };
 
   return (
     <Step3Shipping
-      shipments={shipments}
       onBack={() => navigate('/step2')}
-      onContinue={handleContinue}
+      onContinue={() => navigate('/purchase')}
     />
   );
 }
 
-function PurchasePage() {
-  const navigate = useNavigate();
-  const [shipments, setShipments] = useState<Shipment[]>([]);
+function useShipmentTotals() {
+  const [summary, setSummary] = useState<ShipmentTotals>({ total: 0, count: 0 });
 
-  const loadShipments = useCallback(async () => {
+  const loadSummary = useCallback(async () => {
     try {
-      const response = await shipmentsAPI.getAll();
-      setShipments(response.data);
+      const response = await shipmentsAPI.getTotalPrice();
+      setSummary(response.data);
     } catch (error) {
-      console.error('Failed to load shipments:', error);
+      console.error('Failed to load shipment totals:', error);
     }
   }, []);
 
   useEffect(() => {
-    loadShipments();
-  }, [loadShipments]);
+    loadSummary();
+  }, [loadSummary]);
+
+  return summary;
+}
+
+function PurchasePage() {
+  const navigate = useNavigate();
+  const summary = useShipmentTotals();
 
   const handleSuccess = () => {
     navigate('/success');
@@ -110,7 +76,7 @@ function PurchasePage() {
 
   return (
     <Purchase
-      shipments={shipments}
+      summary={summary}
       onBack={() => navigate('/step3')}
       onSuccess={handleSuccess}
     />
@@ -119,26 +85,13 @@ function PurchasePage() {
 
 function SuccessPage() {
   const navigate = useNavigate();
-  const [shipments, setShipments] = useState<Shipment[]>([]);
-
-  const loadShipments = useCallback(async () => {
-    try {
-      const response = await shipmentsAPI.getAll();
-      setShipments(response.data);
-    } catch (error) {
-      console.error('Failed to load shipments:', error);
-    }
-  }, []);
-
-  useEffect(() => {
-    loadShipments();
-  }, [loadShipments]);
+  const summary = useShipmentTotals();
 
   const handleNewUpload = () => {
     navigate('/upload');
   };
 
-  return <Success shipments={shipments} onNewUpload={handleNewUpload} />;
+  return <Success summary={summary} onNewUpload={handleNewUpload} />;
 }
 
 function AppContent() {
@@ -150,11 +103,7 @@ function AppContent() {
       const response = await shipmentsAPI.getTotalPrice();
       setTotalPrice(response.data.total);
     } catch (error) {
-      const response = await shipmentsAPI.getAll();
-      const total = response.data.reduce((sum: number, s: Shipment) => {
-        return sum + (s.shipping_price ? parseFloat(s.shipping_price) : 0);
-      }, 0);
-      setTotalPrice(total);
+      console.error('Failed to load total price:', error);
     }
   };
 
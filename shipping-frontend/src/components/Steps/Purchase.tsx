@@ -1,22 +1,20 @@
 import React, { useState } from 'react';
-import { Shipment } from '../../types';
+import { CursorPage, Shipment, ShipmentTotals } from '../../types';
 import { shipmentsAPI } from '../../services/api';
 import './Purchase.css';
 
 interface PurchaseProps {
-  shipments: Shipment[];
+  summary: ShipmentTotals;
   onBack: () => void;
   onSuccess: () => void;
 }
 
-const Purchase: React.FC<PurchaseProps> = ({ shipments, onBack, onSuccess }) => {
+const Purchase: React.FC<PurchaseProps> = ({ summary, onBack, onSuccess }) => {
   const [labelSize, setLabelSize] = useState<'letter' | '4x6'>('letter');
   const [acceptedTerms, setAcceptedTerms] = useState(false);
   const [isProcessing, setIsProcessing] = useState(false);
 
-  const totalPrice = shipments.reduce((sum, s) => {
-    return sum + (s.shipping_price ? parseFloat(s.shipping_price) : 0);
-  }, 0);
+  const totalPrice = summary.total;
 
   const handlePurchase = async () => {
     if (!acceptedTerms) {
@@ -29,12 +27,16 @@ const Purchase: React.FC<PurchaseProps> = ({ shipments, onBack, onSuccess }) =>
       // Simulate purchase - in real app, this would call purchase API
       await new Promise((resolve) => setTimeout(resolve, 2000));
       
-      // Update shipment statuses to purchased
-      await Promise.all(
-        shipments.map((s) =>
-          shipmentsAPI.update(s.id, { status: 'purchased' })
-        )
-      );
+      // Update shipment statuses to purchased, one page of shipments at a time
+      let cursor: string | null = null;
+      do {
+        const response: { data: CursorPage<Shipment> } = await shipmentsAPI.getPage(cursor);
+        const ids = response.data.results.map((s) => s.id);
+        if (ids.length > 0) {
+          await shipmentsAPI.bulkUpdate(ids, { status: 'purchased' });
+        }
+        cursor = response.data.next;
+      } while (cursor);
       
       onSuccess();
     } catch (error) {
@@ -90,7 +92,7 @@ const Purchase: React.FC<PurchaseProps> = ({ shipments, onBack, onSuccess }) =>
           <div className="summary-box">
             <div className="summary-row">
               <span>Number of Labels:</span>
-              <span>{shipments.length}</span>
+              <span>{summary.count}</span>
             </div>
             <div className="summary-row total">
               <span>Grand Total:</span>
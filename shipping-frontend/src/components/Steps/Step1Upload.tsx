@@ -1,16 +1,42 @@
-import React, { useState, useRef } from 'react';
-import { shipmentsAPI } from '../../services/api';
+import React, { useState, useRef, useEffect } from 'react';
+import { shipmentsAPI, importJobsAPI } from '../../services/api';
+import { ImportJob } from '../../types';
 import './Step1Upload.css';
 
+// How often to check on a queued import
+const POLL_INTERVAL_MS = 1000;
+
 interface Step1UploadProps {
-  onUploadSuccess: (shipments: any[]) => void;
+  onUploadSuccess: (job: ImportJob) => void;
 }
 
 const Step1Upload: React.FC<Step1UploadProps> = ({ onUploadSuccess }) => {
   const [isDragging, setIsDragging] = useState(false);
   const [isUploading, setIsUploading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [job, setJob] = useState<ImportJob | null>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
+  const mounted = useRef(true);
+
+  useEffect(() => {
+    mounted.current = true;
+    return () => {
+      mounted.current = false;
+    };
+  }, []);
+
+  // Polls the import job until the worker has finished with it
+  const waitForJob = async (queued: ImportJob) => {
+    let current = queued;
+    while (mounted.current && (current.status === 'queued' || current.status === 'running')) {
+      await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+      current = (await importJobsAPI.getById(current.id)).data;
+      if (mounted.current) {
+        setJob(current);
+      }
+    }
+    return current;
+  };
 
   const handleFileSelect = async (file: File) => {
     if (!file.name.endsWith('.csv')) {
@@ -20,14 +46,23 @@ const Step1Upload: React.FC<Step1UploadProps> = ({ onUploadSuccess }) => {
 
     setIsUploading(true);
     setError(null);
+    setJob(null);
 
     try {
-      const response = await shipmentsAPI.uploadCSV(file);
-      if (response.data.shipments && response.data.shipments.length > 0) {
-        onUploadSuccess(response.data.shipments);
+      // Large files are imported by the background worker; the request only queues them
+      const response = await shipmentsAPI.uploadCSVAsync(file);
+      setJob(response.data);
+      const finished = await waitForJob(response.data);
+      if (!mounted.current) {
+        return;
+      }
+      if (finished.status === 'failed') {
+        setError(finished.error || 'Failed to import CSV file');
+      } else if (finished.rows_created + finished.rows_updated + finished.rows_unchanged > 0) {
+        onUploadSuccess(finished);
       } else {
-        const errorMsg = response.data.errors?.length 
-          ? `No valid shipments found. Errors: ${response.data.errors.join(', ')}`
+        const errorMsg = finished.errors?.length 
+          ? `No valid shipments found. Errors: ${finished.errors.join(', ')}`
           : 'No valid shipments found in the CSV file';
         setError(errorMsg);
       }
@@ -37,9 +72,13 @@ const Step1Upload: React.FC<Step1UploadProps> = ({ onUploadSuccess }) => {
         || err.response?.data?.message
         || err.message
         || 'Failed to upload CSV file';
-      setError(errorMessage);
+      if (mounted.current) {
+        setError(errorMessage);
+      }
     } finally {
-      setIsUploading(false);
+      if (mounted.current) {
+        setIsUploading(false);
+      }
     }
   };
 
@@ -92,7 +131,13 @@ const Step1Upload: React.FC<Step1UploadProps> = ({ onUploadSuccess }) => {
           {isUploading ? (
             <div className="upload-status">
               <div className="spinner"></div>
-              <p>Uploading and processing CSV file...</p>
+              {job?.status === 'running' ? (
+                <p>Importing... {job.rows_parsed.toLocaleString()} rows processed</p>
+              ) : job?.status === 'queued' ? (
+                <p>Waiting for the import to start...</p>
+              ) : (
+                <p>Uploading CSV file...</p>
+              )}
             </div>
           ) : (
             <>
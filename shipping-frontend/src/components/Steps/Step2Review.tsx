@@ -1,18 +1,18 @@
 import React, { useState, useEffect } from 'react';
 import { Shipment, Address, Package, SavedAddress, SavedPackage } from '../../types';
 import { shipmentsAPI, addressesAPI, packagesAPI, savedAddressesAPI, savedPackagesAPI } from '../../services/api';
+import { useShipmentPages } from '../../hooks/useShipmentPages';
 import EditAddressModal from '../Modals/EditAddressModal';
 import EditPackageModal from '../Modals/EditPackageModal';
 import './Step2Review.css';
 
 interface Step2ReviewProps {
-  shipments: Shipment[];
   onBack: () => void;
-  onContinue: (shipments: Shipment[]) => void;
+  onContinue: () => void;
 }
 
-const Step2Review: React.FC<Step2ReviewProps> = ({ shipments: initialShipments, onBack, onContinue }) => {
-  const [shipments, setShipments] = useState<Shipment[]>(initialShipments);
+const Step2Review: React.FC<Step2ReviewProps> = ({ onBack, onContinue }) => {
+  const { shipments, setShipments, hasMore, isLoading, loadMore, reload: loadShipments } = useShipmentPages();
   const [selectedIds, setSelectedIds] = useState<Set<number>>(new Set());
   const [searchTerm, setSearchTerm] = useState('');
   const [editingAddress, setEditingAddress] = useState<{ shipmentId: number; type: 'from' | 'to' } | null>(null);
@@ -23,18 +23,8 @@ const Step2Review: React.FC<Step2ReviewProps> = ({ shipments: initialShipments,
 
   useEffect(() => {
     loadSavedData();
-    loadShipments();
   }, []);
 
-  const loadShipments = async () => {
-    try {
-      const response = await shipmentsAPI.getAll();
-      setShipments(response.data);
-    } catch (error) {
-      console.error('Failed to load shipments:', error);
-    }
-  };
-
   const loadSavedData = async () => {
     try {
       const [addresses, packages] = await Promise.all([
@@ -200,7 +190,7 @@ const Step2Review: React.FC<Step2ReviewProps> = ({ shipments: initialShipments,
           <button className="btn-secondary" onClick={onBack}>
             ← Back
           </button>
-          <button className="btn-primary" onClick={() => onContinue(shipments)}>
+          <button className="btn-primary" onClick={onContinue}>
             Continue →
           </button>
         </div>
@@ -334,6 +324,14 @@ const Step2Review: React.FC<Step2ReviewProps> = ({ shipments: initialShipments,
         </table>
       </div>
 
+      {hasMore && (
+        <div className="load-more">
+          <button className="btn-secondary" onClick={loadMore} disabled={isLoading}>
+            {isLoading ? 'Loading...' : 'Load more shipments'}
+          </button>
+        </div>
+      )}
+
       {editingAddress && (
         <EditAddressModal
           address={
@@ -1,28 +1,19 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { Shipment, ShippingService } from '../../types';
 import { shipmentsAPI, shippingServicesAPI } from '../../services/api';
+import { useShipmentPages } from '../../hooks/useShipmentPages';
 import './Step3Shipping.css';
 
 interface Step3ShippingProps {
-  shipments: Shipment[];
   onBack: () => void;
-  onContinue: (shipments: Shipment[]) => void;
+  onContinue: () => void;
 }
 
-const Step3Shipping: React.FC<Step3ShippingProps> = ({ shipments: initialShipments, onBack, onContinue }) => {
-  const [shipments, setShipments] = useState<Shipment[]>(initialShipments);
+const Step3Shipping: React.FC<Step3ShippingProps> = ({ onBack, onContinue }) => {
+  const { shipments, setShipments, hasMore, isLoading, loadMore, reload: loadShipments } = useShipmentPages();
   const [services, setServices] = useState<ShippingService[]>([]);
   const [selectedIds, setSelectedIds] = useState<Set<number>>(new Set());
 
-  const loadShipments = async () => {
-    try {
-      const response = await shipmentsAPI.getAll();
-      setShipments(response.data);
-    } catch (error) {
-      console.error('Failed to load shipments:', error);
-    }
-  };
-
   const loadServices = useCallback(async () => {
     try {
       const response = await shippingServicesAPI.getAll();
@@ -43,7 +34,7 @@ const Step3Shipping: React.FC<Step3ShippingProps> = ({ shipments: initialShipmen
     } catch (error) {
       console.error('Failed to load services:', error);
     }
-  }, [shipments]);
+  }, [shipments, loadShipments]);
 
   useEffect(() => {
     loadServices();
@@ -115,7 +106,7 @@ const Step3Shipping: React.FC<Step3ShippingProps> = ({ shipments: initialShipmen
           <button className="btn-secondary" onClick={onBack}>
             ← Back
           </button>
-          <button className="btn-primary" onClick={() => onContinue(shipments)}>
+          <button className="btn-primary" onClick={onContinue}>
             Continue to Purchase →
           </button>
         </div>
@@ -203,6 +194,14 @@ const Step3Shipping: React.FC<Step3ShippingProps> = ({ shipments: initialShipmen
           </tbody>
         </table>
       </div>
+
+      {hasMore && (
+        <div className="load-more">
+          <button className="btn-secondary" onClick={loadMore} disabled={isLoading}>
+            {isLoading ? 'Loading...' : 'Load more shipments'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -1,16 +1,14 @@
 import React from 'react';
-import { Shipment } from '../../types';
+import { ShipmentTotals } from '../../types';
 import './Success.css';
 
 interface SuccessProps {
-  shipments: Shipment[];
+  summary: ShipmentTotals;
   onNewUpload: () => void;
 }
 
-const Success: React.FC<SuccessProps> = ({ shipments, onNewUpload }) => {
-  const totalPrice = shipments.reduce((sum, s) => {
-    return sum + (s.shipping_price ? parseFloat(s.shipping_price) : 0);
-  }, 0);
+const Success: React.FC<SuccessProps> = ({ summary, onNewUpload }) => {
+  const totalPrice = summary.total;
 
   return (
     <div className="success-page">
@@ -23,7 +21,7 @@ const Success: React.FC<SuccessProps> = ({ shipments, onNewUpload }) => {
         <div className="success-summary">
           <div className="summary-item">
             <span className="summary-label">Labels Created:</span>
-            <span className="summary-value">{shipments.length}</span>
+            <span className="summary-value">{summary.count}</span>
           </div>
           <div className="summary-item">
             <span className="summary-label">Total Amount:</span>
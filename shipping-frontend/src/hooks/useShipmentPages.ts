@@ -0,0 +1,60 @@
+import { useState, useCallback, useRef, useEffect } from 'react';
+import { Shipment, CursorPage } from '../types';
+import { shipmentsAPI } from '../services/api';
+
+// Loads shipments one cursor page at a time instead of pulling the whole table.
+// loadMore fetches the next page; reload refetches as many rows as are loaded now,
+// so edits show up without dropping the pages the user has already scrolled through.
+export const useShipmentPages = () => {
+  const [shipments, setShipments] = useState<Shipment[]>([]);
+  const [next, setNext] = useState<string | null>(null);
+  const [isLoading, setIsLoading] = useState(false);
+  const loaded = useRef(0);
+
+  useEffect(() => {
+    loaded.current = shipments.length;
+  }, [shipments]);
+
+  const reload = useCallback(async () => {
+    setIsLoading(true);
+    try {
+      const wanted = Math.max(loaded.current, 1);
+      const results: Shipment[] = [];
+      let cursor: string | null = null;
+      do {
+        const response: { data: CursorPage<Shipment> } = await shipmentsAPI.getPage(cursor);
+        results.push(...response.data.results);
+        cursor = response.data.next;
+      } while (cursor && results.length < wanted);
+      setShipments(results);
+      setNext(cursor);
+    } catch (error) {
+      console.error('Failed to load shipments:', error);
+    } finally {
+      setIsLoading(false);
+    }
+  }, []);
+
+  const loadMore = useCallback(async () => {
+    if (!next) return;
+    setIsLoading(true);
+    try {
+      const response = await shipmentsAPI.getPage(next);
+      setShipments((current) => {
+        const seen = new Set(current.map((s) => s.id));
+        return [...current, ...response.data.results.filter((s) => !seen.has(s.id))];
+      });
+      setNext(response.data.next);
+    } catch (error) {
+      console.error('Failed to load more shipments:', error);
+    } finally {
+      setIsLoading(false);
+    }
+  }, [next]);
+
+  useEffect(() => {
+    reload();
+  }, [reload]);
+
+  return { shipments, setShipments, hasMore: next !== null, isLoading, loadMore, reload };
+};
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { Shipment, Address, Package, ShippingService, SavedAddress, SavedPackage } from '../types';
+import { Shipment, Address, Package, ShippingService, SavedAddress, SavedPackage, ImportJob, BulkValidationResult, QuoteRequest, QuoteResult, CursorPage, ShipmentChanges, ShipmentTotals } from '../types';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
@@ -12,7 +12,10 @@ const api = axios.create({
 
 // Shipments API
 export const shipmentsAPI = {
-  getAll: () => api.get<Shipment[]>('/api/shipments/'),
+  // One cursor page; pass the previous page's next link to continue
+  getPage: (cursorUrl?: string | null) => api.get<CursorPage<Shipment>>(cursorUrl || '/api/shipments/'),
+  // Without since, returns a cursor to take before loading the full list
+  getChanges: (since?: string) => api.get<ShipmentChanges>('/api/shipments/changes/', { params: since ? { since } : {} }),
   getById: (id: number) => api.get<Shipment>(`/api/shipments/${id}/`),
   create: (data: Partial<Shipment>) => api.post<Shipment>('/api/shipments/', data),
   update: (id: number, data: Partial<Shipment>) => api.patch<Shipment>(`/api/shipments/${id}/`, data),
@@ -31,6 +34,18 @@ export const shipmentsAPI = {
       formData
     );
   },
+  // Queues the file for the background import worker and returns immediately;
+  // poll importJobsAPI.getById for progress
+  uploadCSVAsync: (file: File) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('async', 'true');
+    const uploadApi = axios.create({
+      baseURL: API_BASE_URL,
+      timeout: 60000,
+    });
+    return uploadApi.post<ImportJob>('/api/shipments/upload_csv/', formData);
+  },
   bulkUpdate: (ids: number[], updates: Partial<Shipment>) =>
     api.post('/api/shipments/bulk_update/', { ids, updates }),
   bulkDelete: (ids: number[]) =>
@@ -41,14 +56,22 @@ export const shipmentsAPI = {
       service_id: serviceId,
       option,
     }),
-  getTotalPrice: () => api.get<{ total: number }>('/api/shipments/total_price/'),
+  getTotalPrice: () => api.get<ShipmentTotals>('/api/shipments/total_price/'),
   validateAddress: (id: number, type: 'from' | 'to') =>
     api.post(`/api/shipments/${id}/validate_address/`, { type }),
+  bulkValidateAddresses: (ids: number[], types: ('from' | 'to')[] = ['to', 'from']) =>
+    api.post<BulkValidationResult>('/api/shipments/bulk_validate_addresses/', { ids, types }),
+};
+
+// Import Jobs API
+export const importJobsAPI = {
+  getAll: () => api.get<ImportJob[]>('/api/import-jobs/'),
+  getById: (id: number) => api.get<ImportJob>(`/api/import-jobs/${id}/`),
 };
 
 // Addresses API
 export const addressesAPI = {
-  getAll: () => api.get<Address[]>('/api/addresses/'),
+  getPage: (cursorUrl?: string | null) => api.get<CursorPage<Address>>(cursorUrl || '/api/addresses/'),
   getById: (id: number) => api.get<Address>(`/api/addresses/${id}/`),
   create: (data: Partial<Address>) => api.post<Address>('/api/addresses/', data),
   update: (id: number, data: Partial<Address>) => api.patch<Address>(`/api/addresses/${id}/`, data),
@@ -57,7 +80,7 @@ export const addressesAPI = {
 
 // Packages API
 export const packagesAPI = {
-  getAll: () => api.get<Package[]>('/api/packages/'),
+  getPage: (cursorUrl?: string | null) => api.get<CursorPage<Package>>(cursorUrl || '/api/packages/'),
   getById: (id: number) => api.get<Package>(`/api/packages/${id}/`),
   create: (data: Partial<Package>) => api.post<Package>('/api/packages/', data),
   update: (id: number, data: Partial<Package>) => api.patch<Package>(`/api/packages/${id}/`, data),
@@ -86,4 +109,10 @@ export const savedPackagesAPI = {
   delete: (id: number) => api.delete(`/api/saved-packages/${id}/`),
 };
 
+// Quotes API (nothing is saved)
+export const quotesAPI = {
+  quote: (data: QuoteRequest) => api.post<QuoteResult>('/api/quotes/', data),
+  quoteMany: (data: QuoteRequest[]) => api.post<QuoteResult[]>('/api/quotes/', data),
+};
+
 export default api;
@@ -62,3 +62,77 @@ export interface SavedPackage {
   package: Package;
   created_at: string;
 }
+
+export interface ImportJob {
+  id: number;
+  original_name: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  status_display: string;
+  upsert: boolean;
+  unpurchased_only: boolean;
+  rows_parsed: number;
+  rows_created: number;
+  rows_updated: number;
+  rows_unchanged: number;
+  rows_duplicate: number;
+  rows_failed: number;
+  throughput: number;
+  elapsed_seconds: number;
+  errors: string[];
+  error: string;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+}
+
+export interface AddressValidationOutcome {
+  is_valid: boolean;
+  address_id: number;
+  error: string | null;
+}
+
+export interface BulkValidationResult {
+  validated: number;
+  failed: number;
+  shipments: {
+    id: number;
+    status: Shipment['status'];
+    is_valid: boolean;
+    addresses: Partial<Record<'to' | 'from', AddressValidationOutcome | null>>;
+  }[];
+}
+
+export interface QuoteRequest {
+  package?: Omit<Package, 'id' | 'total_weight_oz'>;
+  saved_package_id?: number;
+  ship_from_zip?: string;
+  ship_to_zip?: string;
+}
+
+export interface QuoteResult {
+  quotes: {
+    service_id: number;
+    service: string;
+    name_display: string;
+    price: string;
+  }[];
+  cheapest_service_id: number | null;
+}
+
+export interface ShipmentTotals {
+  total: number;
+  count: number;
+}
+
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+export interface ShipmentChanges {
+  cursor: string;
+  has_more: boolean;
+  changed: Shipment[];
+  deleted: number[];
+}
@@ -0,0 +1,92 @@
+"""
+Process-local cache of the ShippingService catalog.
+
+Services almost never change, so each process keeps them in memory instead of querying
+them per request. Saving or deleting a service (see signals.py) bumps the
+"shipping_services" CacheVersion row and clears this process's copy once the transaction
+commits; other processes compare the row with their copy at most every
+CATALOG_CHECK_INTERVAL seconds, so they see the change within that window.
+
+Changes made with QuerySet.update() send no signals; call ServiceCatalog.invalidate()
+after them. Cached instances are shared, so treat them as read-only.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CacheVersion, ShippingService
+
+logger = logging.getLogger("shipping")
+
+
+class ServiceCatalog:
+    """Shipping services by id, reloaded when their CacheVersion changes"""
+
+    VERSION_KEY = "shipping_services"
+
+    _services = None
+    _version = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def all() -> List[ShippingService]:
+        """Every service, ordered by id"""
+        return list(ServiceCatalog._catalog().values())
+
+    @staticmethod
+    def get(service_id) -> Optional[ShippingService]:
+        """The service with this id, or None; an unknown id forces a version check first"""
+        try:
+            service_id = int(service_id)
+        except (TypeError, ValueError):
+            return None
+        services = ServiceCatalog._catalog()
+        if service_id not in services:
+            # Possibly created by another process since the last check
+            services = ServiceCatalog._catalog(force_check=True)
+        return services.get(service_id)
+
+    @staticmethod
+    def by_name(name: str) -> Optional[ShippingService]:
+        """The first service (by id) with this name, or None"""
+        return next((service for service in ServiceCatalog.all() if service.name == name), None)
+
+    @staticmethod
+    def version() -> int:
+        """The catalog version this process has loaded"""
+        ServiceCatalog._catalog()
+        return ServiceCatalog._version
+
+    @staticmethod
+    def invalidate():
+        """Record a change for every process and reload this one once the transaction commits"""
+        CacheVersion.bump(ServiceCatalog.VERSION_KEY)
+        transaction.on_commit(ServiceCatalog.clear)
+
+    @staticmethod
+    def clear():
+        with ServiceCatalog._lock:
+            ServiceCatalog._services = None
+            ServiceCatalog._version = None
+
+    @staticmethod
+    def _catalog(force_check: bool = False) -> Dict[int, ShippingService]:
+        services = ServiceCatalog._services
+        interval = getattr(settings, "CATALOG_CHECK_INTERVAL", 5)
+        if services is not None and not force_check and time.monotonic() - ServiceCatalog._checked_at < interval:
+            return services
+
+        with ServiceCatalog._lock:
+            # Read the version before the rows, so a change made in between triggers another reload
+            version = CacheVersion.current(ServiceCatalog.VERSION_KEY)
+            if ServiceCatalog._services is None or version != ServiceCatalog._version:
+                ServiceCatalog._services = {service.id: service for service in ShippingService.objects.order_by("id")}
+                ServiceCatalog._version = version
+                logger.debug(f"Loaded {len(ServiceCatalog._services)} shipping services (catalog v{version})")
+            ServiceCatalog._checked_at = time.monotonic()
+            return ServiceCatalog._services
@@ -0,0 +1,254 @@
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.etree import ElementTree
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from shipping.services import AddressValidator
+
+logger = logging.getLogger("shipping")
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """
+    Answers USPS Verify and SmartyStreets street-address requests after a fixed delay.
+
+    USPS reports an error for streets containing "USPS UNKNOWN" and Smarty returns no
+    candidate for streets containing "NOWHERE", so fallbacks can be exercised.
+    """
+
+    # Keep connections alive so the validator's pooled sessions are exercised
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self._delay(url.path)
+
+        if url.path == "/usps":
+            self._respond(self._usps(params["XML"]).encode(), "text/xml")
+        elif url.path == "/smarty":
+            self._respond(json.dumps(self._smarty([params])).encode(), "application/json")
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        lookups = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"[]")
+        self._delay(url.path)
+
+        if url.path == "/smarty":
+            self._respond(json.dumps(self._smarty(lookups)).encode(), "application/json")
+        else:
+            self.send_error(404)
+
+    def _delay(self, path):
+        latency = self.server.latencies.get(path.strip("/"), 0)
+        time.sleep(latency() if callable(latency) else latency)
+        self.server.count(path.strip("/"))
+
+    def _respond(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _usps(self, request_xml):
+        response = ElementTree.Element("AddressValidateResponse")
+        for address in ElementTree.fromstring(request_xml).findall("Address"):
+            element = ElementTree.SubElement(response, "Address", ID=address.get("ID"))
+            if "USPS UNKNOWN" in (address.findtext("Address2") or "").upper():
+                error = ElementTree.SubElement(element, "Error")
+                ElementTree.SubElement(error, "Description").text = "Address Not Found."
+                continue
+            for tag in ("Address1", "Address2", "City", "State", "Zip5"):
+                ElementTree.SubElement(element, tag).text = (address.findtext(tag) or "").upper()
+            ElementTree.SubElement(element, "Zip4").text = "0001"
+        return ElementTree.tostring(response, encoding="unicode")
+
+    def _smarty(self, lookups):
+        return [
+            dict(self._smarty_candidate(lookup), input_index=idx, input_id=lookup.get("input_id", ""))
+            for idx, lookup in enumerate(lookups)
+            if "NOWHERE" not in lookup.get("street", "").upper()
+        ]
+
+    def _smarty_candidate(self, params):
+        return {
+            "delivery_line_1": params.get("street", "").upper(),
+            "delivery_line_2": params.get("secondary", "").upper(),
+            "components": {
+                "city_name": params.get("city", "").upper(),
+                "state_abbreviation": params.get("state", "").upper(),
+                "zipcode": params.get("zipcode", "")[:5],
+                "plus4_code": "0001",
+            },
+        }
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubProviderServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the USPS and SmartyStreets APIs, run on a background thread.
+
+    latencies maps "usps"/"smarty" to a delay in seconds, or to a callable returning one.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, latencies=None):
+        super().__init__(("127.0.0.1", 0), StubProviderHandler)
+        self.latencies = latencies or {}
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_error(self, request, client_address):
+        # Clients that hit their deadline hang up early, which is expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, provider):
+        with self.lock:
+            self.requests[provider] = self.requests.get(provider, 0) + 1
+
+    def provider_settings(self):
+        """Settings that point AddressValidator at this server"""
+        return {
+            "USPS_API_URL": f"{self.base_url}/usps",
+            "USPS_USER_ID": "STUB",
+            "SMARTY_API_URL": f"{self.base_url}/smarty",
+            "SMARTY_AUTH_ID": "stub",
+            "SMARTY_AUTH_TOKEN": "stub",
+            "ADDRESS_VALIDATION_RATE_LIMITS": {},
+        }
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class Command(BaseCommand):
+    help = "Benchmark bulk address validation against a local stub USPS/SmartyStreets server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--addresses", type=int, default=200, help="Addresses to validate")
+        parser.add_argument("--latency", type=float, default=0.05, help="Stub provider latency in seconds")
+        parser.add_argument("--concurrency", type=int, default=32, help="Concurrent provider requests")
+        parser.add_argument(
+            "--providers",
+            default="usps,smarty",
+            help="Comma-separated provider order (e.g. smarty to measure 100-address batches)",
+        )
+        parser.add_argument(
+            "--hedge",
+            action="store_true",
+            help="Measure single-address latency with and without hedging against a USPS with a slow tail",
+        )
+        parser.add_argument(
+            "--slow-rate",
+            type=float,
+            default=0.03,
+            help="Share of USPS requests that take 20x --latency in --hedge mode",
+        )
+
+    def handle(self, *args, **options):
+        if options["hedge"]:
+            self.benchmark_hedging(options)
+            return
+
+        addresses = [
+            {
+                "first_name": f"Name {i}",
+                "address_line1": f"{i} Main St",
+                "address_line2": "",
+                "city": "Springfield",
+                "state": "IL",
+                "zip_code": f"{62700 + i % 100}",
+            }
+            for i in range(options["addresses"])
+        ]
+        latencies = {"usps": options["latency"], "smarty": options["latency"]}
+
+        unbatched = {provider: 1 for provider in AddressValidator.MAX_BATCH_SIZES}
+        runs = (
+            ("Sequential", 1, unbatched),
+            ("Concurrent", options["concurrency"], unbatched),
+            ("Batched", options["concurrency"], AddressValidator.MAX_BATCH_SIZES),
+        )
+
+        with StubProviderServer(latencies) as server, override_settings(
+            **server.provider_settings(),
+            ADDRESS_VALIDATION_PROVIDERS=options["providers"].split(","),
+            ADDRESS_VALIDATION_CACHE_ENABLED=False,
+            ADDRESS_VALIDATION_POOL_SIZE=options["concurrency"],
+        ):
+            AddressValidator.reset_clients()
+            for label, concurrency, batch_sizes in runs:
+                server.requests = {}
+                started = time.perf_counter()
+                with override_settings(ADDRESS_VALIDATION_BATCH_SIZES=batch_sizes):
+                    results = AddressValidator.validate_bulk_addresses(addresses, concurrency=concurrency)
+                elapsed = time.perf_counter() - started
+                valid = sum(1 for is_valid, _, _ in results if is_valid)
+                self.stdout.write(
+                    f"{label:<11} concurrency={concurrency:<3} {elapsed:.2f}s "
+                    f"({len(addresses) / elapsed:,.0f} addresses/s, {valid} valid, requests={server.requests})"
+                )
+
+        AddressValidator.reset_clients()
+        self.stdout.write(self.style.SUCCESS("Benchmark complete"))
+
+    def benchmark_hedging(self, options):
+        latency = options["latency"]
+        rng = random.Random(0)
+        latencies = {
+            "usps": lambda: latency * 20 if rng.random() < options["slow_rate"] else latency,
+            "smarty": latency,
+        }
+        address = {"address_line1": "1 Main St", "city": "Springfield", "state": "IL", "zip_code": "62701"}
+
+        with StubProviderServer(latencies) as server, override_settings(
+            **server.provider_settings(), ADDRESS_VALIDATION_CACHE_ENABLED=False
+        ):
+            for label, hedge in (("Unhedged", False), ("Hedged", True)):
+                AddressValidator.reset_clients()
+                # Warm up so the hedge delay comes from measured latencies, not the default
+                for _ in range(50):
+                    AddressValidator.validate_address(address)
+                AddressValidator.reset_hedge_stats()
+                server.requests = {}
+                timings = []
+                with override_settings(ADDRESS_VALIDATION_HEDGE_ENABLED=hedge):
+                    for _ in range(options["addresses"]):
+                        started = time.perf_counter()
+                        AddressValidator.validate_address(address)
+                        timings.append(time.perf_counter() - started)
+                timings.sort()
+                p50, p95, p99 = (timings[int(len(timings) * q)] * 1000 for q in (0.5, 0.95, 0.99))
+                stats = AddressValidator.hedge_stats()
+                self.stdout.write(
+                    f"{label:<9} p50={p50:.0f}ms p95={p95:.0f}ms p99={p99:.0f}ms "
+                    f"hedge_rate={stats['hedge_rate']:.1%} hedge_wins={stats['hedge_wins']} requests={server.requests}"
+                )
+
+        AddressValidator.reset_clients()
+        self.stdout.write(self.style.SUCCESS("Benchmark complete"))
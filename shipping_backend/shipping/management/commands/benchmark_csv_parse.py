@@ -0,0 +1,70 @@
+import logging
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from shipping.services import CSVParser
+
+logger = logging.getLogger("shipping")
+
+
+class Command(BaseCommand):
+    help = "Benchmark serial vs parallel CSV parsing on a generated (or given) CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="Existing CSV file to parse instead of a generated one")
+        parser.add_argument("--rows", type=int, default=200000, help="Rows to generate")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel worker processes")
+        parser.add_argument("--segment-size", type=int, default=4 * 1024 * 1024, help="Bytes per parallel segment")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        generated = not path
+        if generated:
+            path = self._generate(options["rows"])
+        size_mb = os.path.getsize(path) / 1e6
+        
+        try:
+            with open(path, "rb") as file:
+                encoding = CSVParser.detect_encoding(file)
+                started = time.perf_counter()
+                serial = list(CSVParser.iter_rows(CSVParser._iter_lines(file, encoding, 64 * 1024)))
+                serial_time = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            parallel = list(CSVParser.iter_rows_parallel(
+                path, encoding, options["workers"], segment_size=options["segment_size"]
+            ))
+            parallel_time = time.perf_counter() - started
+        finally:
+            if generated:
+                os.remove(path)
+        
+        self.stdout.write(f"Rows: {len(serial)} ({size_mb:.1f} MB)")
+        self.stdout.write(f"Serial:   {serial_time:.2f}s ({len(serial) / serial_time:,.0f} rows/s)")
+        self.stdout.write(
+            f"Parallel: {parallel_time:.2f}s ({len(parallel) / parallel_time:,.0f} rows/s, "
+            f"{options['workers']} workers, {serial_time / parallel_time:.2f}x)"
+        )
+        
+        if serial != parallel:
+            self.stdout.write(self.style.ERROR("Parallel results differ from the serial parse"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Parallel results match the serial parse"))
+
+    def _generate(self, rows):
+        """Write a Template.csv-shaped file, including quoted multi-line fields"""
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w", newline="") as file:
+            file.write("From,,,,,,,To,,,,,,,weight*,weight*,Dimensions*,Dimensions*,Dimensions*,,,,\n")
+            file.write("First name*,Last name,Address*,Address2,City*,ZIP/Postal code*,Abbreviation*,"
+                       "First name*,Last name,Address*,Address2,City*,ZIP/Postal code*,Abbreviation*,"
+                       "lbs,oz,Length,width,Height,phone num1,phone num2,order no,Item-sku\n")
+            for i in range(rows):
+                address2 = f'"Apt {i}\nBldg {i % 7}"' if i % 50 == 0 else f"Apt {i}"
+                file.write(
+                    f"Print TTS,,502 W Arrow Hwy,,San Dimas,91773,CA,"
+                    f"Name {i},Last,{i} Main St,{address2},City {i % 97},{10000 + i % 89999},NY,"
+                    f"{i % 5},{i % 16},{i % 12 + 1},4.5,3,555-{i:04d},,ORD{i},SKU{i}\n"
+                )
+        return path
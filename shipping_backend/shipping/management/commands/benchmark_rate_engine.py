@@ -0,0 +1,103 @@
+import csv
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal, ROUND_CEILING
+import numpy as np
+from django.core.management.base import BaseCommand
+from shipping.rates import RateEngine
+
+
+def write_sample_tables(directory, seed=0):
+    """Write synthetic priority/ground rate tables and a ZIP3 zone chart to directory"""
+    rng = np.random.default_rng(seed)
+    services = {
+        "priority": {"prices": "priority.csv", "dim_divisor": 166, "dim_min_volume": 1728},
+        "ground": {"prices": "ground.csv", "dim_divisor": 139, "dim_min_volume": 1728},
+    }
+    with open(os.path.join(directory, "services.json"), "w") as f:
+        json.dump(services, f)
+
+    for name, base in (("priority", 795), ("ground", 510)):
+        with open(os.path.join(directory, f"{name}.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["weight_lbs"] + [str(zone) for zone in range(1, 10)])
+            writer.writerow(["0.5"] + [f"{(base + zone * 20) / 100:.2f}" for zone in range(1, 10)])
+            for lbs in range(1, 71):
+                writer.writerow([lbs] + [f"{(base + lbs * 95 + zone * lbs * 31) / 100:.2f}" for zone in range(1, 10)])
+
+    with open(os.path.join(directory, "zones.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["origin_zip3", "dest_zip3_start", "dest_zip3_end", "zone"])
+        for origin in range(5, 1000):
+            for start in range(0, 1000, 100):
+                writer.writerow([origin, start, start + 99, int(rng.integers(1, 10))])
+
+
+class Command(BaseCommand):
+    help = "Benchmark vectorized rate-table pricing on synthetic tables and packages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quotes", type=int, default=1_000_000, help="Packages priced per batch")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed batches (best is reported)")
+        parser.add_argument("--check", type=int, default=2000, help="Quotes checked against a scalar Decimal reference")
+
+    def handle(self, *args, **options):
+        n = options["quotes"]
+        rng = np.random.default_rng(1)
+        with tempfile.TemporaryDirectory() as directory:
+            write_sample_tables(directory)
+            started = time.perf_counter()
+            book = RateEngine.compile(directory)
+            self.stdout.write(f"Compiled {len(book.tables)} rate tables in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+            weight_oz = rng.integers(0, 70 * 16, n)
+            length, width, height = (rng.integers(100, 3000, n) for _ in range(3))
+            origin, dest = rng.integers(0, 1000, n), rng.integers(0, 1000, n)
+            table = book.tables["priority"]
+
+            best = None
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                cents = table.quote_batch(weight_oz, length, width, height, book.zones_for(origin, dest))
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(
+                f"Priced {n:,} packages in {best * 1000:.1f}ms ({n / best:,.0f} quotes/s, "
+                f"{int((cents < 0).sum()):,} unpriceable)"
+            )
+
+            mismatches = 0
+            for i in rng.integers(0, n, options["check"]):
+                expected = self._reference(directory, weight_oz[i], length[i], width[i], height[i], origin[i], dest[i])
+                mismatches += expected != int(cents[i])
+            if mismatches:
+                self.stdout.write(self.style.ERROR(f"{mismatches} of {options['check']} quotes differ from the reference"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{options['check']} sampled quotes match the scalar reference"))
+
+    def _reference(self, directory, weight_oz, length, width, height, origin, dest):
+        """Price one package straight from the CSV files with Decimal arithmetic"""
+        if not hasattr(self, "_breaks"):
+            with open(os.path.join(directory, "priority.csv")) as f:
+                rows = list(csv.reader(f))[1:]
+            self._breaks = [(Decimal(row[0]) * 16, row[1:]) for row in rows]
+            with open(os.path.join(directory, "zones.csv")) as f:
+                self._zones = {
+                    (int(row["origin_zip3"]), dest_zip3): int(row["zone"])
+                    for row in csv.DictReader(f)
+                    for dest_zip3 in range(int(row["dest_zip3_start"]), int(row["dest_zip3_end"]) + 1)
+                }
+
+        zone = self._zones.get((int(origin), int(dest)))
+        volume = Decimal(int(length)) * Decimal(int(width)) * Decimal(int(height)) / 1_000_000
+        billable = max(Decimal(max(int(weight_oz), 1)), Decimal(0))
+        if volume > 1728:
+            billable = max(billable, (volume / 166).to_integral_value(ROUND_CEILING) * 16)
+        if zone is None:
+            return -1
+        for break_oz, prices in self._breaks:
+            if billable <= break_oz:
+                return int(Decimal(prices[zone - 1]) * 100)
+        return -1
@@ -0,0 +1,78 @@
+import time
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from shipping.catalog import ServiceCatalog
+from shipping.models import Shipment
+from shipping.renderers import FastJSONRenderer
+from shipping.serializers import ShipmentListSerializer, ShipmentSerializer
+from shipping.services import ShipmentImporter, ShipmentRepricer
+
+
+class Command(BaseCommand):
+    help = "Benchmark ShipmentSerializer + JSONRenderer against ShipmentListSerializer + FastJSONRenderer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000, help="Shipments to list")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per path (the fastest is reported)")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        # Top up with synthetic shipments if needed; they are rolled back afterwards
+        with transaction.atomic():
+            missing = rows - Shipment.objects.count()
+            if missing > 0:
+                self.stdout.write(f"Generating {missing} temporary shipments")
+                ShipmentImporter().import_file(SimpleUploadedFile("benchmark.csv", self._generate(missing)))
+                shipment_ids = list(Shipment.objects.values_list("id", flat=True))
+                service = ServiceCatalog.by_name("priority")
+                if service:
+                    ShipmentRepricer.apply_service(shipment_ids[::2], service)
+            self._benchmark(rows, options["repeat"])
+            transaction.set_rollback(True)
+
+    def _benchmark(self, rows, repeat):
+        queryset = Shipment.objects.order_by("created_at", "id")
+
+        def standard():
+            data = ShipmentSerializer(queryset.select_related("ship_from", "ship_to", "package")[:rows], many=True).data
+            return JSONRenderer().render(data)
+
+        def fast():
+            data = ShipmentListSerializer.to_representation(ShipmentListSerializer.rows(queryset)[:rows])
+            return FastJSONRenderer().render(data)
+
+        results = {}
+        for label, render in (("Serializer", standard), ("Fast list", fast)):
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                body = render()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (best, body)
+            self.stdout.write(f"{label:<11} {best * 1000:7.0f}ms ({rows / best:,.0f} rows/s, {len(body) / 1e6:.1f} MB)")
+
+        (standard_time, standard_body), (fast_time, fast_body) = results.values()
+        self.stdout.write(f"Speedup: {standard_time / fast_time:.1f}x")
+        if standard_body != fast_body:
+            self.stdout.write(self.style.ERROR("Fast list output differs from ShipmentSerializer"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Fast list output is byte-identical"))
+
+    def _generate(self, rows):
+        """A Template.csv-shaped file with some non-ASCII text and no ship from on every tenth row"""
+        lines = [
+            "From,,,,,,,To,,,,,,,weight*,weight*,Dimensions*,Dimensions*,Dimensions*,,,,",
+            "First name*,Last name,Address*,Address2,City*,ZIP/Postal code*,Abbreviation*,"
+            "First name*,Last name,Address*,Address2,City*,ZIP/Postal code*,Abbreviation*,"
+            "lbs,oz,Length,width,Height,phone num1,phone num2,order no,Item-sku",
+        ]
+        for i in range(rows):
+            ship_from = ",,,,,," if i % 10 == 0 else "Print TTS,,502 W Arrow Hwy,,San Dimas,91773,CA"
+            lines.append(
+                f"{ship_from},José {i},Müller,{i} Main St,Apt {i % 40},City {i % 97},{10000 + i % 89999},NY,"
+                f"{i % 5},{i % 16},{i % 12 + 1},4.5,3,555-{i:04d},,BENCH{i},SKU{i}"
+            )
+        return ("\n".join(lines) + "\n").encode()
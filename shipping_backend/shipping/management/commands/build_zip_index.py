@@ -0,0 +1,57 @@
+import csv
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from shipping.services import ZipIndex
+
+ZIP_COLUMNS = ("zip", "zipcode", "zip_code", "zip5")
+CITY_COLUMNS = ("primary_city", "city")
+ALTERNATE_CITY_COLUMNS = ("acceptable_cities",)
+STATE_COLUMNS = ("state", "state_abbr", "state_code")
+
+
+class Command(BaseCommand):
+    help = "Build the offline ZIP5 -> city/state index used to pre-validate addresses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source",
+            help=(
+                "CSV with a header row containing zip, city (or primary_city) and state columns, "
+                "plus an optional comma-separated acceptable_cities column. Repeated ZIPs add alternate cities."
+            ),
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Where to write the index (defaults to ZIP_INDEX_PATH)",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"] or str(settings.ZIP_INDEX_PATH)
+        started = time.perf_counter()
+        with open(options["source"], newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            columns = {name.strip().lower(): name for name in reader.fieldnames or []}
+            zip_column = self._column(columns, ZIP_COLUMNS)
+            city_column = self._column(columns, CITY_COLUMNS)
+            state_column = self._column(columns, STATE_COLUMNS)
+            alternates_column = next((columns[name] for name in ALTERNATE_CITY_COLUMNS if name in columns), None)
+
+            def rows():
+                for row in reader:
+                    cities = [row[city_column]]
+                    if alternates_column:
+                        cities += (row[alternates_column] or "").split(",")
+                    yield row[zip_column], cities, row[state_column]
+
+            count = ZipIndex.build(rows(), output)
+
+        self.stdout.write(f"Indexed {count:,} ZIP codes in {time.perf_counter() - started:.2f}s -> {output}")
+        self.stdout.write(self.style.SUCCESS("ZIP index built; restart workers to pick it up"))
+
+    def _column(self, columns, candidates):
+        for name in candidates:
+            if name in columns:
+                return columns[name]
+        raise CommandError(f"Source CSV needs one of these columns: {', '.join(candidates)}")
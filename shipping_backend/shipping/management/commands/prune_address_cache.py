@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from shipping.models import AddressValidationResult
+from shipping.services import AddressValidationCache
+
+
+class Command(BaseCommand):
+    help = "Delete expired address validation results from the cache table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Delete every cached result, not just expired ones",
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            deleted = AddressValidationResult.objects.count()
+            AddressValidationCache.clear()
+        else:
+            deleted, _ = AddressValidationResult.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(f"Deleted {deleted} cached address validation results")
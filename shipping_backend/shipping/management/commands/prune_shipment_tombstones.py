@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from shipping.services import ShipmentChangefeed
+
+
+class Command(BaseCommand):
+    help = "Delete shipment tombstones older than CHANGEFEED_RETENTION_DAYS"
+
+    def handle(self, *args, **options):
+        deleted = ShipmentChangefeed.prune()
+        self.stdout.write(f"Deleted {deleted} shipment tombstones")
@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from shipping.models import ShipmentTotal
+from shipping.services import ShipmentTotals
+
+
+class Command(BaseCommand):
+    help = "Recompute the ShipmentTotal summary table from every shipment"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        ShipmentTotals.rebuild()
+        self.stdout.write(
+            f"Rebuilt {ShipmentTotal.objects.count()} shipment total rows in {time.perf_counter() - started:.2f}s"
+        )
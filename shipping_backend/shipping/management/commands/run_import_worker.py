@@ -0,0 +1,47 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from shipping.services import ImportJobRunner
+
+logger = logging.getLogger("shipping")
+
+
+class Command(BaseCommand):
+    help = "Process queued background CSV imports (no external broker required)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process every queued job and exit instead of polling forever",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between checks when the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        logger.info("Import worker started")
+        processed = 0
+        
+        while True:
+            # Jobs left running by a worker that died would otherwise never finish
+            ImportJobRunner.reclaim_stale()
+            job = ImportJobRunner.claim_next()
+            if job:
+                job = ImportJobRunner.run(job)
+                processed += 1
+                self.stdout.write(
+                    f"Import job {job.id} {job.status}: {job.rows_created} created, {job.rows_failed} failed"
+                )
+                continue
+            
+            if options["once"]:
+                break
+            time.sleep(options["poll_interval"])
+        
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {processed} import jobs")
+        )
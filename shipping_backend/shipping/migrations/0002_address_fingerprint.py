@@ -0,0 +1,128 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:12
+
+import hashlib
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of the address normalization at the time of this migration, so later
+# changes to Address.fingerprint_for do not change what the backfill does
+ABBREVIATIONS = {
+    "STREET": "ST",
+    "AVENUE": "AVE",
+    "ROAD": "RD",
+    "BOULEVARD": "BLVD",
+    "DRIVE": "DR",
+    "LANE": "LN",
+    "COURT": "CT",
+    "PLACE": "PL",
+    "HIGHWAY": "HWY",
+    "PARKWAY": "PKWY",
+    "CIRCLE": "CIR",
+    "TERRACE": "TER",
+    "TRAIL": "TRL",
+    "SQUARE": "SQ",
+    "EXPRESSWAY": "EXPY",
+    "FREEWAY": "FWY",
+    "SUITE": "STE",
+    "APARTMENT": "APT",
+    "BUILDING": "BLDG",
+    "FLOOR": "FL",
+    "NORTH": "N",
+    "SOUTH": "S",
+    "EAST": "E",
+    "WEST": "W",
+    "NORTHEAST": "NE",
+    "NORTHWEST": "NW",
+    "SOUTHEAST": "SE",
+    "SOUTHWEST": "SW",
+}
+
+RECIPIENT_FIELDS = ["first_name", "last_name", "phone"]
+
+
+def normalize_line(value):
+    tokens = re.sub(r"[^A-Z0-9 ]", " ", (value or "").upper()).split()
+    return " ".join(ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def fingerprint_for(address):
+    zip_digits = re.sub(r"[^0-9]", "", address.zip_code or "")
+    key = "|".join(
+        [
+            normalize_line(address.address_line1),
+            normalize_line(address.address_line2),
+            normalize_line(address.city),
+            (address.state or "").strip().upper(),
+            zip_digits[:5],
+            " ".join((address.first_name or "").upper().split()),
+            " ".join((address.last_name or "").upper().split()),
+            re.sub(r"[^0-9]", "", address.phone or ""),
+        ]
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    """
+    Compute fingerprints for existing addresses and merge duplicates into the
+    oldest matching address so the unique index can be created.
+
+    Only addresses with the same recipient name and phone number are merged, so
+    no shipment changes recipient. Rows that normalize to the same fingerprint
+    but differ in how the name or phone is written are kept without one.
+    """
+    Address = apps.get_model("shipping", "Address")
+    Shipment = apps.get_model("shipping", "Shipment")
+    SavedAddress = apps.get_model("shipping", "SavedAddress")
+
+    canonical = {}
+    pending = []
+    for address in Address.objects.order_by("id").iterator(chunk_size=2000):
+        fingerprint = fingerprint_for(address)
+        keep = canonical.get(fingerprint)
+        if keep is None:
+            canonical[fingerprint] = address
+            address.fingerprint = fingerprint
+            pending.append(address)
+            if len(pending) >= 1000:
+                Address.objects.bulk_update(pending, ["fingerprint"])
+                pending = []
+            continue
+
+        if any(
+            getattr(address, field) != getattr(keep, field)
+            for field in RECIPIENT_FIELDS
+        ):
+            continue
+        if SavedAddress.objects.filter(address_id=address.id).exists():
+            if SavedAddress.objects.filter(address_id=keep.id).exists():
+                # Both are saved addresses; keep the duplicate without a fingerprint
+                continue
+            SavedAddress.objects.filter(address_id=address.id).update(
+                address_id=keep.id
+            )
+        Shipment.objects.filter(ship_to_id=address.id).update(ship_to_id=keep.id)
+        Shipment.objects.filter(ship_from_id=address.id).update(ship_from_id=keep.id)
+        address.delete()
+
+    if pending:
+        Address.objects.bulk_update(pending, ["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="address",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True, editable=False, max_length=40, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0002_address_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="address",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True, editable=False, max_length=40, null=True, unique=True
+            ),
+        ),
+    ]
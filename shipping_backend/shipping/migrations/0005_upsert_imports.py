@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0004_importjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="rows_unchanged",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="rows_updated",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="unpurchased_only",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="upsert",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="shipment",
+            name="content_hash",
+            field=models.CharField(blank=True, default="", max_length=40),
+        ),
+        migrations.AlterField(
+            model_name="shipment",
+            name="order_number",
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0005_upsert_imports"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AddressValidationResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fingerprint", models.CharField(max_length=40, unique=True)),
+                ("is_valid", models.BooleanField()),
+                ("validated_fields", models.JSONField(blank=True, default=dict)),
+                ("error", models.TextField(blank=True)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0007_cache_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShipmentTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("status", models.CharField(max_length=20)),
+                ("shipping_service_id", models.BigIntegerField(default=0)),
+                ("shipments", models.IntegerField(default=0)),
+                ("priced", models.IntegerField(default=0)),
+                (
+                    "total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "status", "shipping_service_id"),
+                        name="unique_shipment_total",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0008_shipment_total"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="shipment",
+            index=models.Index(
+                fields=["created_at", "id"], name="shipment_created_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.10 on 2026-10-18 03:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0009_shipment_created_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShipmentTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shipment_id", models.BigIntegerField()),
+                (
+                    "deleted_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="shipment",
+            index=models.Index(
+                fields=["updated_at", "id"], name="shipment_updated_id_idx"
+            ),
+        ),
+    ]
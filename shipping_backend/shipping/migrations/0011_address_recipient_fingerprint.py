@@ -0,0 +1,94 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:40
+
+import hashlib
+import re
+
+from django.db import migrations
+
+# Frozen copy of the address normalization at the time of this migration
+ABBREVIATIONS = {
+    "STREET": "ST",
+    "AVENUE": "AVE",
+    "ROAD": "RD",
+    "BOULEVARD": "BLVD",
+    "DRIVE": "DR",
+    "LANE": "LN",
+    "COURT": "CT",
+    "PLACE": "PL",
+    "HIGHWAY": "HWY",
+    "PARKWAY": "PKWY",
+    "CIRCLE": "CIR",
+    "TERRACE": "TER",
+    "TRAIL": "TRL",
+    "SQUARE": "SQ",
+    "EXPRESSWAY": "EXPY",
+    "FREEWAY": "FWY",
+    "SUITE": "STE",
+    "APARTMENT": "APT",
+    "BUILDING": "BLDG",
+    "FLOOR": "FL",
+    "NORTH": "N",
+    "SOUTH": "S",
+    "EAST": "E",
+    "WEST": "W",
+    "NORTHEAST": "NE",
+    "NORTHWEST": "NW",
+    "SOUTHEAST": "SE",
+    "SOUTHWEST": "SW",
+}
+
+
+def normalize_line(value):
+    tokens = re.sub(r"[^A-Z0-9 ]", " ", (value or "").upper()).split()
+    return " ".join(ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def fingerprint_for(address):
+    zip_digits = re.sub(r"[^0-9]", "", address.zip_code or "")
+    key = "|".join(
+        [
+            normalize_line(address.address_line1),
+            normalize_line(address.address_line2),
+            normalize_line(address.city),
+            (address.state or "").strip().upper(),
+            zip_digits[:5],
+            " ".join((address.first_name or "").upper().split()),
+            " ".join((address.last_name or "").upper().split()),
+            re.sub(r"[^0-9]", "", address.phone or ""),
+        ]
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def recompute_fingerprints(apps, schema_editor):
+    """
+    Add the recipient's name and phone number to every address fingerprint, so
+    create paths stop matching (and sharing) rows that belong to someone else.
+
+    No rows are merged. When two rows still share a fingerprint the older one
+    keeps it and the other is left without one.
+    """
+    Address = apps.get_model("shipping", "Address")
+
+    seen = set()
+    addresses = []
+    for address in Address.objects.order_by("id").iterator(chunk_size=2000):
+        fingerprint = fingerprint_for(address)
+        address.fingerprint = None if fingerprint in seen else fingerprint
+        seen.add(fingerprint)
+        addresses.append(address)
+
+    # Clear the old fingerprints first so the unique index never sees a transient clash
+    Address.objects.update(fingerprint=None)
+    Address.objects.bulk_update(addresses, ["fingerprint"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0010_shipment_changefeed"),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_fingerprints, migrations.RunPython.noop),
+    ]
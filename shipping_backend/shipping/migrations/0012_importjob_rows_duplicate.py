@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0011_address_recipient_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="rows_duplicate",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,6 +1,11 @@
+import hashlib
 import logging
+import re
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+
+from .rates import RateEngine
 
 logger = logging.getLogger("shipping")
 
@@ -15,6 +20,19 @@ class Address(models.Model):
     state = models.CharField(max_length=2)  # US state abbreviation
     zip_code = models.CharField(max_length=20)
     phone = models.CharField(max_length=20, blank=True)
+    # Hash of the normalized recipient, street, city, state and ZIP5, used to find existing addresses
+    fingerprint = models.CharField(max_length=40, unique=True, null=True, blank=True, editable=False)
+    
+    # Common USPS street suffix and unit abbreviations used when normalizing
+    ABBREVIATIONS = {
+        "STREET": "ST", "AVENUE": "AVE", "ROAD": "RD", "BOULEVARD": "BLVD",
+        "DRIVE": "DR", "LANE": "LN", "COURT": "CT", "PLACE": "PL",
+        "HIGHWAY": "HWY", "PARKWAY": "PKWY", "CIRCLE": "CIR", "TERRACE": "TER",
+        "TRAIL": "TRL", "SQUARE": "SQ", "EXPRESSWAY": "EXPY", "FREEWAY": "FWY",
+        "SUITE": "STE", "APARTMENT": "APT", "BUILDING": "BLDG", "FLOOR": "FL",
+        "NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W",
+        "NORTHEAST": "NE", "NORTHWEST": "NW", "SOUTHEAST": "SE", "SOUTHWEST": "SW",
+    }
     
     class Meta:
         verbose_name_plural = "Addresses"
@@ -22,6 +40,67 @@ class Address(models.Model):
     def __str__(self):
         return f"{self.first_name} {self.last_name}, {self.city}, {self.state}"
     
+    def save(self, *args, **kwargs):
+        self.fingerprint = Address.fingerprint_for(self.__dict__)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "fingerprint" not in update_fields:
+            kwargs["update_fields"] = list(update_fields) + ["fingerprint"]
+        super().save(*args, **kwargs)
+    
+    @staticmethod
+    def normalize_line(value):
+        """Uppercase, strip punctuation and abbreviate a street or city line"""
+        tokens = re.sub(r"[^A-Z0-9 ]", " ", (value or "").upper()).split()
+        return " ".join(Address.ABBREVIATIONS.get(token, token) for token in tokens)
+    
+    @staticmethod
+    def location_fingerprint_for(address_data):
+        """
+        Return the normalized fingerprint of just the location in a dict of address
+        fields: names and phone numbers are ignored and ZIP+4 codes are reduced to the
+        ZIP5. Address validation results are cached by this key.
+        """
+        return hashlib.sha1(Address._location_key(address_data).encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def fingerprint_for(address_data):
+        """
+        Return the normalized fingerprint for a dict of address fields.
+        
+        The location plus the recipient's name and phone number, so an address row is
+        only reused for the same recipient at the same place.
+        """
+        recipient = "|".join([
+            " ".join((address_data.get("first_name") or "").upper().split()),
+            " ".join((address_data.get("last_name") or "").upper().split()),
+            re.sub(r"[^0-9]", "", address_data.get("phone") or ""),
+        ])
+        key = f"{Address._location_key(address_data)}|{recipient}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def _location_key(address_data):
+        zip_digits = re.sub(r"[^0-9]", "", address_data.get("zip_code") or "")
+        return "|".join([
+            Address.normalize_line(address_data.get("address_line1")),
+            Address.normalize_line(address_data.get("address_line2")),
+            Address.normalize_line(address_data.get("city")),
+            (address_data.get("state") or "").strip().upper(),
+            zip_digits[:5],
+        ])
+    
+    @classmethod
+    def get_or_create_matching(cls, address_data):
+        """
+        Return the address with the same fingerprint as address_data, or create one.
+        Returns (address, created). A matching row may be shared by other shipments,
+        so it is returned as stored rather than overwritten with address_data.
+        """
+        address = cls.objects.filter(fingerprint=cls.fingerprint_for(address_data)).first()
+        if address:
+            return address, False
+        return cls.objects.create(**address_data), True
+    
     def formatted(self):
         """Return formatted address string"""
         lines = [
@@ -91,8 +170,17 @@ class ShippingService(models.Model):
     def __str__(self):
         return self.get_name_display()
     
-    def calculate_price(self, package):
-        """Calculate shipping price for a package"""
+    def calculate_price(self, package, origin_zip=None, destination_zip=None):
+        """
+        Calculate shipping price for a package.
+        
+        Services with a rate table (see rates.py) are priced by zone and billable weight
+        when the destination ZIP is known; otherwise the linear base + per-oz formula applies.
+        """
+        if destination_zip:
+            prices = RateEngine.quote_packages(self.name, [package], [origin_zip], [destination_zip])
+            if prices and prices[0] is not None:
+                return prices[0]
         total_weight_oz = package.total_weight_oz()
         return float(self.base_price) + (float(self.per_oz_rate) * total_weight_oz)
 
@@ -109,21 +197,148 @@ class Shipment(models.Model):
     ship_from = models.ForeignKey(Address, on_delete=models.CASCADE, related_name="shipments_from", null=True, blank=True)
     ship_to = models.ForeignKey(Address, on_delete=models.CASCADE, related_name="shipments_to")
     package = models.ForeignKey(Package, on_delete=models.CASCADE)
-    order_number = models.CharField(max_length=100, blank=True)
+    order_number = models.CharField(max_length=100, blank=True, db_index=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     shipping_service = models.ForeignKey(ShippingService, on_delete=models.SET_NULL, null=True, blank=True)
     shipping_price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    # Hash of the CSV row this shipment was last imported from (see ShipmentImporter.content_hash)
+    content_hash = models.CharField(max_length=40, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination in creation order (see CreatedCursorPagination)
+            models.Index(fields=["created_at", "id"], name="shipment_created_id_idx"),
+            # The changefeed reads changes in (updated_at, id) order (see ShipmentChangefeed)
+            models.Index(fields=["updated_at", "id"], name="shipment_updated_id_idx"),
+        ]
+    
     def __str__(self):
         return f"Shipment #{self.id} - {self.order_number or 'No Order Number'}"
     
     def calculate_shipping_price(self):
         """Calculate shipping price based on selected service"""
         if self.shipping_service and self.package:
-            price = self.shipping_service.calculate_price(self.package)
+            price = self.shipping_service.calculate_price(
+                self.package,
+                self.ship_from.zip_code if self.ship_from else None,
+                self.ship_to.zip_code if self.ship_to_id else None
+            )
             self.shipping_price = price
             self.save()
             return price
         return None
+
+
+class ImportJob(models.Model):
+    """Background CSV import processed by the run_import_worker command"""
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+    
+    file = models.FileField(upload_to="imports/")
+    original_name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued", db_index=True)
+    upsert = models.BooleanField(default=False)
+    unpurchased_only = models.BooleanField(default=False)
+    rows_parsed = models.IntegerField(default=0)
+    rows_created = models.IntegerField(default=0)
+    rows_updated = models.IntegerField(default=0)
+    rows_unchanged = models.IntegerField(default=0)
+    rows_duplicate = models.IntegerField(default=0)
+    rows_failed = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Import #{self.id} - {self.original_name or self.file.name} ({self.status})"
+    
+    def elapsed_seconds(self):
+        """Seconds spent running so far (or in total once finished)"""
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or timezone.now()
+        return max((end - self.started_at).total_seconds(), 0.0)
+    
+    def throughput(self):
+        """Parsed rows per second"""
+        elapsed = self.elapsed_seconds()
+        return round(self.rows_parsed / elapsed, 1) if elapsed else 0.0
+
+
+class AddressValidationResult(models.Model):
+    """Cached outcome of validating a normalized address (see AddressValidationCache)"""
+    fingerprint = models.CharField(max_length=40, unique=True)
+    is_valid = models.BooleanField()
+    validated_fields = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.fingerprint} ({'valid' if self.is_valid else 'invalid'})"
+
+
+class CacheVersion(models.Model):
+    """Change counter for data cached in each process, so every worker can tell when to reload it"""
+    key = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+    
+    @staticmethod
+    def current(key):
+        """The version for key, 0 if it has never changed"""
+        return CacheVersion.objects.filter(key=key).values_list("version", flat=True).first() or 0
+    
+    @staticmethod
+    def bump(key):
+        """Increment the version for key (atomically, in the caller's transaction)"""
+        updated = CacheVersion.objects.filter(key=key).update(
+            version=models.F("version") + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            _, created = CacheVersion.objects.get_or_create(key=key, defaults={"version": 1})
+            if not created:
+                CacheVersion.objects.filter(key=key).update(
+                    version=models.F("version") + 1, updated_at=timezone.now()
+                )
+
+
+class ShipmentTotal(models.Model):
+    """Shipment count and price total for one creation day, status and service (see ShipmentTotals)"""
+    day = models.DateField()
+    status = models.CharField(max_length=20)
+    # Not a foreign key, and 0 rather than NULL for no service so rows can be upserted
+    shipping_service_id = models.BigIntegerField(default=0)
+    shipments = models.IntegerField(default=0)
+    priced = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "status", "shipping_service_id"], name="unique_shipment_total")
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.status} service {self.shipping_service_id}: {self.total}"
+
+
+class ShipmentTombstone(models.Model):
+    """A deleted shipment, kept for CHANGEFEED_RETENTION_DAYS so the changefeed can report it"""
+    # Not a foreign key: the shipment is gone
+    shipment_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"Shipment #{self.shipment_id} deleted {self.deleted_at}"
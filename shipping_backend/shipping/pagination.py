@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination: each page continues from the last row of the previous one, so
+    deep pages cost the same as the first and rows added meanwhile are not skipped or
+    repeated. Clients follow the opaque next/previous URLs.
+    """
+    ordering = ("id",)
+    page_size_query_param = "page_size"
+    
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, "LIST_PAGE_SIZE", 100)
+        self.max_page_size = getattr(settings, "LIST_MAX_PAGE_SIZE", 1000)
+        return super().get_page_size(request)
+
+
+class CreatedCursorPagination(IdCursorPagination):
+    """Keyset pagination in creation order, with id breaking ties between equal timestamps"""
+    ordering = ("created_at", "id")
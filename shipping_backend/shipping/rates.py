@@ -0,0 +1,256 @@
+"""
+Rate-table pricing: zone x weight-break price tables compiled into numpy lookup arrays.
+
+RATE_TABLES_DIR holds:
+    services.json  {"priority": {"prices": "priority.csv", "dim_divisor": 166, "dim_min_volume": 1728}, ...}
+    <prices>.csv   weight_lbs (or weight_oz) then one column per zone (1-9); one row per
+                   weight break, prices in dollars
+    zones.csv      origin_zip3,dest_zip3_start,dest_zip3_end,zone
+
+All prices are integer cents; -1 marks a package that can't be priced (over the heaviest
+weight break, or no zone for the ZIP pair).
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from decimal import Decimal, InvalidOperation, ROUND_CEILING
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger("shipping")
+
+
+class RateTableError(Exception):
+    """Raised when rate table files are missing or malformed"""
+    pass
+
+
+class RateTable:
+    """Compiled prices for one shipping service"""
+
+    MAX_ZONE = 9
+
+    def __init__(self, name: str, prices: np.ndarray, dim_divisor: Optional[int], dim_min_volume: int):
+        # prices[weight_oz, zone] in cents, -1 where there is no price
+        self.name = name
+        self.prices = prices
+        self.max_oz = prices.shape[0] - 1
+        self.dim_divisor = dim_divisor
+        self.dim_min_volume = dim_min_volume
+
+    def quote_batch(self, weight_oz, length, width, height, zones) -> np.ndarray:
+        """
+        Price a batch of packages in one vectorized pass.
+
+        weight_oz and zones are integer arrays; length, width and height are integer
+        hundredths of an inch (see RateEngine.dimension). Billable weight is the actual
+        weight, or the dimensional weight in whole pounds (volume / dim_divisor, rounded
+        up) for packages over dim_min_volume cubic inches, whichever is greater.
+        """
+        weight_oz = np.maximum(np.asarray(weight_oz, dtype=np.int64), 1)
+        zones = np.asarray(zones, dtype=np.int64)
+
+        billable = weight_oz
+        if self.dim_divisor:
+            # Volume in millionths of a cubic inch keeps the arithmetic exact
+            volume = (
+                np.asarray(length, dtype=np.int64)
+                * np.asarray(width, dtype=np.int64)
+                * np.asarray(height, dtype=np.int64)
+            )
+            dim_lbs = -(-volume // (self.dim_divisor * 1_000_000))
+            dim_oz = np.where(volume > self.dim_min_volume * 1_000_000, dim_lbs * 16, 0)
+            billable = np.maximum(billable, dim_oz)
+
+        priceable = (billable <= self.max_oz) & (zones >= 1) & (zones <= self.MAX_ZONE)
+        prices = self.prices[np.where(priceable, billable, 0), np.where(priceable, zones, 0)]
+        return np.where(priceable, prices, -1)
+
+
+class RateBook:
+    """Every compiled RateTable plus the ZIP3 zone chart, as loaded from one directory"""
+
+    def __init__(self, tables: Dict[str, RateTable], zones: np.ndarray, version: str):
+        self.tables = tables
+        # zones[origin_zip3, dest_zip3], 0 where the chart has no zone
+        self.zones = zones
+        # Hash of the source files, so callers can tell when prices change
+        self.version = version
+
+    def zones_for(self, origin_zip3, dest_zip3) -> np.ndarray:
+        """Look up zones for arrays of ZIP3 codes (-1 for an unparseable ZIP gives zone 0)"""
+        origin_zip3 = np.asarray(origin_zip3, dtype=np.int64)
+        dest_zip3 = np.asarray(dest_zip3, dtype=np.int64)
+        known = (origin_zip3 >= 0) & (dest_zip3 >= 0)
+        return np.where(known, self.zones[np.where(known, origin_zip3, 0), np.where(known, dest_zip3, 0)], 0)
+
+
+class RateEngine:
+    """Loads, compiles and caches the rate tables in RATE_TABLES_DIR for this process"""
+
+    _book = None
+    _signature = None
+    _directory = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def book() -> Optional[RateBook]:
+        """Return the compiled rate tables, recompiling if the files changed; None if none are configured"""
+        directory = str(getattr(settings, "RATE_TABLES_DIR", "") or "")
+        # Only stat the files every CATALOG_CHECK_INTERVAL seconds for the same directory
+        interval = getattr(settings, "CATALOG_CHECK_INTERVAL", 5)
+        if directory == RateEngine._directory and time.monotonic() - RateEngine._checked_at < interval:
+            return RateEngine._book
+
+        signature = RateEngine._files_signature(directory)
+        if signature == RateEngine._signature:
+            RateEngine._directory = directory
+            RateEngine._checked_at = time.monotonic()
+            return RateEngine._book
+
+        with RateEngine._lock:
+            RateEngine._directory = directory
+            RateEngine._checked_at = time.monotonic()
+            if signature != RateEngine._signature:
+                book = None
+                if signature:
+                    try:
+                        book = RateEngine.compile(directory)
+                        logger.info(f"Compiled rate tables for {', '.join(book.tables)} from {directory}")
+                    except (OSError, ValueError, KeyError, InvalidOperation, RateTableError) as e:
+                        logger.error(f"Could not load rate tables from {directory}: {str(e)}")
+                RateEngine._book = book
+                RateEngine._signature = signature
+            return RateEngine._book
+
+    @staticmethod
+    def table(service_name: str) -> Optional[RateTable]:
+        book = RateEngine.book()
+        return book.tables.get(service_name) if book else None
+
+    @staticmethod
+    def compile(directory: str) -> RateBook:
+        """Read services.json, its price files and zones.csv into a RateBook"""
+        with open(os.path.join(directory, "services.json")) as f:
+            services = json.load(f)
+
+        digest = hashlib.sha1()
+        tables = {}
+        for name, config in services.items():
+            prices_path = os.path.join(directory, config["prices"])
+            with open(prices_path, "rb") as f:
+                digest.update(f.read())
+            tables[name] = RateTable(
+                name,
+                RateEngine._compile_prices(prices_path),
+                config.get("dim_divisor"),
+                config.get("dim_min_volume", 0)
+            )
+
+        zones_path = os.path.join(directory, "zones.csv")
+        with open(zones_path, "rb") as f:
+            digest.update(f.read())
+        digest.update(json.dumps(services, sort_keys=True).encode())
+        return RateBook(tables, RateEngine._compile_zones(zones_path), digest.hexdigest()[:12])
+
+    @staticmethod
+    def _compile_prices(path: str) -> np.ndarray:
+        """Expand weight breaks into one row per ounce: each weight uses the lightest break that covers it"""
+        with open(path, newline="") as f:
+            rows = list(csv.reader(f))
+        if len(rows) < 2:
+            raise RateTableError(f"{path} has no weight breaks")
+
+        header = [cell.strip().lower() for cell in rows[0]]
+        per_oz = header[0] == "weight_oz"
+        zone_columns = [int(cell.replace("zone", "").strip("_ ")) for cell in header[1:]]
+        if any(zone < 1 or zone > RateTable.MAX_ZONE for zone in zone_columns):
+            raise RateTableError(f"{path} has zones outside 1-{RateTable.MAX_ZONE}")
+
+        breaks = []
+        for row in rows[1:]:
+            if not row or not row[0].strip():
+                continue
+            weight = Decimal(row[0])
+            break_oz = int((weight if per_oz else weight * 16).to_integral_value(ROUND_CEILING))
+            cents = []
+            for cell in row[1:]:
+                cell = cell.strip().lstrip("$")
+                value = Decimal(cell) * 100 if cell else Decimal(-1)
+                if value != value.to_integral_value():
+                    raise RateTableError(f"{path}: price {cell} is not a whole number of cents")
+                cents.append(int(value))
+            breaks.append((break_oz, cents))
+        breaks.sort()
+
+        prices = np.full((breaks[-1][0] + 1, RateTable.MAX_ZONE + 1), -1, dtype=np.int64)
+        low = 1
+        for break_oz, cents in breaks:
+            for zone, price in zip(zone_columns, cents):
+                prices[low:break_oz + 1, zone] = price
+            low = break_oz + 1
+        return prices
+
+    @staticmethod
+    def _compile_zones(path: str) -> np.ndarray:
+        zones = np.zeros((1000, 1000), dtype=np.int8)
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                zones[int(row["origin_zip3"]), int(row["dest_zip3_start"]):int(row["dest_zip3_end"]) + 1] = int(row["zone"])
+        return zones
+
+    @staticmethod
+    def _files_signature(directory: str) -> Optional[tuple]:
+        """Cheap change check: names, sizes and mtimes of the table files, or None if there are none"""
+        if not directory or not os.path.exists(os.path.join(directory, "services.json")):
+            return None
+        return (directory,) + tuple(sorted(
+            (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+            for entry in os.scandir(directory)
+            if entry.is_file()
+        ))
+
+    @staticmethod
+    def zip3(zip_code: Optional[str]) -> int:
+        """ZIP3 prefix of a ZIP or ZIP+4 as an int, or -1 if it isn't one"""
+        digits = (zip_code or "").strip()[:3]
+        return int(digits) if len(digits) == 3 and digits.isdigit() else -1
+
+    @staticmethod
+    def dimension(value) -> int:
+        """A package dimension in inches (Decimal or float) as integer hundredths"""
+        return int((Decimal(str(value)) * 100).to_integral_value(ROUND_CEILING))
+
+    @staticmethod
+    def quote_packages(service_name: str, packages: Sequence, origin_zips: Sequence[Optional[str]], dest_zips: Sequence[Optional[str]]) -> Optional[List[Optional[Decimal]]]:
+        """
+        Price Package instances with a service's rate table, in one vectorized call.
+
+        Returns a Decimal price in dollars per package (None where it can't be priced), or
+        None if the service has no rate table. Missing origins use RATE_DEFAULT_ORIGIN_ZIP.
+        """
+        book = RateEngine.book()
+        table = book.tables.get(service_name) if book else None
+        if table is None:
+            return None
+
+        default_origin = getattr(settings, "RATE_DEFAULT_ORIGIN_ZIP", "")
+        zones = book.zones_for(
+            [RateEngine.zip3(zip_code or default_origin) for zip_code in origin_zips],
+            [RateEngine.zip3(zip_code) for zip_code in dest_zips]
+        )
+        cents = table.quote_batch(
+            [package.weight_lbs * 16 + package.weight_oz for package in packages],
+            [RateEngine.dimension(package.length) for package in packages],
+            [RateEngine.dimension(package.width) for package in packages],
+            [RateEngine.dimension(package.height) for package in packages],
+            zones
+        )
+        return [Decimal(int(value)) / 100 if value >= 0 else None for value in cents]
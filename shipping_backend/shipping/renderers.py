@@ -0,0 +1,39 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed.
+    
+    For data made only of dicts, lists, strings, ints, bools and None (such as
+    ShipmentListSerializer output) the bytes are the same as JSONRenderer's. Anything
+    orjson would encode differently (floats aside, which callers must avoid), indented
+    output and non-default JSON settings fall back to JSONRenderer.
+    """
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Dates, dataclasses and the like go to _unsupported and so back to JSONRenderer
+            ret = orjson.dumps(
+                data,
+                default=self._unsupported,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes these so the output is also valid JavaScript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+    
+    @staticmethod
+    def _unsupported(value):
+        raise TypeError(f"{type(value).__name__} is left to JSONRenderer")
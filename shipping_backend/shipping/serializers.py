@@ -1,21 +1,139 @@
 import logging
+import operator
+from collections import namedtuple
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Address, Package, SavedAddress, SavedPackage, ShippingService, Shipment
+from .catalog import ServiceCatalog
+from .models import Address, ImportJob, Package, SavedAddress, SavedPackage, ShippingService, Shipment
 
 logger = logging.getLogger("shipping")
 
 
-class AddressSerializer(serializers.ModelSerializer):
+def parse_fieldset(serializer, fields: str = "", expand: str = "") -> Optional[Dict]:
+    """
+    Parse ?fields= and ?expand= for a serializer into {field: None | set | False}, or None if neither is given.
+    
+    fields lists the readable fields to keep; "ship_to.city" keeps one field of a nested
+    object. expand lists the nested objects to include in full: with expand given, every
+    other relation is rendered as its primary key (False). None keeps a field whole and a
+    set keeps just those nested fields. Raises ValueError for unknown names.
+    """
+    if not fields and not expand:
+        return None
+    readable = {name: field for name, field in serializer.fields.items() if not field.write_only}
+    nested = {name for name, field in readable.items() if isinstance(field, serializers.BaseSerializer)}
+    
+    fieldset = {}
+    for name in [value.strip() for value in fields.split(",") if value.strip()] or list(readable):
+        name, _, sub = name.partition(".")
+        if name not in readable or (sub and name not in nested):
+            raise ValueError(f"Unknown field: {name}{'.' + sub if sub else ''}")
+        if sub:
+            if sub not in readable[name].fields or readable[name].fields[sub].write_only:
+                raise ValueError(f"Unknown field: {name}.{sub}")
+            if fieldset.get(name, set()) is not None:
+                fieldset.setdefault(name, set()).add(sub)
+        else:
+            fieldset[name] = None
+    
+    if expand:
+        expanded = {value.strip() for value in expand.split(",") if value.strip()}
+        unknown = expanded - nested
+        if unknown:
+            raise ValueError(f"Unknown expand: {', '.join(sorted(unknown))}")
+        for name in nested & set(fieldset):
+            if name not in expanded:
+                fieldset[name] = False
+    return fieldset
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin for ?fields= and ?expand= (see parse_fieldset).
+    
+    With a "fieldset" in the context, fields outside it are dropped, nested serializers
+    keep only the requested fields and collapsed relations become primary keys.
+    read_dependencies names the model fields that fields which are not model fields
+    (methods, get_FOO_display) read, so read_paths can narrow the queryset with only().
+    """
+    read_dependencies = {}
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fieldset = self.context.get("fieldset")
+        if fieldset is None:
+            return
+        for name, field in list(self.fields.items()):
+            if field.write_only:
+                continue
+            if name not in fieldset:
+                self.fields.pop(name)
+            elif fieldset[name] is False:
+                source = {} if field.source == name else {"source": field.source}
+                self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **source)
+            elif fieldset[name]:
+                for sub in [sub for sub, nested in field.fields.items() if not nested.write_only]:
+                    if sub not in fieldset[name]:
+                        field.fields.pop(sub)
+    
+    def read_paths(self, prefix: str = "") -> Optional[Tuple[List[str], List[str]]]:
+        """
+        The (select_related, only) arguments covering every field this serializer will
+        output, or None if some field reads something read_dependencies doesn't describe.
+        """
+        model = self.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        related, only = [], [prefix + model._meta.pk.name]
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in self.read_dependencies:
+                only.extend(prefix + dependency for dependency in self.read_dependencies[name])
+            elif isinstance(field, SparseFieldsMixin):
+                paths = field.read_paths(f"{prefix}{field.source}__")
+                if paths is None:
+                    return None
+                related.extend([prefix + field.source] + paths[0])
+                only.extend(paths[1])
+            elif field.source in concrete:
+                only.append(prefix + field.source)
+            else:
+                return None
+        return related, only
+
+
+class AddressSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     formatted = serializers.CharField(read_only=True)
+    read_dependencies = {
+        "formatted": ["first_name", "last_name", "address_line1", "address_line2", "city", "state", "zip_code"],
+    }
     
     class Meta:
         model = Address
         fields = ["id", "first_name", "last_name", "address_line1", "address_line2", 
                  "city", "state", "zip_code", "phone", "formatted"]
+    
+    def validate(self, attrs):
+        """Reject updates that would turn an address into a duplicate of another one"""
+        if self.instance is not None:
+            merged = {
+                field: getattr(self.instance, field)
+                for field in ["first_name", "last_name", "address_line1", "address_line2", "city", "state", "zip_code", "phone"]
+            }
+            merged.update(attrs)
+            duplicate = Address.objects.filter(
+                fingerprint=Address.fingerprint_for(merged)
+            ).exclude(pk=self.instance.pk).first()
+            if duplicate:
+                raise serializers.ValidationError(f"An address matching this one already exists (id {duplicate.id})")
+        return attrs
 
 
-class PackageSerializer(serializers.ModelSerializer):
+class PackageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     total_weight_oz = serializers.IntegerField(read_only=True)
+    read_dependencies = {"total_weight_oz": ["weight_lbs", "weight_oz"]}
     
     class Meta:
         model = Package
@@ -23,7 +141,7 @@ class PackageSerializer(serializers.ModelSerializer):
                  "item_sku", "total_weight_oz"]
 
 
-class SavedAddressSerializer(serializers.ModelSerializer):
+class SavedAddressSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     address = AddressSerializer(read_only=True)
     address_id = serializers.IntegerField(write_only=True, required=False)
     
@@ -32,7 +150,7 @@ class SavedAddressSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "address", "address_id", "created_at"]
 
 
-class SavedPackageSerializer(serializers.ModelSerializer):
+class SavedPackageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     package = PackageSerializer(read_only=True)
     package_id = serializers.IntegerField(write_only=True, required=False)
     
@@ -41,24 +159,34 @@ class SavedPackageSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "package", "package_id", "created_at"]
 
 
-class ShippingServiceSerializer(serializers.ModelSerializer):
+class ShippingServiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     name_display = serializers.CharField(source="get_name_display", read_only=True)
+    read_dependencies = {"name_display": ["name"]}
     
     class Meta:
         model = ShippingService
         fields = ["id", "name", "name_display", "base_price", "per_oz_rate"]
 
 
-class ShipmentSerializer(serializers.ModelSerializer):
+class CatalogShippingServiceSerializer(ShippingServiceSerializer):
+    """Nested shipping service read from the in-process ServiceCatalog instead of a join or query"""
+    
+    def get_attribute(self, instance):
+        return ServiceCatalog.get(instance.shipping_service_id) if instance.shipping_service_id else None
+
+
+class ShipmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     ship_from = AddressSerializer(read_only=True)
     ship_from_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
     ship_to = AddressSerializer(read_only=True)
     ship_to_id = serializers.IntegerField(write_only=True, required=False)
     package = PackageSerializer(read_only=True)
     package_id = serializers.IntegerField(write_only=True, required=False)
-    shipping_service = ShippingServiceSerializer(read_only=True)
+    shipping_service = CatalogShippingServiceSerializer(read_only=True)
     shipping_service_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
     status_display = serializers.CharField(source="get_status_display", read_only=True)
+    # The nested service comes from ServiceCatalog, so only its id is read
+    read_dependencies = {"status_display": ["status"], "shipping_service": ["shipping_service"]}
     
     class Meta:
         model = Shipment
@@ -128,3 +256,150 @@ class BulkShipmentCreateSerializer(serializers.Serializer):
         
         logger.info(f"Bulk created {len(created_shipments)} shipments")
         return {"shipments": created_shipments}
+
+
+class ImportJobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    status_display = serializers.CharField(source="get_status_display", read_only=True)
+    elapsed_seconds = serializers.FloatField(read_only=True)
+    throughput = serializers.FloatField(read_only=True)
+    read_dependencies = {
+        "status_display": ["status"],
+        "elapsed_seconds": ["started_at", "finished_at"],
+        "throughput": ["rows_parsed", "started_at", "finished_at"],
+    }
+    
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id", "original_name", "status", "status_display", "upsert", "unpurchased_only",
+            "rows_parsed", "rows_created", "rows_updated", "rows_unchanged", "rows_duplicate", "rows_failed",
+            "throughput", "elapsed_seconds",
+            "errors", "error", "created_at", "started_at", "finished_at"
+        ]
+        read_only_fields = fields
+
+
+class QuoteRequestSerializer(serializers.Serializer):
+    """One package to quote: inline dimensions or a SavedPackage preset, plus the route ZIPs"""
+    package = PackageSerializer(required=False)
+    saved_package_id = serializers.IntegerField(required=False)
+    ship_from_zip = serializers.CharField(max_length=10, required=False, allow_blank=True, default="")
+    ship_to_zip = serializers.CharField(max_length=10, required=False, allow_blank=True, default="")
+    
+    def validate(self, attrs):
+        if ("package" in attrs) == ("saved_package_id" in attrs):
+            raise serializers.ValidationError("Provide either package or saved_package_id")
+        return attrs
+
+
+class ServiceQuoteSerializer(serializers.Serializer):
+    service_id = serializers.IntegerField(source="service.id")
+    service = serializers.CharField(source="service.name")
+    name_display = serializers.CharField(source="service.get_name_display")
+    price = serializers.DecimalField(max_digits=8, decimal_places=2)
+
+
+class ShipmentListSerializer:
+    """
+    Read-only fast path that produces exactly ShipmentSerializer's output for shipment lists.
+    
+    Rows are read with one values_list() query (named, so cursor pagination and the
+    changefeed can read their positions) instead of model instances. Each output field gets an accessor
+    compiled from ShipmentSerializer's own fields (see compile), so DRF's per-field
+    dispatch runs once per request rather than once per row, and a ?fields=/?expand=
+    fieldset narrows the columns read as well as the output.
+    """
+    # Always read, so cursor pagination and the changefeed can find their position
+    ORDERING_COLUMNS = ["id", "created_at", "updated_at"]
+    
+    @staticmethod
+    def rows(queryset, fieldset: Dict = None):
+        columns, _ = ShipmentListSerializer.compile(fieldset)
+        return queryset.select_related(None).values_list(*columns, named=True)
+    
+    @staticmethod
+    def to_representation(rows, fieldset: Dict = None) -> List[Dict]:
+        """Build the ShipmentSerializer(many=True).data equivalent for rows from rows() with the same fieldset"""
+        _, emitters = ShipmentListSerializer.compile(fieldset)
+        return [{key: emit(row) for key, emit in emitters} for row in rows]
+    
+    @staticmethod
+    def compile(fieldset: Dict = None) -> Tuple[List[str], List[Tuple]]:
+        """The values_list() columns and the (key, accessor) pairs that turn a row into output"""
+        columns = list(ShipmentListSerializer.ORDERING_COLUMNS)
+        
+        def column(path):
+            if path not in columns:
+                columns.append(path)
+            return columns.index(path)
+        
+        emitters = ShipmentListSerializer._compile_fields(
+            ShipmentSerializer(context={"fieldset": fieldset}), "", column
+        )
+        return columns, emitters
+    
+    @staticmethod
+    def _compile_fields(serializer, prefix: str, column) -> List[Tuple]:
+        model = serializer.Meta.model
+        concrete = {field.name: field for field in model._meta.concrete_fields}
+        tz = timezone.get_current_timezone()
+        emitters = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = prefix + field.source
+            
+            if isinstance(field, CatalogShippingServiceSerializer):
+                emit = ShipmentListSerializer._catalog_accessor(column(source), list(field.fields))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = ShipmentListSerializer._compile_fields(field, source + "__", column)
+                pk = column(f"{source}__{field.Meta.model._meta.pk.name}")
+                emit = (lambda nested, pk: lambda row: None if row[pk] is None else {key: get(row) for key, get in nested})(nested, pk)
+            elif isinstance(field, serializers.RelatedField) or (field.source in concrete and not isinstance(
+                field, (serializers.DecimalField, serializers.DateTimeField)
+            )):
+                # Collapsed relations read the foreign key column; ints and strings pass through
+                emit = operator.itemgetter(column(source))
+            elif isinstance(field, serializers.DecimalField):
+                emit = (lambda idx, exponent: lambda row: None if row[idx] is None else "{:f}".format(row[idx].quantize(exponent)))(
+                    column(source), Decimal(1).scaleb(-field.decimal_places)
+                )
+            elif isinstance(field, serializers.DateTimeField):
+                emit = (lambda idx: lambda row: None if row[idx] is None else ShipmentListSerializer._timestamp(row[idx], tz))(column(source))
+            elif field.source.startswith("get_") and field.source.endswith("_display"):
+                choices = dict(model._meta.get_field(field.source[4:-8]).flatchoices)
+                idx = column(prefix + field.source[4:-8])
+                emit = (lambda idx, choices: lambda row: choices.get(row[idx], row[idx]))(idx, choices)
+            else:
+                # A model method such as Address.formatted, called on a stand-in with the fields it reads
+                dependencies = serializer.read_dependencies[name]
+                stand_in = namedtuple(f"{model.__name__}Row", dependencies)
+                indexes = [column(prefix + dependency) for dependency in dependencies]
+                method = getattr(model, field.source)
+                emit = (lambda method, stand_in, indexes: lambda row: method(stand_in(*[row[idx] for idx in indexes])))(
+                    method, stand_in, indexes
+                )
+            emitters.append((name, emit))
+        return emitters
+    
+    @staticmethod
+    def _catalog_accessor(idx: int, fields: List[str]):
+        """Nested services from ServiceCatalog, serialized once per request"""
+        services = {}
+        
+        def emit(row):
+            pk = row[idx]
+            if pk is None:
+                return None
+            if pk not in services:
+                service = ServiceCatalog.get(pk)
+                data = CatalogShippingServiceSerializer(service).data if service else None
+                services[pk] = {key: data[key] for key in fields} if data else None
+            return services[pk]
+        return emit
+    
+    @staticmethod
+    def _timestamp(value, tz) -> str:
+        """DRF's DateTimeField output: ISO 8601 in the current timezone, with Z for UTC"""
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
@@ -1,9 +1,44 @@
+import codecs
+import contextlib
 import csv
+import difflib
+import gc
+import hashlib
+import json
 import logging
+import mmap
+import os
+import pickle
+import random
+import re
+import struct
+import threading
+import time
+import django
+import numpy as np
 import requests
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple, Iterable, Iterator, IO
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_EVEN
 from io import StringIO
+from xml.etree import ElementTree
 from django.conf import settings
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import BigIntegerField, Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from rest_framework.utils.encoders import JSONEncoder
+
+from .catalog import ServiceCatalog
+from .models import (
+    Address, AddressValidationResult, CacheVersion, ImportJob, Package, SavedAddress, SavedPackage, Shipment,
+    ShipmentTombstone, ShipmentTotal, ShippingService
+)
+from .rates import RateEngine
+from .serializers import ShipmentListSerializer
 
 logger = logging.getLogger("shipping")
 
@@ -18,9 +53,23 @@ class AddressValidationError(Exception):
     pass
 
 
+class ExpiredCursorError(Exception):
+    """A changefeed cursor older than the tombstones that are kept"""
+    pass
+
+
 class CSVParser:
     """Service for parsing CSV files and creating shipment records"""
     
+    # The two header rows of Template.csv
+    HEADER_ROWS = [
+        ["From", "", "", "", "", "", "", "To", "", "", "", "", "", "",
+         "weight*", "weight*", "Dimensions*", "Dimensions*", "Dimensions*", "", "", "", ""],
+        ["First name*", "Last name", "Address*", "Address2", "City*", "ZIP/Postal code*", "Abbreviation*",
+         "First name*", "Last name", "Address*", "Address2", "City*", "ZIP/Postal code*", "Abbreviation*",
+         "lbs", "oz", "Length", "width", "Height", "phone num1", "phone num2", "order no", "Item-sku"],
+    ]
+    
     @staticmethod
     def parse_csv(file_content: str) -> Tuple[List[Dict], List[str]]:
         """
@@ -41,38 +90,239 @@ class CSVParser:
         """
         logger.info("Starting CSV parsing")
         
+        shipments = []
+        errors = []
+        for row_num, shipment_data, error in CSVParser.iter_rows(StringIO(file_content)):
+            if error:
+                errors.append(error)
+            elif shipment_data:
+                shipments.append(shipment_data)
+        
+        logger.info(f"Successfully parsed {len(shipments)} shipments from CSV")
+        if errors:
+            logger.warning(f"Encountered {len(errors)} errors during parsing")
+        
+        return shipments, errors
+    
+    @staticmethod
+    def iter_rows(lines: Iterable[str]) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+        """
+        Parse CSV lines lazily, yielding one (row_num, shipment_data, error) tuple per data row.
+        
+        Only the current row is held in memory. shipment_data is None for rows that
+        were skipped or failed to parse; error is set for the latter.
+        """
         try:
-            reader = csv.reader(StringIO(file_content))
-            rows = list(reader)
-            
-            if len(rows) < 3:
-                raise CSVParseError("CSV file must have at least 3 rows (2 headers + 1 data row)")
+            reader = csv.reader(lines)
             
             # Skip first two header rows
-            data_rows = rows[2:]
-            shipments = []
-            errors = []
+            header_rows = 0
+            for _ in reader:
+                header_rows += 1
+                if header_rows == 2:
+                    break
             
-            for idx, row in enumerate(data_rows, start=3):
-                try:
-                    shipment_data = CSVParser._parse_row(row, idx)
-                    if shipment_data:
-                        shipments.append(shipment_data)
-                except Exception as e:
-                    error_msg = f"Error parsing row {idx}: {str(e)}"
-                    logger.warning(error_msg)
-                    errors.append(error_msg)
-            
-            logger.info(f"Successfully parsed {len(shipments)} shipments from CSV")
-            if errors:
-                logger.warning(f"Encountered {len(errors)} errors during parsing")
+            data_rows = 0
+            for row in reader:
+                data_rows += 1
+                yield CSVParser._parse_numbered_row(row, data_rows + 2)
             
-            return shipments, errors
+            if not data_rows:
+                raise CSVParseError("CSV file must have at least 3 rows (2 headers + 1 data row)")
             
         except Exception as e:
             logger.error(f"CSV parsing failed: {str(e)}")
             raise CSVParseError(f"Failed to parse CSV: {str(e)}")
     
+    @staticmethod
+    def _parse_numbered_row(row: List[str], idx: int) -> Tuple[int, Optional[Dict], Optional[str]]:
+        try:
+            return idx, CSVParser._parse_row(row, idx), None
+        except Exception as e:
+            error_msg = f"Error parsing row {idx}: {str(e)}"
+            logger.warning(error_msg)
+            return idx, None, error_msg
+    
+    @staticmethod
+    def iter_file_rows(file: IO[bytes], chunk_size: int = None) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+        """
+        Parse an uploaded binary file lazily, decoding it in fixed-size chunks.
+        
+        Files on disk larger than CSV_PARALLEL_PARSE_THRESHOLD are parsed across a
+        process pool instead; the rows come back in the same order either way.
+        """
+        chunk_size = chunk_size or getattr(settings, "CSV_IMPORT_CHUNK_SIZE", 64 * 1024)
+        encoding = CSVParser.detect_encoding(file, chunk_size)
+        
+        path = CSVParser._file_path(file)
+        workers = getattr(settings, "CSV_PARALLEL_PARSE_WORKERS", None) or os.cpu_count() or 1
+        threshold = getattr(settings, "CSV_PARALLEL_PARSE_THRESHOLD", 32 * 1024 * 1024)
+        if path and workers > 1 and os.path.getsize(path) >= threshold:
+            logger.info(f"Parsing CSV file using {encoding} encoding across {workers} processes")
+            return CSVParser.iter_rows_parallel(path, encoding, workers)
+        
+        logger.info(f"Streaming CSV file using {encoding} encoding")
+        return CSVParser.iter_rows(CSVParser._iter_lines(file, encoding, chunk_size))
+    
+    @staticmethod
+    def iter_rows_parallel(path: str, encoding: str, workers: int, segment_size: int = None) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+        """
+        Parse a CSV file on disk with a process pool, yielding the same tuples as iter_rows.
+        
+        The parent walks the file once with the C csv reader to find record boundaries
+        (so quoted newlines never split a record) and hands each worker a byte range and
+        its first row number. Workers run _parse_row over their range and the results are
+        yielded in file order. At most two segments per worker are in flight at a time.
+        """
+        segment_size = segment_size or getattr(settings, "CSV_PARALLEL_SEGMENT_SIZE", 4 * 1024 * 1024)
+        try:
+            with open(path, "rb") as file, ProcessPoolExecutor(
+                max_workers=workers, initializer=django.setup
+            ) as pool:
+                pending = deque()
+                for segment in CSVParser._iter_segments(file, segment_size):
+                    pending.append(pool.submit(CSVParser._parse_segment, path, encoding, *segment))
+                    if len(pending) >= workers * 2:
+                        yield from CSVParser._load_segment(pending.popleft().result())
+                while pending:
+                    yield from CSVParser._load_segment(pending.popleft().result())
+        except CSVParseError:
+            raise
+        except Exception as e:
+            logger.error(f"CSV parsing failed: {str(e)}")
+            raise CSVParseError(f"Failed to parse CSV: {str(e)}")
+    
+    @staticmethod
+    def _iter_segments(file: IO[bytes], segment_size: int) -> Iterator[Tuple[int, int, int]]:
+        """Yield (start, end, first_row_num) byte ranges that each hold whole CSV records"""
+        offset = 0
+        
+        def lines():
+            nonlocal offset
+            for raw in file:
+                offset += len(raw)
+                # Every CSV control character is ASCII, so latin-1 is enough to find records
+                yield raw.decode("latin-1")
+        
+        # The reader pulls exactly one record's lines per row, so offset always
+        # sits on the boundary right after the record it just returned
+        reader = csv.reader(lines())
+        header_rows = 0
+        for _ in reader:
+            header_rows += 1
+            if header_rows == 2:
+                break
+        
+        start = offset
+        first_row = 3
+        rows = 0
+        for _ in reader:
+            rows += 1
+            if offset - start >= segment_size:
+                yield start, offset, first_row
+                start = offset
+                first_row += rows
+                rows = 0
+        if rows:
+            yield start, offset, first_row
+        elif first_row == 3:
+            raise CSVParseError("Failed to parse CSV: CSV file must have at least 3 rows (2 headers + 1 data row)")
+    
+    @staticmethod
+    def _parse_segment(path: str, encoding: str, start: int, end: int, first_row: int) -> bytes:
+        """Process pool worker: parse the records in one byte range of the file"""
+        with open(path, "rb") as file:
+            file.seek(start)
+            text = file.read(end - start).decode(encoding)
+        reader = csv.reader(StringIO(text))
+        rows = [CSVParser._parse_numbered_row(row, idx) for idx, row in enumerate(reader, start=first_row)]
+        return pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    @staticmethod
+    def _load_segment(payload: bytes) -> List[Tuple[int, Optional[Dict], Optional[str]]]:
+        """
+        Unpickle a worker's results with the cyclic GC paused.
+        
+        Rebuilding hundreds of thousands of small dicts otherwise triggers repeated
+        collections, which more than doubles the time the parent spends here.
+        """
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.loads(payload)
+        finally:
+            if gc_enabled:
+                gc.enable()
+    
+    @staticmethod
+    def _file_path(file) -> Optional[str]:
+        """Return the filesystem path backing an uploaded or stored file, if there is one"""
+        for getter in (lambda: file.temporary_file_path(), lambda: file.path):
+            try:
+                path = getter()
+            except (AttributeError, NotImplementedError, ValueError):
+                continue
+            if path and os.path.isfile(path):
+                return path
+        return None
+    
+    @staticmethod
+    def iter_batches(rows: Iterable[Tuple[int, Optional[Dict], Optional[str]]], batch_size: int) -> Iterator[Tuple[List[Dict], List[str]]]:
+        """Group parsed rows into (shipments, errors) batches of at most batch_size shipments"""
+        shipments = []
+        errors = []
+        for row_num, shipment_data, error in rows:
+            if error:
+                errors.append(error)
+            elif shipment_data:
+                shipments.append(shipment_data)
+                if len(shipments) >= batch_size:
+                    yield shipments, errors
+                    shipments = []
+                    errors = []
+        if shipments or errors:
+            yield shipments, errors
+    
+    @staticmethod
+    def detect_encoding(file: IO[bytes], chunk_size: int = 64 * 1024) -> str:
+        """
+        Pick the encoding for an uploaded file without loading it into memory.
+        
+        Runs the file through an incremental UTF-8 decoder (BOM tolerant) and falls
+        back to latin-1, which accepts any byte sequence. The file is rewound afterwards.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        file.seek(0)
+        try:
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    decoder.decode(b"", final=True)
+                    break
+                decoder.decode(chunk)
+            encoding = "utf-8-sig"
+        except UnicodeDecodeError:
+            encoding = "latin-1"
+        file.seek(0)
+        return encoding
+    
+    @staticmethod
+    def _iter_lines(file: IO[bytes], encoding: str, chunk_size: int) -> Iterator[str]:
+        """Decode a binary file chunk by chunk and yield it line by line"""
+        decoder = codecs.getincrementaldecoder(encoding)()
+        pending = ""
+        while True:
+            chunk = file.read(chunk_size)
+            pending += decoder.decode(chunk, final=not chunk)
+            lines = pending.split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line + "\n"
+            if not chunk:
+                break
+        if pending:
+            yield pending
+    
     @staticmethod
     def _parse_row(row: List[str], row_num: int) -> Optional[Dict]:
         """Parse a single CSV row into shipment data"""
@@ -150,6 +400,9 @@ class CSVParser:
             },
             "order_number": order_number or f"ORD-{row_num}",
         }
+        if not order_number:
+            # Made up from the row position, so upserts must not match existing shipments on it
+            shipment_data["generated_order_number"] = True
         
         return shipment_data
     
@@ -170,6 +423,1482 @@ class CSVParser:
             return default
 
 
+class ShipmentImporter:
+    """Service for persisting parsed CSV rows as shipments in bounded batches"""
+    
+    PACKAGE_FIELDS = ["length", "width", "height", "weight_lbs", "weight_oz", "item_sku"]
+    
+    def __init__(self, batch_size: int = None, keep_shipments: bool = True, on_batch: Callable = None,
+                 upsert: bool = False, unpurchased_only: bool = False):
+        self.batch_size = batch_size or getattr(settings, "CSV_IMPORT_BATCH_SIZE", 1000)
+        self.keep_shipments = keep_shipments
+        self.on_batch = on_batch
+        # In upsert mode rows update the existing shipment with the same order number
+        # (optionally ignoring purchased ones) instead of creating a duplicate
+        self.upsert = upsert
+        self.unpurchased_only = unpurchased_only
+        self.parsed_count = 0
+        self.created_count = 0
+        self.updated_count = 0
+        self.unchanged_count = 0
+        # Rows superseded by a later row with the same order number in the same batch
+        self.duplicate_count = 0
+        self.created_shipments = []
+        self.parse_errors = []
+        self.creation_errors = []
+    
+    @property
+    def errors(self) -> List[str]:
+        return self.parse_errors + self.creation_errors
+    
+    def drain_errors(self) -> List[str]:
+        """Return the errors collected so far and forget them"""
+        errors = self.errors
+        self.parse_errors = []
+        self.creation_errors = []
+        return errors
+    
+    def import_file(self, file: IO[bytes], atomic: bool = False) -> "ShipmentImporter":
+        """
+        Stream an uploaded CSV file into the database one batch at a time.
+        
+        Each batch commits on its own, so on_batch can report progress. With atomic the
+        whole file is one transaction instead, and a CSVParseError part-way through
+        leaves nothing behind.
+        """
+        with transaction.atomic() if atomic else contextlib.nullcontext():
+            rows = CSVParser.iter_file_rows(file)
+            for shipments_data, errors in CSVParser.iter_batches(rows, self.batch_size):
+                self.parse_errors.extend(errors)
+                if shipments_data:
+                    self.import_batch(shipments_data)
+                if self.on_batch:
+                    self.on_batch(self)
+        
+        logger.info(
+            f"Imported {self.parsed_count} parsed shipments from CSV: {self.created_count} created, "
+            f"{self.updated_count} updated, {self.unchanged_count} unchanged, {self.duplicate_count} duplicates"
+        )
+        return self
+    
+    def import_batch(self, shipments_data: List[Dict]) -> List[Shipment]:
+        """
+        Create shipments (and their addresses and packages) for one batch of parsed rows.
+        
+        The batch is written with one address lookup and a bulk INSERT per model, never
+        per-row queries. On PostgreSQL that is one statement per model; SQLite allows 999
+        parameters per statement, so Django splits the INSERTs and a 1000-row batch of new
+        shipments takes about 30-40 statements (100-200 rows per INSERT). If any of them
+        fails, the batch is rolled back and replayed row by row so that each failing row
+        gets its own entry in creation_errors, as before. Returns the shipments that were
+        created or updated.
+        """
+        first_row = self.parsed_count + 1
+        self.parsed_count += len(shipments_data)
+        
+        try:
+            if not connection.features.can_return_rows_from_bulk_insert:
+                raise NotSupportedError("Database cannot return primary keys from bulk inserts")
+            with transaction.atomic():
+                if self.upsert:
+                    created_shipments, updated_shipments, unchanged, duplicates = self._bulk_upsert_shipments(
+                        shipments_data
+                    )
+                else:
+                    created_shipments, updated_shipments, unchanged, duplicates = (
+                        self._bulk_create_shipments(shipments_data), [], 0, 0
+                    )
+        except Exception as e:
+            logger.warning(f"Bulk import of rows {first_row}-{self.parsed_count} failed ({str(e)}), retrying row by row")
+            created_shipments, updated_shipments, unchanged = self._import_row_by_row(shipments_data, first_row)
+            duplicates = 0
+        
+        self.created_count += len(created_shipments)
+        self.updated_count += len(updated_shipments)
+        self.unchanged_count += unchanged
+        self.duplicate_count += duplicates
+        if self.keep_shipments:
+            self.created_shipments.extend(created_shipments)
+            self.created_shipments.extend(updated_shipments)
+        return created_shipments + updated_shipments
+    
+    def _import_row_by_row(self, shipments_data: List[Dict], first_row: int) -> Tuple[List[Shipment], List[Shipment], int]:
+        created_shipments = []
+        updated_shipments = []
+        unchanged = 0
+        with transaction.atomic():
+            for row, shipment_data in enumerate(shipments_data, start=first_row):
+                try:
+                    with transaction.atomic():
+                        if self.upsert:
+                            created, updated, skipped, _ = self._bulk_upsert_shipments([shipment_data])
+                            created_shipments.extend(created)
+                            updated_shipments.extend(updated)
+                            unchanged += skipped
+                        else:
+                            created_shipments.append(self._create_shipment(shipment_data))
+                except Exception as e:
+                    error_msg = f"Error creating shipment {row}: {str(e)}"
+                    logger.error(error_msg)
+                    self.creation_errors.append(error_msg)
+        return created_shipments, updated_shipments, unchanged
+    
+    @staticmethod
+    def content_hash(shipment_data: Dict) -> str:
+        """Stable hash of a parsed row, used to skip rows that have not changed since the last import"""
+        # Whether the order number was generated is not content: an exported file carries
+        # the generated numbers, and re-importing it must find the rows unchanged
+        content = {key: value for key, value in shipment_data.items() if key != "generated_order_number"}
+        payload = json.dumps(content, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def _address_key(address_data: Dict) -> str:
+        return Address.fingerprint_for(address_data)
+    
+    def _bulk_upsert_shipments(self, shipments_data: List[Dict]) -> Tuple[List[Shipment], List[Shipment], int, int]:
+        """
+        Insert or update a batch keyed on order_number with one lookup and bulk writes.
+        
+        Rows whose content hash matches the stored one are skipped without touching
+        addresses or packages. Rows without an order number in the CSV are always
+        inserted. Returns (created, updated, unchanged_count, duplicate_count), where
+        duplicates are rows overridden by a later row with the same order number.
+        """
+        # Last row wins for order numbers repeated within the batch
+        rows = {}
+        to_create = []
+        duplicates = 0
+        for shipment_data in shipments_data:
+            if shipment_data.get("generated_order_number"):
+                to_create.append(shipment_data)
+            else:
+                duplicates += shipment_data["order_number"] in rows
+                rows[shipment_data["order_number"]] = shipment_data
+        
+        existing_shipments = Shipment.objects.filter(order_number__in=list(rows)).select_related(
+            "package"
+        ).order_by("id")
+        if self.unpurchased_only:
+            existing_shipments = existing_shipments.exclude(status="purchased")
+        # The most recent shipment wins when an order number was imported more than once
+        existing = {shipment.order_number: shipment for shipment in existing_shipments}
+        
+        to_update = []
+        for order_number, shipment_data in rows.items():
+            shipment = existing.get(order_number)
+            if shipment is None:
+                to_create.append(shipment_data)
+            elif shipment.content_hash != ShipmentImporter.content_hash(shipment_data):
+                to_update.append((shipment, shipment_data))
+        unchanged = len(shipments_data) - duplicates - len(to_create) - len(to_update)
+        
+        addresses = ShipmentImporter._resolve_addresses(to_create + [data for _, data in to_update])
+        created = ShipmentImporter._insert_shipments(to_create, addresses)
+        
+        now = timezone.now()
+        packages = []
+        updated = []
+        for shipment, shipment_data in to_update:
+            for field in ShipmentImporter.PACKAGE_FIELDS:
+                setattr(shipment.package, field, shipment_data["package"][field])
+            packages.append(shipment.package)
+            
+            shipment.ship_from = ShipmentImporter._ship_from(shipment_data, addresses)
+            shipment.ship_to = addresses[ShipmentImporter._address_key(shipment_data["ship_to"])]
+            shipment.content_hash = ShipmentImporter.content_hash(shipment_data)
+            # Changed rows need validating again; purchased labels keep their status
+            if shipment.status != "purchased":
+                shipment.status = "pending"
+            service = ServiceCatalog.get(shipment.shipping_service_id)
+            if service:
+                shipment.shipping_price = service.calculate_price(
+                    shipment.package,
+                    shipment.ship_from.zip_code if shipment.ship_from else None,
+                    shipment.ship_to.zip_code
+                )
+            # bulk_update does not apply auto_now
+            shipment.updated_at = now
+            updated.append(shipment)
+        
+        if updated:
+            Package.objects.bulk_update(packages, ShipmentImporter.PACKAGE_FIELDS)
+            Shipment.objects.bulk_update(
+                updated, ["ship_from", "ship_to", "content_hash", "status", "shipping_price", "updated_at"]
+            )
+            ShipmentTotals.mark(updated)
+            ResourceVersions.mark(Package, Shipment)
+        
+        return created, updated, unchanged, duplicates
+    
+    @staticmethod
+    def _bulk_create_shipments(shipments_data: List[Dict]) -> List[Shipment]:
+        """Persist a batch with one address lookup and bulk writes for every model"""
+        addresses = ShipmentImporter._resolve_addresses(shipments_data)
+        return ShipmentImporter._insert_shipments(shipments_data, addresses)
+    
+    @staticmethod
+    def _resolve_addresses(shipments_data: List[Dict]) -> Dict[str, Address]:
+        """Find or create every address in a batch, keyed by fingerprint"""
+        address_rows = {}
+        for shipment_data in shipments_data:
+            address_rows.setdefault(ShipmentImporter._address_key(shipment_data["ship_to"]), shipment_data["ship_to"])
+            ship_from_data = shipment_data.get("ship_from")
+            if ship_from_data and ship_from_data.get("address_line1"):
+                address_rows.setdefault(ShipmentImporter._address_key(ship_from_data), ship_from_data)
+        
+        # Resolve every address in the batch with a single indexed lookup. Matching rows
+        # may be shared by other shipments, so they are reused as stored
+        addresses = {
+            address.fingerprint: address
+            for address in Address.objects.filter(fingerprint__in=list(address_rows))
+        }
+        
+        new_addresses = []
+        for key, address_data in address_rows.items():
+            if key not in addresses:
+                # bulk_create bypasses Address.save(), so set the fingerprint here
+                address = Address(fingerprint=key, **address_data)
+                addresses[key] = address
+                new_addresses.append(address)
+        
+        Address.objects.bulk_create(new_addresses)
+        if new_addresses:
+            ResourceVersions.mark(Address)
+        return addresses
+    
+    @staticmethod
+    def _ship_from(shipment_data: Dict, addresses: Dict[str, Address]) -> Optional[Address]:
+        ship_from_data = shipment_data.get("ship_from")
+        if ship_from_data and ship_from_data.get("address_line1"):
+            return addresses[ShipmentImporter._address_key(ship_from_data)]
+        return None
+    
+    @staticmethod
+    def _insert_shipments(shipments_data: List[Dict], addresses: Dict[str, Address]) -> List[Shipment]:
+        if not shipments_data:
+            return []
+        
+        packages = Package.objects.bulk_create(
+            [Package(**shipment_data["package"]) for shipment_data in shipments_data]
+        )
+        
+        shipments = []
+        for shipment_data, package in zip(shipments_data, packages):
+            shipments.append(Shipment(
+                ship_from=ShipmentImporter._ship_from(shipment_data, addresses),
+                ship_to=addresses[ShipmentImporter._address_key(shipment_data["ship_to"])],
+                package=package,
+                order_number=shipment_data["order_number"],
+                status="pending",
+                content_hash=ShipmentImporter.content_hash(shipment_data)
+            ))
+        created = Shipment.objects.bulk_create(shipments)
+        ShipmentTotals.mark(created)
+        ResourceVersions.mark(Package, Shipment)
+        return created
+    
+    @staticmethod
+    def _create_shipment(shipment_data: Dict) -> Shipment:
+        ship_to = Address.get_or_create_matching(shipment_data["ship_to"])[0]
+        
+        ship_from = None
+        if shipment_data.get("ship_from") and shipment_data["ship_from"].get("address_line1"):
+            ship_from = Address.get_or_create_matching(shipment_data["ship_from"])[0]
+        
+        package = Package.objects.create(**shipment_data["package"])
+        
+        return Shipment.objects.create(
+            ship_from=ship_from,
+            ship_to=ship_to,
+            package=package,
+            order_number=shipment_data["order_number"],
+            status="pending",
+            content_hash=ShipmentImporter.content_hash(shipment_data)
+        )
+
+
+class ShipmentRepricer:
+    """Assign shipping services to many shipments and reprice them in batches"""
+    
+    CHUNK_SIZE = 1000
+    
+    @staticmethod
+    def apply_service(shipment_ids: List[int], service) -> int:
+        """
+        Set service on the given shipments and recalculate their prices.
+        
+        Packages and ZIPs are read with the shipments in one query per chunk and priced
+        as ShippingService.calculate_price would (see prices). Returns the number of
+        shipments updated.
+        """
+        groups = {}
+        for shipments in ShipmentRepricer._chunks(shipment_ids):
+            for shipment, price in zip(shipments, ShipmentRepricer.prices(shipments, service)):
+                groups.setdefault((service, price), []).append(shipment.id)
+        return ShipmentRepricer._write(groups)
+    
+    @staticmethod
+    def apply_cheapest(shipment_ids: List[int]) -> Dict:
+        """
+        Give each shipment whichever service prices it lowest.
+        
+        Every service is priced for a whole chunk at once and the cheapest is picked per
+        shipment with an argmin (ties go to the lower service id). Returns the number
+        updated, how many shipments got each service, and the savings against the old
+        behaviour of giving every shipment the service with the lowest base price.
+        """
+        services = ServiceCatalog.all()
+        if not services:
+            return {"updated": 0, "services": {}, "savings": 0.0}
+        baseline = min(range(len(services)), key=lambda idx: float(services[idx].base_price))
+        
+        groups = {}
+        counts = {service.name: 0 for service in services}
+        savings = Decimal(0)
+        for shipments in ShipmentRepricer._chunks(shipment_ids):
+            quotes = [ShipmentRepricer.prices(shipments, service) for service in services]
+            cents = np.array([[ShipmentRepricer._cents(price) for price in prices] for prices in quotes], dtype=np.int64)
+            cheapest = cents.argmin(axis=0)
+            savings += int((cents[baseline] - cents[cheapest, np.arange(len(shipments))]).sum())
+            for idx, (shipment, choice) in enumerate(zip(shipments, cheapest.tolist())):
+                groups.setdefault((services[choice], quotes[choice][idx]), []).append(shipment.id)
+                counts[services[choice].name] += 1
+        
+        return {
+            "updated": ShipmentRepricer._write(groups),
+            "services": counts,
+            "savings": float(savings / 100),
+        }
+    
+    @staticmethod
+    def prices(shipments: List[Shipment], service) -> List:
+        """
+        Price shipments (with package, ship_from and ship_to loaded) as calculate_shipping_price would.
+        
+        Rate-table services are priced in one vectorized call. The rest use the base +
+        per-oz formula over a weight vector; float64 arithmetic gives the same floats as
+        calculate_price, so stored prices are identical.
+        """
+        quoted = RateEngine.quote_packages(
+            service.name,
+            [shipment.package for shipment in shipments],
+            [shipment.ship_from.zip_code if shipment.ship_from else None for shipment in shipments],
+            [shipment.ship_to.zip_code for shipment in shipments]
+        ) or [None] * len(shipments)
+        
+        weight_oz = np.array([shipment.package.total_weight_oz() for shipment in shipments], dtype=np.float64)
+        formula = (float(service.base_price) + float(service.per_oz_rate) * weight_oz).tolist()
+        return [price if price is not None else fallback for price, fallback in zip(quoted, formula)]
+    
+    @staticmethod
+    def _chunks(shipment_ids: List[int]) -> Iterator[List[Shipment]]:
+        """Yield shipments with the package and ZIP fields pricing needs, CHUNK_SIZE at a time"""
+        for start in range(0, len(shipment_ids), ShipmentRepricer.CHUNK_SIZE):
+            yield list(
+                Shipment.objects.filter(id__in=shipment_ids[start:start + ShipmentRepricer.CHUNK_SIZE])
+                .select_related("package", "ship_from", "ship_to")
+                .only(
+                    "id", "package__weight_lbs", "package__weight_oz", "package__length",
+                    "package__width", "package__height", "ship_from__zip_code", "ship_to__zip_code"
+                )
+            )
+    
+    @staticmethod
+    def _write(groups: Dict[Tuple, List[int]]) -> int:
+        """
+        Write {(service, price): shipment ids} with one UPDATE per group and chunk.
+        
+        Prices only depend on weight and zone, so groups are few. Only shipping_service,
+        shipping_price and updated_at are written, and prices go through the same
+        DecimalField conversion as save().
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            for (service, price), ids in groups.items():
+                for start in range(0, len(ids), ShipmentRepricer.CHUNK_SIZE):
+                    Shipment.objects.filter(id__in=ids[start:start + ShipmentRepricer.CHUNK_SIZE]).update(
+                        shipping_service=service, shipping_price=price, updated_at=now
+                    )
+            ShipmentTotals.mark_ids([pk for ids in groups.values() for pk in ids])
+            ResourceVersions.mark(Shipment)
+        return sum(len(ids) for ids in groups.values())
+    
+    @staticmethod
+    def _cents(price) -> int:
+        """A price as stored (rounded to cents), for comparing and summing"""
+        return int((Decimal(str(price)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+
+
+class ShippingQuoter:
+    """Price packages with every shipping service without saving anything"""
+    
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {"hits": 0, "misses": 0}
+    
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """Hit/miss counters for this process"""
+        with ShippingQuoter._lock:
+            return dict(ShippingQuoter._stats, entries=len(ShippingQuoter._entries))
+    
+    @staticmethod
+    def clear():
+        with ShippingQuoter._lock:
+            ShippingQuoter._entries.clear()
+    
+    @staticmethod
+    def quote(packages: List[Package], origin_zips: List[Optional[str]], destination_zips: List[Optional[str]],
+              services: List[ShippingService] = None) -> List[List[Tuple[ShippingService, Decimal]]]:
+        """
+        Price each (unsaved or saved) package with every service, as calculate_price would.
+        
+        Prices are rounded to cents like a stored shipping_price. Each is memoized on the
+        service's version (its rate table version plus base and per-oz rates), the billable
+        inputs and the zone, so quoting the same SavedPackage preset again is a dict lookup.
+        Misses are deduplicated and priced in one vectorized call per service.
+        """
+        if services is None:
+            services = ServiceCatalog.all()
+        book = RateEngine.book()
+        zones = [0] * len(packages)
+        if book:
+            default_origin = getattr(settings, "RATE_DEFAULT_ORIGIN_ZIP", "")
+            # calculate_price only uses the rate table when there is a destination; zone 0 falls back
+            zones = np.where(
+                [bool(zip_code) for zip_code in destination_zips],
+                book.zones_for(
+                    [RateEngine.zip3(zip_code or default_origin) for zip_code in origin_zips],
+                    [RateEngine.zip3(zip_code) for zip_code in destination_zips]
+                ),
+                0
+            ).tolist()
+        inputs = [
+            (
+                package.total_weight_oz(),
+                RateEngine.dimension(package.length),
+                RateEngine.dimension(package.width),
+                RateEngine.dimension(package.height),
+                zone
+            )
+            for package, zone in zip(packages, zones)
+        ]
+        
+        quotes = [[] for _ in packages]
+        for service in services:
+            table = book.tables.get(service.name) if book else None
+            version = (service.id, book.version if table else None, service.base_price, service.per_oz_rate)
+            # Without a rate table only the weight matters
+            keys = [version + (item if table else item[:1]) for item in inputs]
+            prices = ShippingQuoter._lookup(keys)
+            
+            misses = {}
+            for key, item, price in zip(keys, inputs, prices):
+                if price is None:
+                    misses.setdefault(key, item)
+            if misses:
+                computed = dict(zip(misses, ShippingQuoter._price(service, table, list(misses.values()))))
+                ShippingQuoter._remember(computed)
+                prices = [price if price is not None else computed[key] for key, price in zip(keys, prices)]
+            
+            for idx, price in enumerate(prices):
+                quotes[idx].append((service, price))
+        return quotes
+    
+    @staticmethod
+    def _price(service: ShippingService, table, inputs: List[Tuple]) -> List[Decimal]:
+        """Price (weight_oz, length, width, height, zone) inputs with a service's table, falling back to the formula"""
+        cents = [-1] * len(inputs)
+        if table is not None:
+            cents = table.quote_batch(*(list(column) for column in zip(*inputs))).tolist()
+        return [
+            Decimal(value) / 100 if value >= 0
+            else Decimal(ShipmentRepricer._cents(float(service.base_price) + float(service.per_oz_rate) * item[0])) / 100
+            for value, item in zip(cents, inputs)
+        ]
+    
+    @staticmethod
+    def _lookup(keys: List[Tuple]) -> List[Optional[Decimal]]:
+        with ShippingQuoter._lock:
+            prices = []
+            for key in keys:
+                price = ShippingQuoter._entries.get(key)
+                if price is not None:
+                    ShippingQuoter._entries.move_to_end(key)
+                prices.append(price)
+            hits = sum(1 for price in prices if price is not None)
+            ShippingQuoter._stats["hits"] += hits
+            ShippingQuoter._stats["misses"] += len(keys) - hits
+            return prices
+    
+    @staticmethod
+    def _remember(prices: Dict[Tuple, Decimal]):
+        max_size = getattr(settings, "QUOTE_CACHE_SIZE", 10000)
+        with ShippingQuoter._lock:
+            for key, price in prices.items():
+                ShippingQuoter._entries[key] = price
+            while len(ShippingQuoter._entries) > max_size:
+                ShippingQuoter._entries.popitem(last=False)
+
+
+class ShipmentTotals:
+    """
+    Shipment price totals, with optional status and service breakdowns.
+    
+    Totals come from a database aggregate, or with SHIPMENT_TOTALS_ENABLED from the
+    ShipmentTotal summary (one row per creation day, status and service), which costs the
+    same to read however many shipments there are. Writes mark the creation days they
+    touched and those days are recomputed once the transaction commits: single saves and
+    deletes through signals, bulk writes by calling mark, mark_days or mark_ids.
+    """
+    
+    _pending = threading.local()
+    
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, "SHIPMENT_TOTALS_ENABLED", False)
+    
+    @staticmethod
+    def mark(shipments: Iterable[Shipment]):
+        ShipmentTotals.mark_days(timezone.localdate(shipment.created_at) for shipment in shipments if shipment.created_at)
+    
+    @staticmethod
+    def mark_ids(shipment_ids: List[int]):
+        if not ShipmentTotals.enabled():
+            return
+        days = set()
+        for start in range(0, len(shipment_ids), 1000):
+            days.update(Shipment.objects.filter(id__in=shipment_ids[start:start + 1000]).dates("created_at", "day"))
+        ShipmentTotals.mark_days(days)
+    
+    @staticmethod
+    def mark_days(days: Iterable):
+        if not ShipmentTotals.enabled():
+            return
+        pending = getattr(ShipmentTotals._pending, "days", None)
+        if pending is None:
+            pending = ShipmentTotals._pending.days = set()
+        pending.update(days)
+        # The first flush to run refreshes every pending day and later ones find nothing left.
+        # Days marked in a transaction that rolled back are simply refreshed by the next flush.
+        transaction.on_commit(ShipmentTotals.flush)
+    
+    @staticmethod
+    def flush():
+        days = getattr(ShipmentTotals._pending, "days", None)
+        if days:
+            ShipmentTotals._pending.days = set()
+            ShipmentTotals.refresh(days)
+    
+    @staticmethod
+    def refresh(days: Iterable):
+        """Recompute the summary rows for the given creation days"""
+        days = sorted(set(days))
+        if not days:
+            return
+        bounds = Q()
+        for day in days:
+            start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            bounds |= Q(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+        ShipmentTotals._replace(Shipment.objects.filter(bounds), ShipmentTotal.objects.filter(day__in=days))
+    
+    @staticmethod
+    def rebuild():
+        """Recompute the whole summary (after enabling it, or after writes that bypassed mark)"""
+        ShipmentTotals._replace(Shipment.objects.all(), ShipmentTotal.objects.all())
+    
+    @staticmethod
+    def from_queryset(queryset, breakdown: Iterable[str] = ()) -> Dict:
+        """Aggregate priced shipments in queryset in the database"""
+        rows = queryset.order_by().values("status", "shipping_service_id").annotate(
+            priced=Count("shipping_price"), total=Sum("shipping_price")
+        )
+        return ShipmentTotals._collect(rows, breakdown)
+    
+    @staticmethod
+    def from_summary(statuses: List[str] = None, service_id: int = None, start_day=None, end_day=None,
+                     breakdown: Iterable[str] = ()) -> Dict:
+        """Read totals from the summary; start_day is inclusive and end_day exclusive"""
+        rows = ShipmentTotal.objects.all()
+        if statuses:
+            rows = rows.filter(status__in=statuses)
+        if service_id is not None:
+            rows = rows.filter(shipping_service_id=service_id)
+        if start_day:
+            rows = rows.filter(day__gte=start_day)
+        if end_day:
+            rows = rows.filter(day__lt=end_day)
+        rows = rows.values("status", "shipping_service_id").annotate(priced=Sum("priced"), total=Sum("total"))
+        return ShipmentTotals._collect(rows, breakdown)
+    
+    @staticmethod
+    def _collect(rows: Iterable[Dict], breakdown: Iterable[str]) -> Dict:
+        """Fold (status, service) rows into the overall total and the requested breakdowns"""
+        result = {"total": Decimal("0.00"), "count": 0}
+        by_status = {}
+        by_service = {}
+        for row in rows:
+            priced, total = row["priced"] or 0, row["total"] or Decimal(0)
+            if not priced:
+                continue
+            result["total"] += total
+            result["count"] += priced
+            for groups, key in ((by_status, row["status"]), (by_service, row["shipping_service_id"] or None)):
+                group = groups.setdefault(key, {"count": 0, "total": Decimal("0.00")})
+                group["count"] += priced
+                group["total"] += total
+        
+        if "status" in breakdown:
+            result["by_status"] = [dict(status=key, **group) for key, group in sorted(by_status.items())]
+        if "service" in breakdown:
+            result["by_service"] = []
+            for key, group in sorted(by_service.items(), key=lambda item: item[0] or 0):
+                service = ServiceCatalog.get(key) if key else None
+                result["by_service"].append(dict(service_id=key, service=service.name if service else None, **group))
+        return result
+    
+    @staticmethod
+    def _replace(shipments, existing):
+        """Swap existing summary rows for ones aggregated from shipments, upserting so concurrent refreshes can't duplicate rows"""
+        rows = shipments.order_by().annotate(day=TruncDate("created_at")).values(
+            "day", "status", "shipping_service_id"
+        ).annotate(shipments=Count("id"), priced=Count("shipping_price"), total=Sum("shipping_price"))
+        totals = [
+            ShipmentTotal(
+                day=row["day"],
+                status=row["status"],
+                shipping_service_id=row["shipping_service_id"] or 0,
+                shipments=row["shipments"],
+                priced=row["priced"],
+                total=row["total"] or 0
+            )
+            for row in rows
+        ]
+        keys = {(total.day, total.status, total.shipping_service_id) for total in totals}
+        with transaction.atomic():
+            stale = [
+                pk for pk, *key in existing.values_list("id", "day", "status", "shipping_service_id")
+                if tuple(key) not in keys
+            ]
+            for start in range(0, len(stale), 1000):
+                ShipmentTotal.objects.filter(id__in=stale[start:start + 1000]).delete()
+            ShipmentTotal.objects.bulk_create(
+                totals,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["day", "status", "shipping_service_id"],
+                update_fields=["shipments", "priced", "total"]
+            )
+
+
+class ResourceVersions:
+    """
+    Change counters behind the ETags of the list and detail endpoints.
+    
+    Writes to a model bump its CacheVersion key once the transaction commits: single saves
+    and deletes through signals, bulk writes and shipment deletes by calling mark. Bumping
+    after the commit keeps the counter row out of long import transactions; a poll that
+    lands in between still gets a 304 and sees the change on its next request.
+    """
+    
+    KEYS = {
+        Address: "addresses",
+        Package: "packages",
+        SavedAddress: "saved_addresses",
+        SavedPackage: "saved_packages",
+        Shipment: "shipments",
+    }
+    
+    _pending = threading.local()
+    
+    @staticmethod
+    def mark(*models):
+        pending = getattr(ResourceVersions._pending, "keys", None)
+        if pending is None:
+            pending = ResourceVersions._pending.keys = set()
+        pending.update(ResourceVersions.KEYS[model] for model in models)
+        transaction.on_commit(ResourceVersions.flush)
+    
+    @staticmethod
+    def flush():
+        keys = getattr(ResourceVersions._pending, "keys", None)
+        if keys:
+            ResourceVersions._pending.keys = set()
+            for key in sorted(keys):
+                CacheVersion.bump(key)
+    
+    @staticmethod
+    def current(keys: Iterable[str]) -> Dict[str, int]:
+        """The versions for keys with one query, 0 for keys that have never changed"""
+        keys = list(keys)
+        versions = dict(CacheVersion.objects.filter(key__in=keys).values_list("key", "version"))
+        return {key: versions.get(key, 0) for key in keys}
+
+
+class ShipmentChangefeed:
+    """
+    Shipments created, updated or deleted since a cursor, for clients that keep a local copy.
+    
+    Changes are read in (updated_at, id) order from an index and deletes from the
+    ShipmentTombstone rows the delete paths write (record_deletes). Edits to an address or
+    package touch the shipments that nest it so they show up too. A cursor is the
+    (updated_at, id) position reached, as "<microseconds since the epoch>-<id>".
+    
+    Writers stamp updated_at before they commit, so a caught-up cursor is held
+    CHANGEFEED_LAG seconds behind now and rows in that window are sent again on the next
+    poll; clients must apply changes idempotently. Tombstones are kept for
+    CHANGEFEED_RETENTION_DAYS, and older cursors are refused so the client reloads instead.
+    A client that polls while nothing changes still gets a newer cursor each time, so it
+    only expires by not polling for that long.
+    """
+    
+    EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    
+    @staticmethod
+    def start() -> str:
+        """A cursor to take before loading the full list, to follow changes from then on"""
+        return ShipmentChangefeed.encode_cursor(ShipmentChangefeed._horizon(), 0)
+    
+    @staticmethod
+    def changes(cursor: str, limit: int, fieldset: Dict = None) -> Dict:
+        """
+        Up to limit changed shipments after cursor (as ShipmentListSerializer output), the
+        ids deleted since, the cursor to continue from and whether more changes are waiting.
+        Raises ValueError for a malformed cursor and ExpiredCursorError for an old one.
+        """
+        since, since_id = ShipmentChangefeed.decode_cursor(cursor)
+        if since < timezone.now() - timedelta(days=getattr(settings, "CHANGEFEED_RETENTION_DAYS", 7)):
+            raise ExpiredCursorError("Cursor has expired; reload the shipment list")
+        horizon = ShipmentChangefeed._horizon()
+        
+        queryset = Shipment.objects.filter(
+            Q(updated_at__gt=since) | Q(updated_at=since, id__gt=since_id)
+        ).order_by("updated_at", "id")
+        rows = list(ShipmentListSerializer.rows(queryset, fieldset)[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        position = (rows[-1].updated_at, rows[-1].id) if rows else (since, since_id)
+        
+        tombstones = ShipmentTombstone.objects.filter(deleted_at__gt=since)
+        if has_more:
+            tombstones = tombstones.filter(deleted_at__lte=position[0])
+        else:
+            # Everything up to the horizon has been read, so a caught-up cursor moves there even
+            # when nothing changed; rows past it are sent again until the horizon passes them
+            position = max((since, since_id), (horizon, 0))
+        
+        return {
+            "cursor": ShipmentChangefeed.encode_cursor(*position),
+            "has_more": has_more,
+            "changed": ShipmentListSerializer.to_representation(rows, fieldset),
+            "deleted": sorted(set(tombstones.values_list("shipment_id", flat=True))),
+        }
+    
+    @staticmethod
+    def record_deletes(shipment_ids: Iterable[int]):
+        """Write tombstones for deleted shipments (in the deleting transaction)"""
+        ShipmentTombstone.objects.bulk_create(
+            [ShipmentTombstone(shipment_id=shipment_id) for shipment_id in shipment_ids], batch_size=1000
+        )
+    
+    @staticmethod
+    def touch(address_ids: Iterable[int] = (), package_ids: Iterable[int] = ()):
+        """Bump updated_at on shipments that nest these addresses or packages, since their output changed"""
+        now = timezone.now()
+        address_ids, package_ids = list(address_ids), list(package_ids)
+        for start in range(0, len(address_ids), 1000):
+            chunk = address_ids[start:start + 1000]
+            Shipment.objects.filter(Q(ship_from_id__in=chunk) | Q(ship_to_id__in=chunk)).update(updated_at=now)
+        for start in range(0, len(package_ids), 1000):
+            Shipment.objects.filter(package_id__in=package_ids[start:start + 1000]).update(updated_at=now)
+    
+    @staticmethod
+    def prune() -> int:
+        """Delete tombstones past CHANGEFEED_RETENTION_DAYS; returns how many"""
+        cutoff = timezone.now() - timedelta(days=getattr(settings, "CHANGEFEED_RETENTION_DAYS", 7))
+        deleted, _ = ShipmentTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        return deleted
+    
+    @staticmethod
+    def encode_cursor(updated_at: datetime, shipment_id: int) -> str:
+        return f"{(updated_at - ShipmentChangefeed.EPOCH) // timedelta(microseconds=1)}-{shipment_id}"
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        micros, _, shipment_id = cursor.partition("-")
+        try:
+            return ShipmentChangefeed.EPOCH + timedelta(microseconds=int(micros)), int(shipment_id)
+        except (ValueError, OverflowError):
+            raise ValueError(f"Invalid cursor: {cursor}")
+    
+    @staticmethod
+    def _horizon() -> datetime:
+        return timezone.now() - timedelta(seconds=getattr(settings, "CHANGEFEED_LAG", 5))
+
+
+class ShipmentExporter:
+    """Service for streaming shipments out as CSV or NDJSON with flat memory use"""
+    
+    # Columns in the Template.csv order that CSVParser._parse_row reads back
+    CSV_COLUMNS = [
+        "ship_from__first_name", "ship_from__last_name", "ship_from__address_line1",
+        "ship_from__address_line2", "ship_from__city", "ship_from__zip_code", "ship_from__state",
+        "ship_to__first_name", "ship_to__last_name", "ship_to__address_line1",
+        "ship_to__address_line2", "ship_to__city", "ship_to__zip_code", "ship_to__state",
+        "package__weight_lbs", "package__weight_oz", "package__length", "package__width", "package__height",
+        "ship_to__phone", "ship_from__phone", "order_number", "package__item_sku",
+    ]
+    
+    @staticmethod
+    def iter_csv(queryset, chunk_size: int = None) -> Iterator[str]:
+        """Yield the export as CSV text chunks, starting with the Template.csv header rows"""
+        chunk_size = chunk_size or getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(CSVParser.HEADER_ROWS)
+        
+        rows = queryset.order_by("id").values_list(*ShipmentExporter.CSV_COLUMNS)
+        for count, row in enumerate(rows.iterator(chunk_size=chunk_size), start=1):
+            writer.writerow(["" if value is None else value for value in row])
+            if count % chunk_size == 0:
+                yield ShipmentExporter._drain(buffer)
+        yield ShipmentExporter._drain(buffer)
+    
+    @staticmethod
+    def iter_ndjson(queryset, chunk_size: int = None) -> Iterator[str]:
+        """Yield the export as newline-delimited JSON, one ShipmentSerializer object per line"""
+        chunk_size = chunk_size or getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+        encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        # ShipmentListSerializer gives the same objects as ShipmentSerializer from plain rows
+        rows = ShipmentListSerializer.rows(queryset.order_by("id")).iterator(chunk_size=chunk_size)
+        
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield "".join(encoder.encode(data) + "\n" for data in ShipmentListSerializer.to_representation(chunk))
+                chunk = []
+        if chunk:
+            yield "".join(encoder.encode(data) + "\n" for data in ShipmentListSerializer.to_representation(chunk))
+    
+    @staticmethod
+    def _drain(buffer: StringIO) -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+
+class ImportJobRunner:
+    """Service for claiming and running queued background CSV imports"""
+    
+    @staticmethod
+    def claim_next() -> Optional[ImportJob]:
+        """Atomically move the oldest queued job to running, so concurrent workers never share a job"""
+        queued_ids = ImportJob.objects.filter(status="queued").order_by("id").values_list("id", flat=True)[:10]
+        for job_id in queued_ids:
+            now = timezone.now()
+            # update() skips auto_now; updated_at is the heartbeat reclaim_stale() checks
+            claimed = ImportJob.objects.filter(id=job_id, status="queued").update(
+                status="running", started_at=now, updated_at=now
+            )
+            if claimed:
+                return ImportJob.objects.get(id=job_id)
+        return None
+    
+    @staticmethod
+    def reclaim_stale() -> int:
+        """
+        Fail running jobs that have not reported progress for IMPORT_JOB_STALE_SECONDS,
+        which happens when their worker was killed part-way through.
+        
+        Batches that finished before the worker died are already committed, so the job
+        is not requeued (running it again without upsert would duplicate them). Returns
+        the number of jobs reclaimed.
+        """
+        stale_seconds = getattr(settings, "IMPORT_JOB_STALE_SECONDS", 600)
+        cutoff = timezone.now() - timedelta(seconds=stale_seconds)
+        reclaimed = 0
+        for job in ImportJob.objects.filter(status="running", updated_at__lt=cutoff):
+            now = timezone.now()
+            # Matching on updated_at leaves the job alone if its worker reports progress meanwhile
+            reclaimed += ImportJob.objects.filter(id=job.id, status="running", updated_at=job.updated_at).update(
+                status="failed",
+                error=(
+                    f"The import worker stopped responding after {job.rows_parsed} rows. "
+                    f"{job.rows_created} created and {job.rows_updated} updated rows were saved; "
+                    "upload the file again with upsert=true to import the rest"
+                ),
+                finished_at=now,
+                updated_at=now
+            )
+            logger.warning(f"Import job {job.id} had no progress for {stale_seconds}s; marked failed")
+        return reclaimed
+    
+    @staticmethod
+    def run(job: ImportJob) -> ImportJob:
+        """Import the job's file batch by batch, recording progress after every batch"""
+        logger.info(f"Running import job {job.id} ({job.original_name})")
+        max_errors = getattr(settings, "IMPORT_JOB_MAX_ERRORS", 1000)
+        
+        def report_progress(importer):
+            errors = importer.drain_errors()
+            job.rows_parsed = importer.parsed_count
+            job.rows_created = importer.created_count
+            job.rows_updated = importer.updated_count
+            job.rows_unchanged = importer.unchanged_count
+            job.rows_duplicate = importer.duplicate_count
+            job.rows_failed += len(errors)
+            job.errors.extend(errors[:max(max_errors - len(job.errors), 0)])
+            job.save(update_fields=[
+                "rows_parsed", "rows_created", "rows_updated", "rows_unchanged", "rows_duplicate",
+                "rows_failed", "errors", "updated_at"
+            ])
+        
+        try:
+            with job.file.open("rb") as file:
+                ShipmentImporter(
+                    keep_shipments=False,
+                    on_batch=report_progress,
+                    upsert=job.upsert,
+                    unpurchased_only=job.unpurchased_only
+                ).import_file(file)
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"Import job {job.id} failed: {str(e)}", exc_info=not isinstance(e, CSVParseError))
+            job.status = "failed"
+            job.error = str(e)
+        
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at", "updated_at"])
+        
+        if job.status == "completed":
+            # The stored upload is only kept around for failed jobs
+            job.file.delete(save=False)
+            ImportJob.objects.filter(id=job.id).update(file="")
+        
+        logger.info(
+            f"Import job {job.id} {job.status}: {job.rows_created} created, "
+            f"{job.rows_failed} failed, {job.throughput()} rows/s"
+        )
+        return job
+
+
+class RateLimiter:
+    """Thread-safe token bucket that limits calls per second to one provider"""
+    
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = burst or max(int(rate), 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self, deadline: float = None) -> bool:
+        """Wait for a token; returns False if none is available before the deadline"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker for one provider.
+    
+    After failure_threshold consecutive failures the circuit opens and calls are skipped
+    for reset_timeout seconds; then a single trial call is let through (half-open), and
+    its outcome closes or re-opens the circuit.
+    """
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+    
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+    
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+    
+    def release(self):
+        """Give up a trial call without an outcome (e.g. it was never sent)"""
+        with self.lock:
+            self.trial_in_flight = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class ProviderClient:
+    """
+    Shared HTTP client for one address validation provider.
+    
+    Requests go through a pooled keep-alive session (at most ADDRESS_VALIDATION_POOL_SIZE
+    connections, waited on for up to ADDRESS_VALIDATION_POOL_TIMEOUT seconds), the
+    provider's rate limit and timeout, jittered retries for transient failures, and a
+    circuit breaker that fails fast while the provider is down. Only 5xx responses,
+    timeouts and connection errors count against the breaker; a 4xx is the request's fault.
+    """
+    
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    # Successful request latencies kept for percentile estimates
+    LATENCY_SAMPLES = 500
+    
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.latencies = deque(maxlen=self.LATENCY_SAMPLES)
+        self.latencies_lock = threading.Lock()
+        pool_size = getattr(settings, "ADDRESS_VALIDATION_POOL_SIZE", 16)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # requests has no pool timeout, so a blocking pool would wait forever for a free
+        # connection; requests take one of these slots first, with a bounded wait
+        self.connections = threading.BoundedSemaphore(pool_size)
+        
+        rate = getattr(settings, "ADDRESS_VALIDATION_RATE_LIMITS", {}).get(provider)
+        self.rate_limiter = RateLimiter(rate) if rate else None
+        self.breaker = CircuitBreaker(
+            getattr(settings, "ADDRESS_VALIDATION_BREAKER_THRESHOLD", 5),
+            getattr(settings, "ADDRESS_VALIDATION_BREAKER_RESET", 30.0)
+        )
+    
+    def request(self, method: str, url: str, deadline: float = None, **kwargs) -> requests.Response:
+        """Send a request, retrying transient failures; raises AddressValidationError when the circuit is open"""
+        if not self.breaker.allow():
+            raise AddressValidationError(f"{self.provider} circuit open, skipping provider")
+        
+        retries = getattr(settings, "ADDRESS_VALIDATION_RETRIES", 2)
+        backoff = getattr(settings, "ADDRESS_VALIDATION_RETRY_BACKOFF", 0.1)
+        attempt = 0
+        while True:
+            try:
+                timeout = self._before_call(deadline)
+                self._acquire_connection(deadline)
+            except AddressValidationError:
+                # Running out of time, rate budget or connections says nothing about the provider's health
+                self.breaker.release()
+                raise
+            
+            try:
+                started = time.monotonic()
+                try:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+                finally:
+                    self.connections.release()
+                if response.status_code not in self.RETRY_STATUSES:
+                    if response.status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        # The provider answered, even if it was to reject this request
+                        self.breaker.record_success()
+                    response.raise_for_status()
+                    with self.latencies_lock:
+                        self.latencies.append(time.monotonic() - started)
+                    return response
+                error = requests.HTTPError(f"{response.status_code} from {self.provider}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.HTTPError:
+                raise
+            except Exception:
+                self.breaker.release()
+                raise
+            
+            # Full jitter: sleep a random time up to the exponential backoff
+            delay = random.uniform(0, backoff * 2 ** attempt)
+            if attempt >= retries or (deadline is not None and time.monotonic() + delay >= deadline):
+                if ProviderClient._is_outage(error):
+                    self.breaker.record_failure()
+                else:
+                    # Still rate limited (429) after retrying; the provider itself is up
+                    self.breaker.release()
+                raise error
+            attempt += 1
+            logger.info(f"Retrying {self.provider} request (attempt {attempt + 1}) after: {error}")
+            time.sleep(delay)
+    
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Latency (seconds) of recent successful requests at the given percentile (0-1), or None without enough samples"""
+        with self.latencies_lock:
+            samples = sorted(self.latencies)
+        if len(samples) < 20:
+            return None
+        return samples[min(int(len(samples) * percentile), len(samples) - 1)]
+    
+    def _acquire_connection(self, deadline: float = None):
+        """Wait for a free pooled connection, for at most ADDRESS_VALIDATION_POOL_TIMEOUT seconds or until the deadline"""
+        wait_for = getattr(settings, "ADDRESS_VALIDATION_POOL_TIMEOUT", 2.0)
+        if deadline is not None:
+            wait_for = min(wait_for, max(deadline - time.monotonic(), 0))
+        if not self.connections.acquire(timeout=wait_for):
+            raise AddressValidationError(f"No {self.provider} connection free within {wait_for:.2f}s")
+    
+    @staticmethod
+    def _is_outage(error: Exception) -> bool:
+        """5xx responses, timeouts and connection errors count against the breaker; 4xx responses don't"""
+        response = getattr(error, "response", None)
+        return response is None or response.status_code >= 500
+    
+    def _before_call(self, deadline: float = None) -> float:
+        """Apply the provider's rate limit and return the timeout to use for its request"""
+        if self.rate_limiter and not self.rate_limiter.acquire(deadline):
+            raise AddressValidationError(f"{self.provider} rate limit not available before the deadline")
+        
+        timeout = getattr(settings, "ADDRESS_VALIDATION_TIMEOUTS", {}).get(self.provider, 5.0)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise AddressValidationError(f"Deadline passed before calling {self.provider}")
+            timeout = min(timeout, remaining)
+        return timeout
+
+
+class AddressValidationCache:
+    """
+    Two-tier cache of address validation results keyed on the normalized address.
+    
+    An in-process LRU answers repeat lookups without I/O; misses fall through to the
+    AddressValidationResult table, which is shared by every worker. Successful results
+    live for ADDRESS_VALIDATION_CACHE_TTL seconds and failures for the (much shorter)
+    ADDRESS_VALIDATION_CACHE_NEGATIVE_TTL.
+    """
+    
+    FIELDS = ["address_line1", "address_line2", "city", "state", "zip_code"]
+    
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+    
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, "ADDRESS_VALIDATION_CACHE_ENABLED", True)
+    
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """Hit/miss counters for this process"""
+        with AddressValidationCache._lock:
+            return dict(AddressValidationCache._stats, memory_entries=len(AddressValidationCache._entries))
+    
+    @staticmethod
+    def lookup(address_data: Dict) -> Optional[Tuple[bool, Optional[Dict], Optional[str]]]:
+        return AddressValidationCache.lookup_many([address_data])[0]
+    
+    @staticmethod
+    def lookup_many(addresses: List[Dict]) -> List[Optional[Tuple[bool, Optional[Dict], Optional[str]]]]:
+        """Return the cached result for each address (None on a miss), with one DB query for the batch"""
+        keys = [Address.location_fingerprint_for(address_data) for address_data in addresses]
+        payloads = {}
+        now = time.time()
+        
+        with AddressValidationCache._lock:
+            for key in keys:
+                entry = AddressValidationCache._entries.get(key)
+                if entry and entry[0] > now:
+                    AddressValidationCache._entries.move_to_end(key)
+                    payloads[key] = entry[1]
+            AddressValidationCache._stats["memory_hits"] += sum(1 for key in keys if key in payloads)
+        
+        missing = {key for key in keys if key not in payloads}
+        if missing:
+            rows = AddressValidationResult.objects.filter(fingerprint__in=missing, expires_at__gt=timezone.now())
+            for row in rows:
+                payload = (row.is_valid, row.validated_fields, row.error)
+                payloads[row.fingerprint] = payload
+                AddressValidationCache._remember(row.fingerprint, payload, row.expires_at.timestamp())
+            with AddressValidationCache._lock:
+                AddressValidationCache._stats["db_hits"] += sum(1 for key in keys if key in missing and key in payloads)
+                AddressValidationCache._stats["misses"] += sum(1 for key in keys if key not in payloads)
+        
+        results = []
+        for address_data, key in zip(addresses, keys):
+            payload = payloads.get(key)
+            if payload is None:
+                results.append(None)
+                continue
+            is_valid, fields, error = payload
+            merged = dict(address_data)
+            merged.update(fields)
+            results.append((is_valid, merged, error or None))
+        return results
+    
+    @staticmethod
+    def store(address_data: Dict, result: Tuple[bool, Optional[Dict], Optional[str]]):
+        AddressValidationCache.store_many([address_data], [result])
+    
+    @staticmethod
+    def store_many(addresses: List[Dict], results: List[Tuple[bool, Optional[Dict], Optional[str]]]):
+        """Cache results in memory and upsert them into the DB table with one query"""
+        ttl = getattr(settings, "ADDRESS_VALIDATION_CACHE_TTL", 30 * 24 * 3600)
+        negative_ttl = getattr(settings, "ADDRESS_VALIDATION_CACHE_NEGATIVE_TTL", 3600)
+        now = timezone.now()
+        
+        rows = {}
+        for address_data, (is_valid, validated_data, error) in zip(addresses, results):
+            key = Address.location_fingerprint_for(address_data)
+            fields = {
+                field: validated_data[field]
+                for field in AddressValidationCache.FIELDS
+                if is_valid and validated_data and field in validated_data
+            }
+            expires_at = now + timedelta(seconds=ttl if is_valid else negative_ttl)
+            AddressValidationCache._remember(key, (is_valid, fields, error or ""), expires_at.timestamp())
+            rows[key] = AddressValidationResult(
+                fingerprint=key, is_valid=is_valid, validated_fields=fields,
+                error=error or "", expires_at=expires_at, updated_at=now
+            )
+        
+        if rows:
+            AddressValidationResult.objects.bulk_create(
+                list(rows.values()),
+                update_conflicts=True,
+                unique_fields=["fingerprint"],
+                update_fields=["is_valid", "validated_fields", "error", "expires_at", "updated_at"]
+            )
+    
+    @staticmethod
+    def clear():
+        """Forget every cached result, in memory and in the DB"""
+        with AddressValidationCache._lock:
+            AddressValidationCache._entries.clear()
+        AddressValidationResult.objects.all().delete()
+    
+    @staticmethod
+    def _remember(key: str, payload: Tuple, expires_at: float):
+        max_size = getattr(settings, "ADDRESS_VALIDATION_CACHE_SIZE", 10000)
+        with AddressValidationCache._lock:
+            AddressValidationCache._entries[key] = (expires_at, payload)
+            AddressValidationCache._entries.move_to_end(key)
+            while len(AddressValidationCache._entries) > max_size:
+                AddressValidationCache._entries.popitem(last=False)
+
+
+class ZipIndex:
+    """
+    Memory-mapped ZIP5 -> (cities, state) reference index used to pre-validate addresses.
+    
+    The file (built by the build_zip_index command) is a header, the state codes, one
+    fixed-size record per possible ZIP5 and a string table, so a lookup is a single
+    struct.unpack_from at zip * RECORD.size. Being mapped read-only, its pages are
+    shared by every worker process on the host.
+    """
+    
+    MAGIC = b"ZIPIDX01"
+    HEADER = struct.Struct("<8sHI")  # magic, state count, string table offset
+    RECORD = struct.Struct("<IH")  # string table offset + 1 (0 = unknown ZIP), state index
+    LENGTH = struct.Struct("<H")
+    ZIP_COUNT = 100000
+    # How close (0-1) a misspelled city must be to the ZIP's city to be corrected
+    CITY_MATCH_CUTOFF = 0.8
+    
+    _mmap = None
+    _states = None
+    _records_offset = 0
+    _strings_offset = 0
+    _loaded_path = None
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def build(rows: Iterable[Tuple[str, List[str], str]], path: str) -> int:
+        """
+        Write an index from (zip5, cities, state) rows and return the number of ZIPs.
+        
+        The first city of a ZIP is its preferred name. Rows repeating a ZIP add alternate
+        cities. The file is written next to path and renamed into place, so processes
+        that have the old index mapped keep working.
+        """
+        entries = {}
+        for zip_code, cities, state in rows:
+            zip_code = (zip_code or "").strip().zfill(5)
+            state = (state or "").strip().upper()
+            if not (len(zip_code) == 5 and zip_code.isdigit() and len(state) == 2):
+                continue
+            entry = entries.setdefault(int(zip_code), (state, []))
+            for city in cities:
+                city = " ".join((city or "").upper().split())
+                if city and city not in entry[1]:
+                    entry[1].append(city)
+        
+        states = sorted({state for state, _ in entries.values()})
+        state_index = {state: idx for idx, state in enumerate(states)}
+        records = bytearray(ZipIndex.RECORD.size * ZipIndex.ZIP_COUNT)
+        strings = bytearray()
+        for zip_code, (state, cities) in entries.items():
+            ZipIndex.RECORD.pack_into(records, zip_code * ZipIndex.RECORD.size, len(strings) + 1, state_index[state])
+            blob = "|".join(cities).encode("utf-8")
+            strings += ZipIndex.LENGTH.pack(len(blob)) + blob
+        
+        states_blob = "".join(states).encode("ascii")
+        strings_offset = ZipIndex.HEADER.size + len(states_blob) + len(records)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(ZipIndex.HEADER.pack(ZipIndex.MAGIC, len(states), strings_offset))
+            f.write(states_blob)
+            f.write(records)
+            f.write(strings)
+        os.replace(tmp_path, path)
+        return len(entries)
+    
+    @staticmethod
+    def available() -> bool:
+        return ZipIndex._load() is not None
+    
+    @staticmethod
+    def lookup(zip_code: str) -> Optional[Tuple[List[str], str]]:
+        """Return (cities, state) for a ZIP5 or ZIP+4, or None if unknown or no index is installed"""
+        data = ZipIndex._load()
+        digits = (zip_code or "").strip()[:5]
+        if data is None or len(digits) != 5 or not digits.isdigit():
+            return None
+        
+        strings_at, state_idx = ZipIndex.RECORD.unpack_from(data, ZipIndex._records_offset + int(digits) * ZipIndex.RECORD.size)
+        if not strings_at:
+            return None
+        start = ZipIndex._strings_offset + strings_at - 1
+        (length,) = ZipIndex.LENGTH.unpack_from(data, start)
+        start += ZipIndex.LENGTH.size
+        return data[start:start + length].decode("utf-8").split("|"), ZipIndex._states[state_idx]
+    
+    @staticmethod
+    def check(address_data: Dict) -> Tuple[Optional[bool], Dict, Optional[str]]:
+        """
+        Check an address's ZIP, city and state against the index.
+        
+        Returns (False, address_data, error) for an obvious mismatch and (True, address,
+        None) when the three agree, with a misspelled city or wrong state corrected
+        from the ZIP. Returns (None, address_data, None) when the index can't decide
+        (no index installed, no ZIP to check, or a ZIP the index doesn't know), leaving
+        the address to the providers.
+        
+        4-digit ZIPs are zero-filled first, since spreadsheets drop the leading zero of
+        ZIPs such as 02134. They are only accepted (and corrected to 5 digits) when the
+        city or state agrees, and never rejected.
+        """
+        zip_code = (address_data.get("zip_code") or "").strip()
+        if ZipIndex._load() is None or not zip_code:
+            return None, address_data, None
+        
+        match = re.fullmatch(r"(\d{4,5})(?:-?(\d{4}))?", zip_code)
+        if not match:
+            return False, address_data, f"Invalid ZIP code: {zip_code}"
+        zip5 = match.group(1).zfill(5)
+        zero_filled = len(match.group(1)) == 4
+        entry = ZipIndex.lookup(zip5)
+        if entry is None:
+            # The index may be older than the ZIP; let a provider decide
+            return None, address_data, None
+        
+        cities, zip_state = entry
+        state = (address_data.get("state") or "").strip().upper()
+        city = Address.normalize_line(address_data.get("city"))
+        normalized = {Address.normalize_line(name): name for name in cities}
+        city_match = normalized.get(city)
+        if city_match is None and city:
+            close = difflib.get_close_matches(city, list(normalized), n=1, cutoff=ZipIndex.CITY_MATCH_CUTOFF)
+            city_match = normalized[close[0]] if close else None
+        
+        if state != zip_state and city_match is None:
+            if zero_filled:
+                # Nothing confirms the zero-filled ZIP was the one meant
+                return None, address_data, None
+            return False, address_data, f"ZIP code {zip5} is in {zip_state}, not {state or 'the given state'}"
+        if city_match is None:
+            # The state agrees but the city doesn't resemble any name for this ZIP; let a provider decide
+            return None, address_data, None
+        
+        corrected = dict(address_data)
+        corrected["state"] = zip_state
+        if zero_filled:
+            corrected["zip_code"] = f"{zip5}-{match.group(2)}" if match.group(2) else zip5
+        if city != Address.normalize_line(city_match):
+            corrected["city"] = ZipIndex._match_case(city_match, address_data.get("city"))
+        return True, corrected, None
+    
+    @staticmethod
+    def _match_case(name: str, like: str) -> str:
+        """Write a city name from the index (stored uppercase) in the casing of the input city"""
+        like = (like or "").strip()
+        if like.islower():
+            return name.lower()
+        if like.isupper():
+            return name
+        return name.title()
+    
+    @staticmethod
+    def _load():
+        path = str(getattr(settings, "ZIP_INDEX_PATH", "") or "")
+        if ZipIndex._loaded_path == path:
+            return ZipIndex._mmap
+        
+        with ZipIndex._lock:
+            if ZipIndex._loaded_path == path:
+                return ZipIndex._mmap
+            data = None
+            if path and os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    magic, state_count, strings_offset = ZipIndex.HEADER.unpack_from(data, 0)
+                    if magic != ZipIndex.MAGIC:
+                        raise ValueError("not a ZIP index file")
+                    states_blob = data[ZipIndex.HEADER.size:ZipIndex.HEADER.size + state_count * 2].decode("ascii")
+                    ZipIndex._states = [states_blob[i:i + 2] for i in range(0, len(states_blob), 2)]
+                    ZipIndex._records_offset = ZipIndex.HEADER.size + state_count * 2
+                    ZipIndex._strings_offset = strings_offset
+                    logger.info(f"Loaded ZIP index from {path}")
+                except (OSError, ValueError, struct.error) as e:
+                    logger.warning(f"Could not load ZIP index {path}: {str(e)}")
+                    data = None
+            ZipIndex._mmap = data
+            ZipIndex._loaded_path = path
+            return data
+    
+    @staticmethod
+    def reload():
+        """Forget the mapped index so the next lookup maps the file again"""
+        with ZipIndex._lock:
+            ZipIndex._loaded_path = None
+            ZipIndex._mmap = None
+
+
 class AddressValidator:
     """Service for validating addresses using external APIs with fallback"""
     
@@ -177,73 +1906,599 @@ class AddressValidator:
     USPS_API_URL = "https://secure.shippingapis.com/ShippingAPI.dll"
     SMARTY_API_URL = "https://us-street.api.smartystreets.com/street-address"
     
+    REQUIRED_FIELDS = ["address_line1", "city", "state", "zip_code"]
+    
+    UNAVAILABLE = "Address validation unavailable, using original address"
+    
+    PROVIDER_NAMES = {"usps": "USPS", "smarty": "SmartyStreets"}
+    # Most addresses each provider accepts in one request
+    MAX_BATCH_SIZES = {"usps": 5, "smarty": 100}
+    
+    _clients = {}
+    _clients_lock = threading.Lock()
+    
+    _hedge_executor = None
+    _hedge_lock = threading.Lock()
+    _hedge_stats = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+    
     @staticmethod
-    def validate_address(address_data: Dict) -> Tuple[bool, Optional[Dict], Optional[str]]:
+    def validate_address(address_data: Dict, deadline: float = None, use_cache: bool = True) -> Tuple[bool, Optional[Dict], Optional[str]]:
         """
         Validate address using multiple APIs with fallback.
         
+        Results are served from and saved to AddressValidationCache unless use_cache is
+        False; only answers from the ZIP index or a provider are saved, not the fallback
+        used when every provider failed. deadline is an optional time.monotonic() value;
+        provider calls are not started or waited on past it.
+        
         Returns:
             (is_valid, validated_address_data, error_message)
         """
+        use_cache = use_cache and AddressValidationCache.enabled()
+        if use_cache:
+            cached = AddressValidationCache.lookup(address_data)
+            if cached is not None:
+                return cached
+        
+        result = AddressValidator._validate_with_providers(address_data, deadline)
+        if result is None:
+            logger.warning("All address validation APIs failed, using original address")
+            return False, address_data, AddressValidator.UNAVAILABLE
+        if use_cache:
+            AddressValidationCache.store(address_data, result)
+        return result
+    
+    @staticmethod
+    def _validate_with_providers(address_data: Dict, deadline: float = None) -> Optional[Tuple[bool, Optional[Dict], Optional[str]]]:
+        """The ZIP index's or a provider's answer, or None if no provider could answer"""
         logger.info(f"Validating address: {address_data.get('address_line1')}, {address_data.get('city')}")
         
-        # Try USPS first (free tier)
-        try:
-            is_valid, validated_data, error = AddressValidator._validate_usps(address_data)
-            if is_valid:
-                logger.info("Address validated successfully using USPS")
-                return True, validated_data, None
-        except Exception as e:
-            logger.warning(f"USPS validation failed: {str(e)}")
+        # Reject or correct obvious ZIP/city/state mistakes locally before any provider call
+        verdict, address_data, error = ZipIndex.check(address_data)
+        if verdict is False:
+            logger.info(f"Address rejected by ZIP index: {error}")
+            return False, address_data, error
         
-        # Try SmartyStreets as fallback (if API key available)
-        try:
-            is_valid, validated_data, error = AddressValidator._validate_smarty(address_data)
-            if is_valid:
-                logger.info("Address validated successfully using SmartyStreets")
-                return True, validated_data, None
-        except Exception as e:
-            logger.warning(f"SmartyStreets validation failed: {str(e)}")
+        # The last rejection a provider gave, returned if no provider validates the address
+        rejection = None
+        providers = AddressValidator._providers()
+        if getattr(settings, "ADDRESS_VALIDATION_HEDGE_ENABLED", False) and len(providers) > 1:
+            result = AddressValidator._validate_hedged(address_data, providers[0], providers[1], deadline)
+            if result is not None and result[0]:
+                return result
+            rejection = result
+            providers = providers[2:]
         
-        # If both fail, return original address with warning
-        logger.warning("All address validation APIs failed, using original address")
-        return False, address_data, "Address validation unavailable, using original address"
+        # Try each provider in order (USPS first, as it's free, then SmartyStreets)
+        for provider in providers:
+            try:
+                is_valid, validated_data, error = AddressValidator._validate_batch(provider, [address_data], deadline)[0]
+                if is_valid:
+                    logger.info(f"Address validated successfully using {AddressValidator.PROVIDER_NAMES[provider]}")
+                    return True, validated_data, None
+                rejection = (False, address_data, error)
+            except Exception as e:
+                logger.warning(f"{AddressValidator.PROVIDER_NAMES[provider]} validation failed: {str(e)}")
+        
+        if rejection is not None:
+            logger.info(f"Address rejected by validation providers: {rejection[2]}")
+        return rejection
     
     @staticmethod
-    def _validate_usps(address_data: Dict) -> Tuple[bool, Optional[Dict], Optional[str]]:
-        """Validate address using USPS API"""
-        # USPS API requires registration and API key
-        # For demo purposes, we'll simulate validation
-        # In production, implement actual USPS API call
+    def _validate_hedged(address_data: Dict, primary: str, secondary: str, deadline: float = None) -> Optional[Tuple[bool, Optional[Dict], Optional[str]]]:
+        """
+        Validate with primary, hedging with secondary if primary is slow.
+        
+        If primary hasn't answered within its p95 latency the same address is sent to
+        secondary (unless ADDRESS_VALIDATION_HEDGE_MAX_RATE of calls are already hedged),
+        and the first valid answer wins. If primary answers invalid, secondary is tried as
+        a normal fallback. If neither validates the address, returns the last rejection
+        either gave, or None if both failed.
+        """
+        executor = AddressValidator._hedge_pool()
+        delay = AddressValidator._hedge_delay(primary)
+        with AddressValidator._hedge_lock:
+            AddressValidator._hedge_stats["calls"] += 1
+        
+        # Set by whichever request validates the address first, from its own worker thread,
+        # so a request still queued behind it is never sent (cancel() can race the worker)
+        settled = threading.Event()
+        
+        def attempt(provider: str) -> Optional[List[Tuple[bool, Optional[Dict], Optional[str]]]]:
+            if settled.is_set():
+                return None
+            results = AddressValidator._validate_batch(provider, [address_data], deadline)
+            if results[0][0]:
+                settled.set()
+            return results
+        
+        futures = {executor.submit(attempt, primary): primary}
+        pending = set(futures)
+        hedged = False
+        rejection = None
+        
+        done, _ = wait(pending, timeout=AddressValidator._remaining(deadline, delay))
+        if not done and AddressValidator._take_hedge():
+            logger.info(
+                f"{AddressValidator.PROVIDER_NAMES[primary]} slower than {delay:.3f}s, "
+                f"hedging with {AddressValidator.PROVIDER_NAMES[secondary]}"
+            )
+            hedged = True
+            future = executor.submit(attempt, secondary)
+            futures[future] = secondary
+            pending.add(future)
+        
+        while pending:
+            done, pending = wait(pending, timeout=AddressValidator._remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                provider = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logger.warning(f"{AddressValidator.PROVIDER_NAMES[provider]} validation failed: {str(e)}")
+                    continue
+                if results is None:
+                    continue
+                is_valid, validated_data, error = results[0]
+                if is_valid:
+                    # A request already in flight can't be aborted; it finishes in the background and is ignored
+                    for other in pending:
+                        other.cancel()
+                    if hedged and provider == secondary:
+                        with AddressValidator._hedge_lock:
+                            AddressValidator._hedge_stats["hedge_wins"] += 1
+                    logger.info(f"Address validated successfully using {AddressValidator.PROVIDER_NAMES[provider]}")
+                    return True, validated_data, None
+                rejection = (False, address_data, error)
+            
+            if not pending and secondary not in futures.values():
+                # Primary answered without a valid address before the hedge delay; fall back as usual
+                future = executor.submit(attempt, secondary)
+                futures[future] = secondary
+                pending.add(future)
         
-        # Basic validation: check if required fields are present
-        required_fields = ["address_line1", "city", "state", "zip_code"]
-        if all(address_data.get(field) for field in required_fields):
-            # Simulate successful validation
-            return True, address_data, None
+        for future in pending:
+            future.cancel()
+        return rejection
+    
+    @staticmethod
+    def _hedge_pool() -> ThreadPoolExecutor:
+        with AddressValidator._hedge_lock:
+            if AddressValidator._hedge_executor is None:
+                AddressValidator._hedge_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "ADDRESS_VALIDATION_CONCURRENCY", 16),
+                    thread_name_prefix="address-hedge"
+                )
+            return AddressValidator._hedge_executor
+    
+    @staticmethod
+    def _hedge_delay(provider: str) -> float:
+        """Seconds to wait for provider before hedging: its p95 latency, or the configured default"""
+        p95 = AddressValidator._client(provider).latency_percentile(0.95)
+        if p95 is None:
+            return getattr(settings, "ADDRESS_VALIDATION_HEDGE_DEFAULT_DELAY", 0.5)
+        return p95
+    
+    @staticmethod
+    def _take_hedge() -> bool:
+        """Count a hedge if that keeps the hedged share of calls within ADDRESS_VALIDATION_HEDGE_MAX_RATE"""
+        max_rate = getattr(settings, "ADDRESS_VALIDATION_HEDGE_MAX_RATE", 0.1)
+        with AddressValidator._hedge_lock:
+            stats = AddressValidator._hedge_stats
+            if stats["hedged"] + 1 > stats["calls"] * max_rate:
+                return False
+            stats["hedged"] += 1
+            return True
+    
+    @staticmethod
+    def hedge_stats() -> Dict[str, float]:
+        """Hedged request counters for this process, including the hedge rate"""
+        with AddressValidator._hedge_lock:
+            stats = dict(AddressValidator._hedge_stats)
+        stats["hedge_rate"] = stats["hedged"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
+    
+    @staticmethod
+    def reset_hedge_stats():
+        with AddressValidator._hedge_lock:
+            AddressValidator._hedge_stats = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+    
+    @staticmethod
+    def _remaining(deadline: float = None, limit: float = None) -> Optional[float]:
+        """Seconds until deadline (capped at limit), or limit if there is no deadline"""
+        if deadline is None:
+            return limit
+        remaining = max(deadline - time.monotonic(), 0)
+        return remaining if limit is None else min(remaining, limit)
+    
+    @staticmethod
+    def _providers() -> List[str]:
+        return getattr(settings, "ADDRESS_VALIDATION_PROVIDERS", ["usps", "smarty"])
+    
+    @staticmethod
+    def _batch_size(provider: str) -> int:
+        sizes = getattr(settings, "ADDRESS_VALIDATION_BATCH_SIZES", {})
+        return max(1, min(sizes.get(provider, 1), AddressValidator.MAX_BATCH_SIZES[provider]))
+    
+    @staticmethod
+    def _validate_batch(provider: str, addresses: List[Dict], deadline: float = None) -> List[Tuple[bool, Optional[Dict], Optional[str]]]:
+        """Validate addresses with one provider request, returning a result per address"""
+        if provider == "usps":
+            return AddressValidator._validate_usps(addresses, deadline)
+        if provider == "smarty":
+            return AddressValidator._validate_smarty(addresses, deadline)
+        raise AddressValidationError(f"Unknown address validation provider: {provider}")
+    
+    @staticmethod
+    def _check_required_fields(addresses: List[Dict]) -> List[Tuple[bool, Optional[Dict], Optional[str]]]:
+        return [
+            (True, address_data, None)
+            if all(address_data.get(field) for field in AddressValidator.REQUIRED_FIELDS)
+            else (False, None, "Missing required address fields")
+            for address_data in addresses
+        ]
+    
+    @staticmethod
+    def _validate_usps(addresses: List[Dict], deadline: float = None) -> List[Tuple[bool, Optional[Dict], Optional[str]]]:
+        """Validate up to MAX_BATCH_SIZES["usps"] addresses using one USPS Verify request"""
+        user_id = getattr(settings, "USPS_USER_ID", "")
+        if not user_id:
+            # Without a USPS user id, fall back to checking that required fields are present
+            return AddressValidator._check_required_fields(addresses)
         
-        return False, None, "Missing required address fields"
+        request_xml = AddressValidator._usps_request_xml(user_id, addresses)
+        response = AddressValidator._client("usps").request(
+            "GET",
+            getattr(settings, "USPS_API_URL", AddressValidator.USPS_API_URL),
+            deadline,
+            params={"API": "Verify", "XML": request_xml}
+        )
+        return AddressValidator._parse_usps_response(response.text, addresses)
     
     @staticmethod
-    def _validate_smarty(address_data: Dict) -> Tuple[bool, Optional[Dict], Optional[str]]:
-        """Validate address using SmartyStreets API"""
-        # SmartyStreets API requires API key
-        # For demo purposes, we'll simulate validation
-        # In production, implement actual SmartyStreets API call
+    def _validate_smarty(addresses: List[Dict], deadline: float = None) -> List[Tuple[bool, Optional[Dict], Optional[str]]]:
+        """Validate up to MAX_BATCH_SIZES["smarty"] addresses using one SmartyStreets POST"""
+        auth_id = getattr(settings, "SMARTY_AUTH_ID", "")
+        auth_token = getattr(settings, "SMARTY_AUTH_TOKEN", "")
+        if not (auth_id and auth_token):
+            # Without SmartyStreets credentials, fall back to checking that required fields are present
+            return AddressValidator._check_required_fields(addresses)
         
-        # Basic validation: check if required fields are present
-        required_fields = ["address_line1", "city", "state", "zip_code"]
-        if all(address_data.get(field) for field in required_fields):
-            # Simulate successful validation
-            return True, address_data, None
+        response = AddressValidator._client("smarty").request(
+            "POST",
+            getattr(settings, "SMARTY_API_URL", AddressValidator.SMARTY_API_URL),
+            deadline,
+            params={"auth-id": auth_id, "auth-token": auth_token},
+            json=[
+                dict(AddressValidator._smarty_lookup(address_data), input_id=str(idx), candidates=1)
+                for idx, address_data in enumerate(addresses)
+            ]
+        )
         
-        return False, None, "Missing required address fields"
+        # Smarty only returns candidates for addresses it matched, tagged with their input_index
+        results = [(False, None, "Address not found")] * len(addresses)
+        for candidate in response.json():
+            idx = candidate.get("input_index", 0)
+            if idx < len(addresses) and not results[idx][0]:
+                results[idx] = (True, AddressValidator._from_smarty_candidate(addresses[idx], candidate), None)
+        return results
     
     @staticmethod
-    def validate_bulk_addresses(addresses: List[Dict]) -> List[Tuple[bool, Optional[Dict], Optional[str]]]:
-        """Validate multiple addresses"""
-        results = []
-        for address in addresses:
-            result = AddressValidator.validate_address(address)
-            results.append(result)
+    def _client(provider: str) -> ProviderClient:
+        with AddressValidator._clients_lock:
+            if provider not in AddressValidator._clients:
+                AddressValidator._clients[provider] = ProviderClient(provider)
+            return AddressValidator._clients[provider]
+    
+    @staticmethod
+    def reset_clients():
+        """Drop pooled connections and circuit breaker state (e.g. after changing provider settings)"""
+        with AddressValidator._clients_lock:
+            for client in AddressValidator._clients.values():
+                client.session.close()
+            AddressValidator._clients.clear()
+    
+    @staticmethod
+    def _usps_request_xml(user_id: str, addresses: List[Dict]) -> str:
+        """Build a USPS Verify request (USPS puts the secondary line in Address1)"""
+        root = ElementTree.Element("AddressValidateRequest", USERID=user_id)
+        ElementTree.SubElement(root, "Revision").text = "1"
+        for idx, address_data in enumerate(addresses):
+            zip_code = (address_data.get("zip_code") or "").strip()
+            element = ElementTree.SubElement(root, "Address", ID=str(idx))
+            ElementTree.SubElement(element, "Address1").text = address_data.get("address_line2") or ""
+            ElementTree.SubElement(element, "Address2").text = address_data.get("address_line1") or ""
+            ElementTree.SubElement(element, "City").text = address_data.get("city") or ""
+            ElementTree.SubElement(element, "State").text = address_data.get("state") or ""
+            ElementTree.SubElement(element, "Zip5").text = zip_code[:5]
+            ElementTree.SubElement(element, "Zip4").text = zip_code[6:10] if len(zip_code) > 5 else ""
+        return ElementTree.tostring(root, encoding="unicode")
+    
+    @staticmethod
+    def _parse_usps_response(body: str, addresses: List[Dict]) -> List[Tuple[bool, Optional[Dict], Optional[str]]]:
+        """Map a USPS Verify response back onto the requested addresses, by Address ID"""
+        root = ElementTree.fromstring(body)
+        if root.tag == "Error":
+            raise AddressValidationError(root.findtext("Description") or "USPS request failed")
+        
+        results = [(False, None, "No USPS response for address")] * len(addresses)
+        for element in root.findall("Address"):
+            idx = int(element.get("ID", "0"))
+            if idx >= len(addresses):
+                continue
+            error = element.find("Error")
+            if error is not None:
+                results[idx] = (False, None, error.findtext("Description") or "Address not found")
+                continue
+            zip5 = element.findtext("Zip5") or ""
+            zip4 = element.findtext("Zip4") or ""
+            validated = dict(addresses[idx])
+            validated.update({
+                "address_line1": element.findtext("Address2") or "",
+                "address_line2": element.findtext("Address1") or "",
+                "city": element.findtext("City") or "",
+                "state": element.findtext("State") or "",
+                "zip_code": f"{zip5}-{zip4}" if zip4 else zip5,
+            })
+            results[idx] = (True, validated, None)
         return results
+    
+    @staticmethod
+    def _smarty_lookup(address_data: Dict) -> Dict:
+        return {
+            "street": address_data.get("address_line1") or "",
+            "secondary": address_data.get("address_line2") or "",
+            "city": address_data.get("city") or "",
+            "state": address_data.get("state") or "",
+            "zipcode": address_data.get("zip_code") or "",
+        }
+    
+    @staticmethod
+    def _from_smarty_candidate(address_data: Dict, candidate: Dict) -> Dict:
+        components = candidate.get("components", {})
+        zip5 = components.get("zipcode", "")
+        zip4 = components.get("plus4_code", "")
+        validated = dict(address_data)
+        validated.update({
+            "address_line1": candidate.get("delivery_line_1", ""),
+            "address_line2": candidate.get("delivery_line_2", ""),
+            "city": components.get("city_name", ""),
+            "state": components.get("state_abbreviation", ""),
+            "zip_code": f"{zip5}-{zip4}" if zip4 else zip5,
+        })
+        return validated
+    
+    @staticmethod
+    def validate_bulk_addresses(addresses: List[Dict], concurrency: int = None, deadline: float = None) -> List[Tuple[bool, Optional[Dict], Optional[str]]]:
+        """
+        Validate multiple addresses concurrently, returning results in input order.
+        
+        Addresses are packed into provider batches (ADDRESS_VALIDATION_BATCH_SIZES) and up
+        to concurrency batches (ADDRESS_VALIDATION_CONCURRENCY by default) are in flight at
+        once; per-provider rate limits apply per request. Addresses a provider rejects, or
+        whose whole batch failed, move on to the next provider. deadline is a
+        time.monotonic() value (ADDRESS_VALIDATION_BULK_DEADLINE seconds from now by
+        default); addresses not finished by then get a timeout result. Only answers from
+        the ZIP index or a provider are cached, so an outage is not remembered.
+        """
+        if not addresses:
+            return []
+        
+        use_cache = AddressValidationCache.enabled()
+        results = AddressValidationCache.lookup_many(addresses) if use_cache else [None] * len(addresses)
+        pending = [idx for idx, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        
+        concurrency = concurrency or getattr(settings, "ADDRESS_VALIDATION_CONCURRENCY", 16)
+        if deadline is None:
+            deadline = time.monotonic() + getattr(settings, "ADDRESS_VALIDATION_BULK_DEADLINE", 120.0)
+        
+        # Reject or correct obvious ZIP/city/state mistakes locally before any provider call
+        completed = []
+        timed_out = []
+        rejections = {}
+        checked = {}
+        for idx in pending:
+            verdict, checked[idx], error = ZipIndex.check(addresses[idx])
+            if verdict is False:
+                results[idx] = (False, addresses[idx], error)
+                completed.append(idx)
+        pending = [idx for idx in pending if results[idx] is None]
+        
+        # Cache reads and writes stay on this thread; the pool only talks to providers
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            for provider in AddressValidator._providers():
+                if not pending or time.monotonic() >= deadline:
+                    break
+                
+                size = AddressValidator._batch_size(provider)
+                batches = [pending[start:start + size] for start in range(0, len(pending), size)]
+                futures = [
+                    executor.submit(AddressValidator._validate_batch, provider, [checked[idx] for idx in batch], deadline)
+                    for batch in batches
+                ]
+                wait(futures, timeout=max(deadline - time.monotonic(), 0))
+                
+                rejected = []
+                failed_batches = 0
+                for batch, future in zip(batches, futures):
+                    if not future.done() or future.cancelled():
+                        timed_out.extend(batch)
+                        continue
+                    if future.exception() is not None:
+                        failed_batches += 1
+                        rejected.extend(batch)
+                        continue
+                    for idx, (is_valid, validated_data, error) in zip(batch, future.result()):
+                        if is_valid:
+                            results[idx] = (True, validated_data, None)
+                            completed.append(idx)
+                        else:
+                            rejections[idx] = (False, addresses[idx], error)
+                            rejected.append(idx)
+                
+                logger.info(
+                    f"{AddressValidator.PROVIDER_NAMES[provider]} validated {len(pending) - len(rejected)} of "
+                    f"{len(pending)} addresses in {len(batches)} requests ({failed_batches} failed)"
+                )
+                pending = sorted(rejected)
+        finally:
+            # Don't wait on provider calls that are still running past the deadline
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        for idx in pending:
+            if idx in rejections:
+                results[idx] = rejections[idx]
+                completed.append(idx)
+            elif time.monotonic() >= deadline:
+                timed_out.append(idx)
+            else:
+                results[idx] = (False, addresses[idx], AddressValidator.UNAVAILABLE)
+        for idx in timed_out:
+            results[idx] = (False, addresses[idx], "Address validation timed out, using original address")
+        
+        if use_cache and completed:
+            AddressValidationCache.store_many([addresses[idx] for idx in completed], [results[idx] for idx in completed])
+        return results
+
+
+class ShipmentAddressValidator:
+    """Validate the addresses of many shipments at once, validating each distinct address once"""
+    
+    ADDRESS_TYPES = {"to": "ship_to", "from": "ship_from"}
+    
+    @staticmethod
+    def validate_shipments(queryset, address_types: List[str] = None) -> List[Dict]:
+        """
+        Validate the ship to and/or ship from addresses of every shipment in queryset.
+        
+        Distinct addresses go through AddressValidator.validate_bulk_addresses in one call.
+        Corrected addresses are written with one bulk_update, and pending shipments whose
+        addresses all validated (a missing ship from is skipped) move to "validated" in
+        batched UPDATEs. When a corrected
+        address matches another stored address, its shipments are repointed to that one
+        instead. Returns a summary per shipment.
+        """
+        address_types = address_types or ["to", "from"]
+        fields = [ShipmentAddressValidator.ADDRESS_TYPES[address_type] for address_type in address_types]
+        shipments = list(queryset.select_related(*fields).order_by("id"))
+        
+        addresses = {}
+        for shipment in shipments:
+            for field in fields:
+                address = getattr(shipment, field)
+                if address is not None:
+                    addresses[address.id] = address
+        
+        address_list = list(addresses.values())
+        logger.info(f"Bulk validating {len(address_list)} distinct addresses across {len(shipments)} shipments")
+        results = AddressValidator.validate_bulk_addresses([
+            {field: getattr(address, field) for field in ShipmentAddressValidator._address_fields()}
+            for address in address_list
+        ])
+        outcomes = {address.id: result for address, result in zip(address_list, results)}
+        
+        with transaction.atomic():
+            remapped = ShipmentAddressValidator._save_addresses(address_list, results)
+            
+            summary = []
+            to_validate = []
+            repoint = {field: [] for field in fields}
+            for shipment in shipments:
+                entry = {"id": shipment.id, "addresses": {}}
+                all_valid = True
+                for address_type, field in zip(address_types, fields):
+                    address_id = getattr(shipment, f"{field}_id")
+                    if address_id is None:
+                        # Ship from is optional, so it only counts when it's all that was asked for
+                        entry["addresses"][address_type] = None
+                        all_valid = all_valid and len(fields) > 1
+                        continue
+                    is_valid, _, error = outcomes[address_id]
+                    entry["addresses"][address_type] = {
+                        "is_valid": is_valid,
+                        "address_id": remapped.get(address_id, address_id),
+                        "error": error,
+                    }
+                    all_valid = all_valid and is_valid
+                    if address_id in remapped:
+                        repoint[field].append(shipment.id)
+                
+                if all_valid and shipment.status == "pending":
+                    to_validate.append(shipment.id)
+                    entry["status"] = "validated"
+                else:
+                    entry["status"] = shipment.status
+                entry["is_valid"] = all_valid
+                summary.append(entry)
+            
+            now = timezone.now()
+            for field, shipment_ids in repoint.items():
+                if shipment_ids:
+                    Shipment.objects.filter(id__in=shipment_ids).update(**{
+                        f"{field}_id": Case(
+                            *[When(**{f"{field}_id": old}, then=Value(new)) for old, new in remapped.items()],
+                            default=F(f"{field}_id"),
+                            output_field=BigIntegerField()
+                        ),
+                        "updated_at": now,
+                    })
+            for start in range(0, len(to_validate), 1000):
+                Shipment.objects.filter(id__in=to_validate[start:start + 1000], status="pending").update(
+                    status="validated", updated_at=now
+                )
+            ShipmentTotals.mark_ids(to_validate)
+            ResourceVersions.mark(Shipment)
+        
+        logger.info(f"Validated {len(to_validate)} shipments; {len(remapped)} addresses merged into existing ones")
+        return summary
+    
+    @staticmethod
+    def _address_fields() -> List[str]:
+        return ["first_name", "last_name", "address_line1", "address_line2", "city", "state", "zip_code", "phone"]
+    
+    @staticmethod
+    def _save_addresses(addresses: List[Address], results: List[Tuple[bool, Optional[Dict], Optional[str]]]) -> Dict[int, int]:
+        """Write corrected addresses in bulk; returns {address id: existing address id} for ones that merged"""
+        changes = []
+        for address, (is_valid, validated_data, _) in zip(addresses, results):
+            if not is_valid or not validated_data:
+                continue
+            updates = {
+                field: validated_data[field] or ""
+                for field in AddressValidationCache.FIELDS
+                if field in validated_data and (validated_data[field] or "") != getattr(address, field)
+            }
+            if updates:
+                changes.append((address, updates, Address.fingerprint_for(dict(address.__dict__, **updates))))
+        
+        # A corrected address may now match one that is already stored (or another in this
+        # batch). Addresses whose fingerprint doesn't change keep it, so only the ones
+        # moving to a new fingerprint are left out of the owners
+        owners = dict(
+            Address.objects.filter(fingerprint__in=[fingerprint for _, _, fingerprint in changes])
+            .exclude(id__in=[address.id for address, _, fingerprint in changes if fingerprint != address.fingerprint])
+            .values_list("fingerprint", "id")
+        )
+        remapped = {}
+        to_update = []
+        for address, updates, fingerprint in changes:
+            owner = owners.get(fingerprint)
+            if owner is not None and owner != address.id:
+                remapped[address.id] = owner
+                continue
+            owners[fingerprint] = address.id
+            for field, value in updates.items():
+                setattr(address, field, value)
+            address.fingerprint = fingerprint
+            to_update.append(address)
+        
+        Address.objects.bulk_update(to_update, AddressValidationCache.FIELDS + ["fingerprint"], batch_size=500)
+        if to_update:
+            ResourceVersions.mark(Address)
+            ShipmentChangefeed.touch(address_ids=[address.id for address in to_update])
+        return remapped
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .catalog import ServiceCatalog
+from .models import Address, Package, SavedAddress, SavedPackage, Shipment, ShippingService
+from .services import ResourceVersions, ShipmentChangefeed, ShipmentTotals
+
+
+@receiver([post_save, post_delete], sender=ShippingService)
+def shipping_service_changed(sender, **kwargs):
+    """Let every process know its cached service catalog is stale"""
+    ServiceCatalog.invalidate()
+    if kwargs.get("signal") is post_delete and ShipmentTotals.enabled():
+        # Deleting a service nulls it on shipments with a plain UPDATE
+        ShipmentTotals.rebuild()
+
+
+def shipment_changed(sender, instance, **kwargs):
+    ShipmentTotals.mark([instance])
+
+
+# A post_delete receiver stops Django from fast-deleting shipments in bulk, so only
+# connect these when the summary table is in use
+if getattr(settings, "SHIPMENT_TOTALS_ENABLED", False):
+    post_save.connect(shipment_changed, sender=Shipment, dispatch_uid="shipment_totals_save")
+    post_delete.connect(shipment_changed, sender=Shipment, dispatch_uid="shipment_totals_delete")
+
+
+def resource_changed(sender, **kwargs):
+    ResourceVersions.mark(sender)
+
+
+for model in (Address, Package, SavedAddress, SavedPackage):
+    post_save.connect(resource_changed, sender=model, dispatch_uid=f"resource_versions_save_{model.__name__}")
+    post_delete.connect(resource_changed, sender=model, dispatch_uid=f"resource_versions_delete_{model.__name__}")
+# Shipment deletes are marked by the views instead, to keep bulk deletes fast
+post_save.connect(resource_changed, sender=Shipment, dispatch_uid="resource_versions_save_Shipment")
+
+
+@receiver(post_save, sender=Address)
+def address_saved(sender, instance, created, **kwargs):
+    if not created:
+        ShipmentChangefeed.touch(address_ids=[instance.id])
+
+
+@receiver(post_save, sender=Package)
+def package_saved(sender, instance, created, **kwargs):
+    if not created:
+        ShipmentChangefeed.touch(package_ids=[instance.id])
+
+
+@receiver(pre_delete, sender=Address)
+@receiver(pre_delete, sender=Package)
+def shipments_cascading(sender, instance, **kwargs):
+    """Record the shipments an address or package delete is about to cascade to"""
+    if sender is Address:
+        shipments = Shipment.objects.filter(Q(ship_from=instance) | Q(ship_to=instance))
+    else:
+        shipments = Shipment.objects.filter(package=instance)
+    ShipmentChangefeed.record_deletes(shipments.values_list("id", flat=True))
@@ -1,3 +1,2041 @@
-from django.test import TestCase
+import csv
+import io
+import itertools
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+import requests
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import renderers, signals
+from .catalog import ServiceCatalog
+from .models import (
+    Address, AddressValidationResult, CacheVersion, ImportJob, Package, SavedAddress, Shipment, ShipmentTotal,
+    ShippingService
+)
+from .rates import RateEngine
+from .serializers import ShipmentSerializer
+from .services import (
+    AddressValidationCache, AddressValidationError, AddressValidator, CSVParseError, CSVParser, CircuitBreaker,
+    ImportJobRunner, RateLimiter, ShipmentChangefeed, ShipmentExporter, ShipmentImporter, ShipmentRepricer,
+    ShipmentTotals, ShippingQuoter, ZipIndex
+)
+
+
+def stub_response(status_code=200, body=None, text=""):
+    """A real requests.Response carrying a canned status and body"""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = (json.dumps(body) if body is not None else text).encode("utf-8")
+    return response
+
+
+class StubSession:
+    """
+    Stands in for a ProviderClient's requests.Session. Each request is answered by
+    handler(method, url, **kwargs) after latency seconds, and the number of requests
+    in flight at once is recorded.
+    """
+    
+    def __init__(self, handler, latency=0.0):
+        self.handler = handler
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+    
+    def request(self, method, url, timeout=None, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            return self.handler(method, url, **kwargs)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+    
+    def close(self):
+        pass
+
+
+def smarty_handler(method, url, json=None, **kwargs):
+    """Match every lookup, uppercasing the street so results can be told apart"""
+    return stub_response(body=[
+        {
+            "input_index": idx,
+            "delivery_line_1": lookup["street"].upper(),
+            "delivery_line_2": "",
+            "components": {
+                "city_name": lookup["city"].upper(),
+                "state_abbreviation": lookup["state"],
+                "zipcode": lookup["zipcode"][:5],
+                "plus4_code": "0001",
+            },
+        }
+        for idx, lookup in enumerate(json)
+    ])
+
+
+def usps_handler(method, url, params=None, **kwargs):
+    """Answer a USPS Verify request with a fixed street for every address in it"""
+    request = ElementTree.fromstring(params["XML"])
+    root = ElementTree.Element("AddressValidateResponse")
+    for address in request.findall("Address"):
+        element = ElementTree.SubElement(root, "Address", ID=address.get("ID"))
+        ElementTree.SubElement(element, "Address2").text = "1 USPS WAY"
+        ElementTree.SubElement(element, "City").text = address.findtext("City").upper()
+        ElementTree.SubElement(element, "State").text = address.findtext("State")
+        ElementTree.SubElement(element, "Zip5").text = address.findtext("Zip5")
+    return stub_response(text=ElementTree.tostring(root, encoding="unicode"))
+
+
+def make_addresses(count):
+    return [
+        {
+            "first_name": "Test",
+            "address_line1": f"{idx} Main St",
+            "address_line2": "",
+            "city": "Austin",
+            "state": "TX",
+            "zip_code": "78701",
+        }
+        for idx in range(count)
+    ]
+
+
+def make_shipment(idx, service=None, **kwargs):
+    """A shipment with its own addresses and package, told apart by idx"""
+    ship_from = Address.objects.create(
+        first_name=f"Sender {idx}", address_line1=f"{idx} Oak St", city="Austin", state="TX", zip_code="78701"
+    )
+    ship_to = Address.objects.create(
+        first_name=f"Recipient {idx}", address_line1=f"{idx} Main St", city="Austin", state="TX", zip_code="78701"
+    )
+    package = Package.objects.create(length=10, width=8, height=4, weight_lbs=1)
+    return Shipment.objects.create(
+        order_number=f"ORDER-{idx}", ship_from=ship_from, ship_to=ship_to, package=package,
+        shipping_service=service, **kwargs
+    )
+
+
+def csv_row(idx, order_number=None, weight_lbs=1, ship_from=True):
+    """One data row in the Template.csv layout"""
+    return [
+        *(["Warehouse", "", "1 Depot Rd", "", "Ontario", "91764", "CA"] if ship_from else [""] * 7),
+        f"Recipient {idx}", "Last", f"{idx} Main St", "", "Austin", "78701", "TX",
+        str(weight_lbs), "4", "10", "8", "4", "555-0100", "",
+        f"ORDER-{idx}" if order_number is None else order_number, f"SKU-{idx}",
+    ]
+
+
+def make_csv(rows, encoding="utf-8"):
+    """A CSV upload body with the Template.csv header rows followed by rows"""
+    out = io.StringIO()
+    csv.writer(out).writerows(CSVParser.HEADER_ROWS + rows)
+    return out.getvalue().encode(encoding)
+
+
+PROVIDER_SETTINGS = {
+    "ADDRESS_VALIDATION_CACHE_ENABLED": False,
+    "ZIP_INDEX_PATH": "",
+    "SMARTY_AUTH_ID": "id",
+    "SMARTY_AUTH_TOKEN": "token",
+    "USPS_USER_ID": "",
+    "ADDRESS_VALIDATION_RETRIES": 0,
+}
+
+
+class ProviderTestCase(TestCase):
+    """Provider clients are shared per process, so each test starts from fresh ones"""
+    
+    def setUp(self):
+        AddressValidator.reset_clients()
+    
+    def tearDown(self):
+        AddressValidator.reset_clients()
+    
+    def stub(self, provider, handler, latency=0.0):
+        session = StubSession(handler, latency)
+        AddressValidator._client(provider).session = session
+        return session
+
+
+@override_settings(
+    ADDRESS_VALIDATION_PROVIDERS=["smarty"],
+    ADDRESS_VALIDATION_BATCH_SIZES={"smarty": 1},
+    ADDRESS_VALIDATION_RATE_LIMITS={},
+    **PROVIDER_SETTINGS
+)
+class BulkValidationConcurrencyTests(ProviderTestCase):
+    def test_requests_run_concurrently_up_to_the_limit(self):
+        session = self.stub("smarty", smarty_handler, latency=0.05)
+        addresses = make_addresses(24)
+        
+        started = time.monotonic()
+        results = AddressValidator.validate_bulk_addresses(addresses, concurrency=4)
+        elapsed = time.monotonic() - started
+        
+        self.assertEqual(session.calls, 24)
+        self.assertEqual(session.max_in_flight, 4)
+        # 24 serial calls would take 1.2s
+        self.assertLess(elapsed, 0.9)
+        self.assertTrue(all(is_valid for is_valid, _, _ in results))
+    
+    def test_results_come_back_in_input_order(self):
+        self.stub("smarty", smarty_handler, latency=0.01)
+        addresses = make_addresses(30)
+        
+        results = AddressValidator.validate_bulk_addresses(addresses, concurrency=8)
+        
+        self.assertEqual(
+            [validated["address_line1"] for _, validated, _ in results],
+            [address["address_line1"].upper() for address in addresses]
+        )
+    
+    def test_deadline_returns_timeouts_instead_of_waiting(self):
+        self.stub("smarty", smarty_handler, latency=0.5)
+        
+        started = time.monotonic()
+        results = AddressValidator.validate_bulk_addresses(
+            make_addresses(4), concurrency=4, deadline=time.monotonic() + 0.1
+        )
+        
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(
+            [error for _, _, error in results],
+            ["Address validation timed out, using original address"] * 4
+        )
+
+
+@override_settings(**PROVIDER_SETTINGS)
+class RateLimitTests(ProviderTestCase):
+    def test_token_bucket_spaces_calls_after_the_burst(self):
+        limiter = RateLimiter(rate=50, burst=1)
+        
+        started = time.monotonic()
+        for _ in range(6):
+            self.assertTrue(limiter.acquire())
+        
+        # The first call uses the burst, the other five wait 1/50s each
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+    
+    def test_acquire_gives_up_at_the_deadline(self):
+        limiter = RateLimiter(rate=1, burst=1)
+        self.assertTrue(limiter.acquire())
+        
+        started = time.monotonic()
+        self.assertFalse(limiter.acquire(deadline=time.monotonic() + 0.05))
+        self.assertLess(time.monotonic() - started, 0.05)
+    
+    @override_settings(ADDRESS_VALIDATION_RATE_LIMITS={"smarty": 1}, ADDRESS_VALIDATION_BREAKER_THRESHOLD=1)
+    def test_rate_limited_request_fails_without_tripping_the_breaker(self):
+        session = self.stub("smarty", smarty_handler)
+        client = AddressValidator._client("smarty")
+        client.request("POST", "http://smarty.test", json=[])
+        
+        with self.assertRaises(AddressValidationError):
+            client.request("POST", "http://smarty.test", deadline=time.monotonic() + 0.05, json=[])
+        
+        self.assertEqual(session.calls, 1)
+        self.assertEqual(client.breaker.state, "closed")
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+        
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+    
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+    
+    def test_half_open_lets_one_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        
+        self.assertEqual(breaker.state, "half-open")
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+    
+    def test_failed_trial_reopens_the_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+        for _ in range(3):
+            breaker.record_failure()
+        time.sleep(0.06)
+        
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+    
+    def test_released_trial_can_be_retried(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        
+        self.assertTrue(breaker.allow())
+        breaker.release()
+        self.assertTrue(breaker.allow())
+
+
+@override_settings(
+    ADDRESS_VALIDATION_PROVIDERS=["smarty"],
+    ADDRESS_VALIDATION_RATE_LIMITS={},
+    ADDRESS_VALIDATION_BREAKER_THRESHOLD=2,
+    ADDRESS_VALIDATION_BREAKER_RESET=0.1,
+    **PROVIDER_SETTINGS
+)
+class ProviderCircuitBreakerTests(ProviderTestCase):
+    def test_open_circuit_skips_the_provider(self):
+        session = self.stub("smarty", lambda method, url, **kwargs: stub_response(503))
+        
+        for _ in range(2):
+            result = AddressValidator.validate_address(make_addresses(1)[0])
+            self.assertEqual(result[2], "Address validation unavailable, using original address")
+        self.assertEqual(session.calls, 2)
+        
+        started = time.monotonic()
+        result = AddressValidator.validate_address(make_addresses(1)[0])
+        self.assertEqual(result[2], "Address validation unavailable, using original address")
+        self.assertEqual(session.calls, 2)
+        self.assertLess(time.monotonic() - started, 0.05)
+    
+    def test_half_open_trial_closes_the_circuit_on_success(self):
+        healthy = threading.Event()
+        
+        def handler(method, url, **kwargs):
+            return smarty_handler(method, url, **kwargs) if healthy.is_set() else stub_response(503)
+        
+        session = self.stub("smarty", handler)
+        client = AddressValidator._client("smarty")
+        for _ in range(2):
+            AddressValidator.validate_address(make_addresses(1)[0])
+        self.assertEqual(client.breaker.state, "open")
+        
+        healthy.set()
+        time.sleep(0.11)
+        self.assertEqual(client.breaker.state, "half-open")
+        
+        is_valid, validated, _ = AddressValidator.validate_address(make_addresses(1)[0])
+        self.assertTrue(is_valid)
+        self.assertEqual(validated["address_line1"], "0 MAIN ST")
+        self.assertEqual(client.breaker.state, "closed")
+        self.assertEqual(session.calls, 3)
+    
+    def test_half_open_trial_failure_reopens_the_circuit(self):
+        session = self.stub("smarty", lambda method, url, **kwargs: stub_response(503))
+        client = AddressValidator._client("smarty")
+        for _ in range(2):
+            AddressValidator.validate_address(make_addresses(1)[0])
+        time.sleep(0.11)
+        
+        AddressValidator.validate_address(make_addresses(1)[0])
+        self.assertEqual(session.calls, 3)
+        self.assertEqual(client.breaker.state, "open")
+        
+        AddressValidator.validate_address(make_addresses(1)[0])
+        self.assertEqual(session.calls, 3)
+
+
+@override_settings(
+    ADDRESS_VALIDATION_PROVIDERS=["usps", "smarty"],
+    ADDRESS_VALIDATION_RATE_LIMITS={},
+    ADDRESS_VALIDATION_HEDGE_ENABLED=True,
+    ADDRESS_VALIDATION_HEDGE_DEFAULT_DELAY=0.02,
+    ADDRESS_VALIDATION_HEDGE_MAX_RATE=1.0,
+    **dict(PROVIDER_SETTINGS, USPS_USER_ID="user")
+)
+class HedgedValidationTests(ProviderTestCase):
+    def setUp(self):
+        super().setUp()
+        AddressValidator.reset_hedge_stats()
+    
+    def tearDown(self):
+        AddressValidator.reset_hedge_stats()
+        super().tearDown()
+    
+    def test_slow_primary_is_hedged_and_secondary_wins(self):
+        self.stub("usps", usps_handler, latency=0.5)
+        smarty = self.stub("smarty", smarty_handler)
+        
+        started = time.monotonic()
+        is_valid, validated, _ = AddressValidator.validate_address(make_addresses(1)[0], use_cache=False)
+        
+        self.assertLess(time.monotonic() - started, 0.3)
+        self.assertTrue(is_valid)
+        self.assertEqual(validated["address_line1"], "0 MAIN ST")
+        self.assertEqual(smarty.calls, 1)
+        stats = AddressValidator.hedge_stats()
+        self.assertEqual((stats["calls"], stats["hedged"], stats["hedge_wins"]), (1, 1, 1))
+    
+    def test_fast_primary_is_not_hedged(self):
+        self.stub("usps", usps_handler)
+        smarty = self.stub("smarty", smarty_handler)
+        
+        is_valid, validated, _ = AddressValidator.validate_address(make_addresses(1)[0], use_cache=False)
+        
+        self.assertTrue(is_valid)
+        self.assertEqual(validated["address_line1"], "1 USPS WAY")
+        self.assertEqual(smarty.calls, 0)
+        self.assertEqual(AddressValidator.hedge_stats()["hedged"], 0)
+    
+    def test_losing_request_is_cancelled_before_it_is_sent(self):
+        # Two hedge workers with one kept busy, so the hedge request has to queue
+        executor = ThreadPoolExecutor(max_workers=2)
+        release = threading.Event()
+        executor.submit(release.wait)
+        AddressValidator._hedge_executor = executor
+        try:
+            self.stub("usps", usps_handler, latency=0.15)
+            smarty = self.stub("smarty", smarty_handler)
+            
+            is_valid, validated, _ = AddressValidator.validate_address(make_addresses(1)[0], use_cache=False)
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+            AddressValidator._hedge_executor = None
+        
+        self.assertTrue(is_valid)
+        self.assertEqual(validated["address_line1"], "1 USPS WAY")
+        self.assertEqual(smarty.calls, 0)
+        stats = AddressValidator.hedge_stats()
+        self.assertEqual((stats["hedged"], stats["hedge_wins"]), (1, 0))
+    
+    @override_settings(ADDRESS_VALIDATION_HEDGE_MAX_RATE=0)
+    def test_hedge_rate_is_capped(self):
+        self.stub("usps", usps_handler, latency=0.1)
+        smarty = self.stub("smarty", smarty_handler)
+        
+        is_valid, validated, _ = AddressValidator.validate_address(make_addresses(1)[0], use_cache=False)
+        
+        self.assertEqual(validated["address_line1"], "1 USPS WAY")
+        self.assertEqual(smarty.calls, 0)
+        stats = AddressValidator.hedge_stats()
+        self.assertEqual((stats["calls"], stats["hedged"], stats["hedge_rate"]), (1, 0, 0.0))
+
+
+@override_settings(
+    ADDRESS_VALIDATION_RATE_LIMITS={},
+    ADDRESS_VALIDATION_BREAKER_THRESHOLD=2,
+    ADDRESS_VALIDATION_POOL_SIZE=1,
+    ADDRESS_VALIDATION_POOL_TIMEOUT=0.05,
+    **PROVIDER_SETTINGS
+)
+class ProviderClientTests(ProviderTestCase):
+    def test_client_errors_do_not_open_the_circuit(self):
+        session = self.stub("smarty", lambda method, url, **kwargs: stub_response(400))
+        client = AddressValidator._client("smarty")
+        
+        for _ in range(3):
+            with self.assertRaises(requests.HTTPError):
+                client.request("POST", "http://smarty.test", json=[])
+        
+        self.assertEqual(session.calls, 3)
+        self.assertEqual(client.breaker.state, "closed")
+    
+    def test_rate_limited_responses_do_not_open_the_circuit(self):
+        self.stub("smarty", lambda method, url, **kwargs: stub_response(429))
+        client = AddressValidator._client("smarty")
+        
+        for _ in range(3):
+            with self.assertRaises(requests.HTTPError):
+                client.request("POST", "http://smarty.test", json=[])
+        
+        self.assertEqual(client.breaker.state, "closed")
+    
+    def test_server_errors_and_timeouts_open_the_circuit(self):
+        def handler(method, url, **kwargs):
+            if session.calls == 1:
+                return stub_response(501)
+            raise requests.Timeout("read timed out")
+        
+        session = self.stub("smarty", handler)
+        client = AddressValidator._client("smarty")
+        
+        with self.assertRaises(requests.HTTPError):
+            client.request("POST", "http://smarty.test", json=[])
+        with self.assertRaises(requests.Timeout):
+            client.request("POST", "http://smarty.test", json=[])
+        
+        self.assertEqual(client.breaker.state, "open")
+    
+    def test_waiting_for_a_pooled_connection_is_bounded(self):
+        in_flight = threading.Event()
+        release = threading.Event()
+        
+        def handler(method, url, **kwargs):
+            in_flight.set()
+            release.wait(1)
+            return stub_response(body=[])
+        
+        self.stub("smarty", handler)
+        client = AddressValidator._client("smarty")
+        holder = threading.Thread(target=client.request, args=("POST", "http://smarty.test"))
+        holder.start()
+        in_flight.wait(1)
+        try:
+            started = time.monotonic()
+            with self.assertRaises(AddressValidationError):
+                client.request("POST", "http://smarty.test", json=[])
+            self.assertLess(time.monotonic() - started, 0.5)
+        finally:
+            release.set()
+            holder.join()
+        
+        self.assertEqual(client.breaker.state, "closed")
+        client.request("POST", "http://smarty.test", json=[])
+
+
+class ZipIndexCheckTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmpdir.name, "zip_index.bin")
+        ZipIndex.build([
+            ("78701", ["Austin"], "TX"),
+            ("02134", ["Boston", "Allston"], "MA"),
+            ("63101", ["Saint Louis", "St. Louis"], "MO"),
+        ], cls.path)
+    
+    @classmethod
+    def tearDownClass(cls):
+        ZipIndex.reload()
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+    
+    def setUp(self):
+        overrides = override_settings(ZIP_INDEX_PATH=self.path)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+    
+    def check(self, city, state, zip_code):
+        return ZipIndex.check({"address_line1": "1 Main St", "city": city, "state": state, "zip_code": zip_code})
+    
+    def test_matching_address_passes(self):
+        verdict, address, error = self.check("Austin", "TX", "78701-1234")
+        self.assertTrue(verdict)
+        self.assertEqual((address["city"], address["state"], address["zip_code"]), ("Austin", "TX", "78701-1234"))
+    
+    def test_state_mismatch_is_rejected(self):
+        verdict, _, error = self.check("Dallas", "CA", "78701")
+        self.assertIs(verdict, False)
+        self.assertEqual(error, "ZIP code 78701 is in TX, not CA")
+    
+    def test_malformed_zip_is_rejected(self):
+        self.assertIs(self.check("Austin", "TX", "7870X")[0], False)
+    
+    def test_zip_missing_from_the_index_is_left_to_providers(self):
+        self.assertEqual(self.check("Austin", "TX", "78799"), (None, {
+            "address_line1": "1 Main St", "city": "Austin", "state": "TX", "zip_code": "78799"
+        }, None))
+    
+    def test_four_digit_zip_is_zero_filled(self):
+        verdict, address, _ = self.check("Allston", "MA", "2134")
+        self.assertTrue(verdict)
+        self.assertEqual(address["zip_code"], "02134")
+        
+        verdict, address, _ = self.check("Boston", "MA", "2134-5678")
+        self.assertTrue(verdict)
+        self.assertEqual(address["zip_code"], "02134-5678")
+    
+    def test_unconfirmed_four_digit_zip_is_not_rejected(self):
+        verdict, address, error = self.check("Austin", "TX", "2134")
+        self.assertIsNone(verdict)
+        self.assertEqual(address["zip_code"], "2134")
+        self.assertIsNone(self.check("Austin", "TX", "7870")[0])
+    
+    def test_corrected_city_keeps_the_input_casing(self):
+        self.assertEqual(self.check("Saint Lois", "MO", "63101")[1]["city"], "Saint Louis")
+        self.assertEqual(self.check("saint lois", "MO", "63101")[1]["city"], "saint louis")
+        self.assertEqual(self.check("SAINT LOIS", "MO", "63101")[1]["city"], "SAINT LOUIS")
+    
+    def test_wrong_state_is_corrected_when_the_city_matches(self):
+        verdict, address, _ = self.check("Austin", "CA", "78701")
+        self.assertTrue(verdict)
+        self.assertEqual((address["city"], address["state"]), ("Austin", "TX"))
+
+
+class AddressValidationCacheTests(TestCase):
+    def setUp(self):
+        AddressValidationCache.clear()
+    
+    def tearDown(self):
+        AddressValidationCache.clear()
+    
+    def forget_memory(self):
+        """Drop the in-process tier, as a fresh worker would start"""
+        with AddressValidationCache._lock:
+            AddressValidationCache._entries.clear()
+    
+    def stats_delta(self, before):
+        after = AddressValidationCache.stats()
+        return {key: after[key] - before[key] for key in ("memory_hits", "db_hits", "misses")}
+    
+    def test_results_are_overlaid_on_the_looked_up_address(self):
+        address = make_addresses(1)[0]
+        AddressValidationCache.store(address, (True, dict(address, address_line1="0 MAIN ST"), None))
+        
+        is_valid, validated, error = AddressValidationCache.lookup(dict(address, first_name="Other"))
+        
+        self.assertTrue(is_valid)
+        self.assertEqual((validated["address_line1"], validated["first_name"], error), ("0 MAIN ST", "Other", None))
+    
+    def test_memory_hits_and_misses_are_counted(self):
+        address, other = make_addresses(2)
+        AddressValidationCache.store(address, (False, address, "Address not found"))
+        before = AddressValidationCache.stats()
+        
+        self.assertEqual(AddressValidationCache.lookup(address), (False, address, "Address not found"))
+        self.assertIsNone(AddressValidationCache.lookup(other))
+        
+        self.assertEqual(self.stats_delta(before), {"memory_hits": 1, "db_hits": 0, "misses": 1})
+        self.assertEqual(AddressValidationCache.stats()["memory_entries"], 1)
+    
+    def test_memory_misses_fall_through_to_the_database(self):
+        address = make_addresses(1)[0]
+        AddressValidationCache.store(address, (True, address, None))
+        self.forget_memory()
+        before = AddressValidationCache.stats()
+        
+        self.assertTrue(AddressValidationCache.lookup(address)[0])
+        self.assertTrue(AddressValidationCache.lookup(address)[0])
+        
+        self.assertEqual(self.stats_delta(before), {"memory_hits": 1, "db_hits": 1, "misses": 0})
+    
+    @override_settings(ADDRESS_VALIDATION_CACHE_SIZE=2)
+    def test_least_recently_used_entry_is_evicted(self):
+        first, second, third = make_addresses(3)
+        AddressValidationCache.store(first, (True, first, None))
+        AddressValidationCache.store(second, (True, second, None))
+        AddressValidationCache.lookup(first)
+        AddressValidationCache.store(third, (True, third, None))
+        self.assertEqual(AddressValidationCache.stats()["memory_entries"], 2)
+        
+        before = AddressValidationCache.stats()
+        AddressValidationCache.lookup_many([first, third])
+        self.assertEqual(self.stats_delta(before), {"memory_hits": 2, "db_hits": 0, "misses": 0})
+        
+        before = AddressValidationCache.stats()
+        AddressValidationCache.lookup(second)
+        self.assertEqual(self.stats_delta(before), {"memory_hits": 0, "db_hits": 1, "misses": 0})
+    
+    @override_settings(ADDRESS_VALIDATION_CACHE_TTL=3600, ADDRESS_VALIDATION_CACHE_NEGATIVE_TTL=60)
+    def test_entries_expire_after_their_ttl(self):
+        valid, invalid = make_addresses(2)
+        started, now = time.time(), timezone.now()
+        AddressValidationCache.store_many([valid, invalid], [(True, valid, None), (False, invalid, "Address not found")])
+        
+        def later(seconds):
+            return mock.patch.multiple(
+                "shipping.services", time=mock.Mock(time=lambda: started + seconds),
+                timezone=mock.Mock(now=lambda: now + timedelta(seconds=seconds))
+            )
+        
+        with later(120):
+            self.assertEqual([result is None for result in AddressValidationCache.lookup_many([valid, invalid])], [False, True])
+            self.forget_memory()
+            self.assertEqual([result is None for result in AddressValidationCache.lookup_many([valid, invalid])], [False, True])
+        with later(7200):
+            self.assertEqual(AddressValidationCache.lookup_many([valid, invalid]), [None, None])
+    
+    def test_a_batch_is_looked_up_and_stored_with_one_query_each(self):
+        addresses = make_addresses(50)
+        with self.assertNumQueries(1):
+            AddressValidationCache.store_many(addresses, [(True, address, None) for address in addresses])
+        self.forget_memory()
+        
+        with self.assertNumQueries(1):
+            results = AddressValidationCache.lookup_many(addresses)
+        self.assertTrue(all(result[0] for result in results))
+
+
+@override_settings(
+    ADDRESS_VALIDATION_PROVIDERS=["smarty"],
+    ADDRESS_VALIDATION_RATE_LIMITS={},
+    **dict(PROVIDER_SETTINGS, ADDRESS_VALIDATION_CACHE_ENABLED=True)
+)
+class ValidationCachingTests(ProviderTestCase):
+    """Only the ZIP index's or a provider's answer is cached, never the fallback used in an outage"""
+    
+    def setUp(self):
+        super().setUp()
+        AddressValidationCache.clear()
+        self.healthy = threading.Event()
+        self.session = self.stub("smarty", self.handler)
+    
+    def tearDown(self):
+        AddressValidationCache.clear()
+        super().tearDown()
+    
+    def handler(self, method, url, **kwargs):
+        return smarty_handler(method, url, **kwargs) if self.healthy.is_set() else stub_response(503)
+    
+    def test_outage_is_not_cached(self):
+        address = make_addresses(1)[0]
+        self.assertEqual(AddressValidator.validate_address(address)[2], AddressValidator.UNAVAILABLE)
+        self.assertFalse(AddressValidationResult.objects.exists())
+        
+        self.healthy.set()
+        self.assertTrue(AddressValidator.validate_address(address)[0])
+    
+    def test_failed_bulk_batches_are_not_cached(self):
+        addresses = make_addresses(3)
+        results = AddressValidator.validate_bulk_addresses(addresses)
+        self.assertEqual({result[2] for result in results}, {AddressValidator.UNAVAILABLE})
+        self.assertFalse(AddressValidationResult.objects.exists())
+        
+        self.healthy.set()
+        self.assertTrue(all(result[0] for result in AddressValidator.validate_bulk_addresses(addresses)))
+    
+    def test_provider_rejections_are_cached(self):
+        self.session.handler = lambda method, url, **kwargs: stub_response(body=[])
+        address = make_addresses(1)[0]
+        
+        self.assertEqual(AddressValidator.validate_address(address), (False, address, "Address not found"))
+        self.assertEqual(AddressValidator.validate_bulk_addresses([address])[0], (False, address, "Address not found"))
+        self.assertEqual(self.session.calls, 1)
+    
+    def test_bulk_rejections_are_cached(self):
+        self.session.handler = lambda method, url, **kwargs: stub_response(body=[])
+        addresses = make_addresses(2)
+        
+        results = AddressValidator.validate_bulk_addresses(addresses)
+        
+        self.assertEqual({result[2] for result in results}, {"Address not found"})
+        self.assertEqual(AddressValidationResult.objects.count(), 2)
+
+
+class ListQueryCountTests(TestCase):
+    """
+    List endpoints must cost the same number of queries whatever the page holds: one
+    for the ETag's change counters and one for the page itself, with nested objects
+    joined in rather than loaded per row.
+    """
+    
+    @classmethod
+    def setUpTestData(cls):
+        service = ShippingService.objects.create(name="ground", base_price=5, per_oz_rate="0.1")
+        for idx in range(30):
+            ship_from = Address.objects.create(
+                first_name=f"Sender {idx}", address_line1=f"{idx} Oak St", city="Austin", state="TX", zip_code="78701"
+            )
+            ship_to = Address.objects.create(
+                first_name=f"Recipient {idx}", address_line1=f"{idx} Main St", city="Austin", state="TX", zip_code="78701"
+            )
+            package = Package.objects.create(length=10, width=8, height=4, weight_lbs=1)
+            Shipment.objects.create(
+                order_number=f"ORDER-{idx}", ship_from=ship_from, ship_to=ship_to,
+                package=package, shipping_service=service
+            )
+            SavedAddress.objects.create(name=f"Sender {idx}", address=ship_from)
+    
+    def setUp(self):
+        self.client = APIClient()
+        # The shipping service catalog is cached per process; load it outside the counted queries
+        ServiceCatalog.clear()
+        ServiceCatalog.all()
+    
+    def assertListQueries(self, url, count, num):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        results = data["results"] if isinstance(data, dict) else data
+        self.assertEqual(len(results), count)
+        return data
+    
+    def test_shipment_list(self):
+        data = self.assertListQueries("/api/shipments/", 30, 2)
+        self.assertEqual(data["results"][0]["ship_to"]["first_name"], "Recipient 0")
+        self.assertEqual(data["results"][0]["shipping_service"]["name"], "ground")
+    
+    @override_settings(SHIPMENT_FAST_LIST=False)
+    def test_shipment_list_through_nested_serializers(self):
+        self.assertListQueries("/api/shipments/", 30, 2)
+    
+    def test_shipment_list_pages(self):
+        data = self.assertListQueries("/api/shipments/?page_size=10", 10, 2)
+        data = self.assertListQueries(data["next"], 10, 2)
+        self.assertEqual(data["results"][0]["order_number"], "ORDER-10")
+    
+    def test_shipment_list_with_sparse_fields(self):
+        self.assertListQueries("/api/shipments/?fields=id,order_number,ship_to", 30, 2)
+    
+    def test_address_list(self):
+        self.assertListQueries("/api/addresses/", 60, 2)
+    
+    def test_address_list_pages(self):
+        data = self.assertListQueries("/api/addresses/?page_size=25", 25, 2)
+        self.assertListQueries(data["next"], 25, 2)
+    
+    def test_saved_address_list(self):
+        data = self.assertListQueries("/api/saved-addresses/", 30, 2)
+        results = data["results"] if isinstance(data, dict) else data
+        self.assertTrue(all(saved["address"]["first_name"].startswith("Sender") for saved in results))
+
+
+@override_settings(CHANGEFEED_LAG=0, CHANGEFEED_RETENTION_DAYS=7)
+class ShipmentChangefeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+    
+    def poll(self, cursor, page_size=100):
+        response = self.client.get("/api/shipments/changes/", {"since": cursor, "page_size": page_size})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_caught_up_cursor_advances_when_nothing_changed(self):
+        cursor = ShipmentChangefeed.encode_cursor(timezone.now() - timedelta(days=6), 0)
+        
+        data = self.poll(cursor)
+        
+        self.assertEqual((data["changed"], data["deleted"], data["has_more"]), ([], [], False))
+        since, _ = ShipmentChangefeed.decode_cursor(data["cursor"])
+        self.assertGreater(since, timezone.now() - timedelta(minutes=1))
+    
+    def test_idle_client_that_keeps_polling_does_not_expire(self):
+        started = timezone.now()
+        cursor = ShipmentChangefeed.start()
+        for day in range(1, 9):
+            with mock.patch("django.utils.timezone.now", return_value=started + timedelta(days=day)):
+                cursor = self.poll(cursor)["cursor"]
+    
+    def test_changes_are_sent_once(self):
+        cursor = ShipmentChangefeed.start()
+        shipment = make_shipment(1)
+        
+        data = self.poll(cursor)
+        self.assertEqual([row["id"] for row in data["changed"]], [shipment.id])
+        self.assertEqual(self.poll(data["cursor"])["changed"], [])
+    
+    def test_tombstones_are_delivered_without_repeats(self):
+        shipments = [make_shipment(idx) for idx in range(3)]
+        cursor = ShipmentChangefeed.start()
+        self.client.delete(f"/api/shipments/{shipments[0].id}/")
+        self.client.post(
+            "/api/shipments/bulk_delete/", {"ids": [shipments[1].id]}, format="json"
+        )
+        
+        data = self.poll(cursor)
+        self.assertEqual(data["deleted"], sorted([shipments[0].id, shipments[1].id]))
+        self.assertEqual(data["changed"], [])
+        
+        data = self.poll(data["cursor"])
+        self.assertEqual(data["deleted"], [])
+    
+    def test_paging_through_an_updated_at_tie_group(self):
+        cursor = ShipmentChangefeed.start()
+        shipments = [make_shipment(idx) for idx in range(5)]
+        tied = timezone.now()
+        Shipment.objects.update(updated_at=tied)
+        
+        seen, pages = [], []
+        while True:
+            data = self.poll(cursor, page_size=2)
+            seen.extend(row["id"] for row in data["changed"])
+            pages.append(data["has_more"])
+            cursor = data["cursor"]
+            if not data["has_more"]:
+                break
+        
+        self.assertEqual(pages, [True, True, False])
+        self.assertEqual(seen, sorted(shipment.id for shipment in shipments))
+    
+    def test_expired_cursor_is_gone(self):
+        cursor = ShipmentChangefeed.encode_cursor(timezone.now() - timedelta(days=8), 0)
+        
+        response = self.client.get("/api/shipments/changes/", {"since": cursor})
+        
+        self.assertEqual(response.status_code, 410)
+    
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get("/api/shipments/changes/", {"since": "not-a-cursor"})
+        
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportQueryCountTests(TestCase):
+    """
+    A batch is written with one address lookup and set-based INSERTs, never per-row writes.
+    On SQLite Django splits each bulk INSERT at 999 parameters, so the number of INSERTs
+    depends on each model's column count rather than being one per model.
+    """
+    
+    @staticmethod
+    def inserts(model, rows):
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        return math.ceil(rows / connection.ops.bulk_batch_size(fields, [None] * rows))
+    
+    def import_queries(self, rows):
+        with CaptureQueriesContext(connection) as queries:
+            importer = ShipmentImporter(batch_size=1000).import_file(
+                io.BytesIO(make_csv([csv_row(idx) for idx in range(rows)]))
+            )
+        self.assertEqual(importer.created_count, rows)
+        return [query["sql"] for query in queries.captured_queries if not query["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+    
+    def test_import_writes_in_bulk(self):
+        queries = self.import_queries(1000)
+        
+        # Every row has its own recipient and shares one sender: 29 queries on SQLite, 4 on PostgreSQL
+        expected = 1 + self.inserts(Address, 1001) + self.inserts(Package, 1000) + self.inserts(Shipment, 1000)
+        self.assertEqual(len(queries), expected)
+
+
+class UpsertImportTests(TestCase):
+    def upload(self, rows, **options):
+        return ShipmentImporter(upsert=True, **options).import_file(io.BytesIO(make_csv(rows)))
+    
+    def counts(self, importer):
+        return {
+            "created": importer.created_count,
+            "updated": importer.updated_count,
+            "unchanged": importer.unchanged_count,
+            "duplicates": importer.duplicate_count,
+        }
+    
+    def test_new_order_numbers_are_created(self):
+        importer = self.upload([csv_row(1), csv_row(2)])
+        
+        self.assertEqual(self.counts(importer), {"created": 2, "updated": 0, "unchanged": 0, "duplicates": 0})
+    
+    def test_changed_rows_update_the_existing_shipment(self):
+        self.upload([csv_row(1)])
+        shipment = Shipment.objects.get()
+        Shipment.objects.filter(id=shipment.id).update(status="validated")
+        
+        importer = self.upload([csv_row(1, weight_lbs=3)])
+        
+        self.assertEqual(self.counts(importer), {"created": 0, "updated": 1, "unchanged": 0, "duplicates": 0})
+        updated = Shipment.objects.select_related("package").get()
+        self.assertEqual((updated.id, updated.package_id), (shipment.id, shipment.package_id))
+        self.assertEqual(updated.package.weight_lbs, 3)
+        self.assertEqual(updated.status, "pending")
+    
+    def test_unchanged_rows_are_skipped(self):
+        self.upload([csv_row(1), csv_row(2)])
+        before = dict(Shipment.objects.values_list("id", "updated_at"))
+        
+        importer = self.upload([csv_row(1), csv_row(2, weight_lbs=5)])
+        
+        self.assertEqual(self.counts(importer), {"created": 0, "updated": 1, "unchanged": 1, "duplicates": 0})
+        unchanged = Shipment.objects.get(order_number="ORDER-1")
+        self.assertEqual(unchanged.updated_at, before[unchanged.id])
+    
+    def test_unpurchased_only_leaves_purchased_shipments_alone(self):
+        self.upload([csv_row(1), csv_row(2)])
+        Shipment.objects.filter(order_number="ORDER-1").update(status="purchased")
+        
+        importer = self.upload([csv_row(1, weight_lbs=4), csv_row(2, weight_lbs=4)], unpurchased_only=True)
+        
+        self.assertEqual(importer.updated_count, 1)
+        purchased = Shipment.objects.select_related("package").get(order_number="ORDER-1", status="purchased")
+        self.assertEqual(purchased.package.weight_lbs, 1)
+        self.assertEqual(Shipment.objects.get(order_number="ORDER-2").package.weight_lbs, 4)
+    
+    def test_purchased_shipments_keep_their_status_when_updated(self):
+        self.upload([csv_row(1)])
+        Shipment.objects.update(status="purchased")
+        
+        importer = self.upload([csv_row(1, weight_lbs=4)])
+        
+        self.assertEqual(importer.updated_count, 1)
+        self.assertEqual(Shipment.objects.get().status, "purchased")
+    
+    def test_generated_order_numbers_are_always_inserted(self):
+        rows = [csv_row(1, order_number=""), csv_row(2, order_number="")]
+        self.upload(rows)
+        
+        importer = self.upload(rows)
+        
+        self.assertEqual(self.counts(importer), {"created": 2, "updated": 0, "unchanged": 0, "duplicates": 0})
+        self.assertEqual(Shipment.objects.count(), 4)
+    
+    def test_reimported_export_of_generated_order_numbers_is_unchanged(self):
+        self.upload([csv_row(1, order_number=""), csv_row(2, order_number="", ship_from=False)])
+        exported = "".join(ShipmentExporter.iter_csv(Shipment.objects.all())).encode("utf-8")
+        
+        importer = ShipmentImporter(upsert=True).import_file(io.BytesIO(exported))
+        
+        self.assertEqual(self.counts(importer), {"created": 0, "updated": 0, "unchanged": 2, "duplicates": 0})
+    
+    def test_repeated_order_numbers_in_a_batch_are_counted_as_duplicates(self):
+        self.upload([csv_row(1)])
+        
+        importer = self.upload([csv_row(1), csv_row(1, weight_lbs=2), csv_row(2), csv_row(2)])
+        
+        self.assertEqual(self.counts(importer), {"created": 1, "updated": 1, "unchanged": 0, "duplicates": 2})
+        self.assertEqual(Shipment.objects.get(order_number="ORDER-1").package.weight_lbs, 2)
+    
+    def test_upload_reports_the_counts(self):
+        self.upload([csv_row(1)])
+        upload = SimpleUploadedFile("shipments.csv", make_csv([csv_row(1), csv_row(1, weight_lbs=2), csv_row(2)]))
+        
+        response = APIClient().post(
+            "/api/shipments/upload_csv/", {"file": upload, "upsert": "true"}, format="multipart"
+        )
+        
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data["count"], data["updated"], data["unchanged"], data["duplicates"]), (1, 1, 0, 1))
+
+
+class FastShipmentListTests(TestCase):
+    """
+    The list fast path (ShipmentListSerializer + FastJSONRenderer) must produce the same
+    bytes as ShipmentSerializer + JSONRenderer, so serializer changes can't drift apart.
+    """
+    
+    @classmethod
+    def setUpTestData(cls):
+        ground = ShippingService.objects.create(name="ground", base_price="5.00", per_oz_rate="0.1250")
+        priority = ShippingService.objects.create(name="priority", base_price="8.5", per_oz_rate="0.2")
+        purchased = make_shipment(1, service=ground, status="purchased", shipping_price=Decimal("12.5"))
+        Address.objects.filter(id=purchased.ship_to_id).update(
+            first_name="Zo\u00eb \u2028 line", last_name="O\u2029Neil \U0001f4e6", address_line2="Apt \"3\" \\ back"
+        )
+        Package.objects.filter(id=purchased.package_id).update(item_sku="SKU \u00e9\u00e8", length=Decimal("10.5"))
+        make_shipment(2, status="ready")
+        Shipment.objects.filter(order_number="ORDER-2").update(ship_from=None)
+        make_shipment(3, service=priority, shipping_price=Decimal("7.10"))
+    
+    def setUp(self):
+        self.client = APIClient()
+        ServiceCatalog.clear()
+    
+    def assertSameBytes(self, url):
+        with override_settings(SHIPMENT_FAST_LIST=True):
+            fast = self.client.get(url)
+        with override_settings(SHIPMENT_FAST_LIST=False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast.content
+    
+    def test_default_fields(self):
+        content = self.assertSameBytes("/api/shipments/")
+        self.assertIn(b"\\u2028", content)
+        self.assertIn("Zo\u00eb".encode("utf-8"), content)
+    
+    def test_pages(self):
+        self.assertSameBytes("/api/shipments/?page_size=2")
+    
+    def test_sparse_fieldset(self):
+        self.assertSameBytes("/api/shipments/?fields=id,order_number,ship_to.first_name,ship_to.formatted,shipping_price")
+    
+    def test_display_fields(self):
+        self.assertSameBytes("/api/shipments/?fields=status,status_display,shipping_service.name_display")
+    
+    def test_expand(self):
+        self.assertSameBytes("/api/shipments/?expand=ship_to")
+        self.assertSameBytes("/api/shipments/?fields=id,package,shipping_service&expand=shipping_service")
+
+
+class FastJSONRendererTests(TestCase):
+    def assertSameBytes(self, data):
+        fast = renderers.FastJSONRenderer().render(data)
+        self.assertEqual(fast, JSONRenderer().render(data))
+        return fast
+    
+    @skipUnless(renderers.orjson, "orjson is not installed")
+    def test_plain_data_is_encoded_with_orjson(self):
+        data = {"id": 1, "name": "Zo\u00eb \U0001f4e6", "tags": ["a", None, True], "nested": {"quote": "\"\\/"}}
+        with mock.patch.object(renderers.orjson, "dumps", wraps=renderers.orjson.dumps) as dumps:
+            self.assertSameBytes(data)
+        dumps.assert_called_once()
+    
+    def test_line_separators_are_escaped(self):
+        content = self.assertSameBytes({"text": "a\u2028b\u2029c"})
+        self.assertEqual(content, b'{"text":"a\\u2028b\\u2029c"}')
+    
+    def test_values_orjson_cannot_encode_fall_back(self):
+        self.assertSameBytes({"price": Decimal("1.10")})
+        self.assertSameBytes({"when": datetime(2026, 1, 2, 3, 4, 5)})
+        self.assertSameBytes({"big": 2 ** 70})
+
+
+@override_settings(
+    ADDRESS_VALIDATION_PROVIDERS=["usps"],
+    ADDRESS_VALIDATION_CACHE_ENABLED=False,
+    ZIP_INDEX_PATH="",
+    USPS_USER_ID="",
+)
+class ConditionalGetTests(TestCase):
+    """A matching If-None-Match skips the read, and every write path must change the ETag"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.ground = ShippingService.objects.create(name="ground", base_price="5.00", per_oz_rate="0.1")
+        cls.priority = ShippingService.objects.create(name="priority", base_price="8.00", per_oz_rate="0.2")
+        cls.shipments = [make_shipment(idx, service=cls.ground) for idx in range(3)]
+    
+    def setUp(self):
+        self.client = APIClient()
+        # The catalog version is part of the shipment ETag; load it outside the counted queries
+        ServiceCatalog.clear()
+        ServiceCatalog.all()
+    
+    def etag(self, url="/api/shipments/"):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+    
+    def assertChangesETag(self, write, url="/api/shipments/"):
+        before = self.etag(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = write()
+        self.assertLess(response.status_code, 300)
+        self.assertNotEqual(self.etag(url), before)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=before).status_code, 200)
+    
+    def test_matching_etag_skips_the_list_query(self):
+        etag = self.etag()
+        
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/shipments/", HTTP_IF_NONE_MATCH=etag)
+        
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+    
+    def test_matching_etag_skips_the_detail_query(self):
+        url = f"/api/shipments/{self.shipments[0].id}/"
+        etag = self.etag(url)
+        
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        
+        self.assertEqual(response.status_code, 304)
+    
+    def test_single_edits_change_the_etag(self):
+        self.assertChangesETag(lambda: self.client.patch(
+            f"/api/shipments/{self.shipments[0].id}/", {"status": "ready"}, format="json"
+        ))
+        self.assertChangesETag(lambda: self.client.patch(
+            f"/api/addresses/{self.shipments[0].ship_to_id}/", {"city": "Dallas"}, format="json"
+        ))
+        self.assertChangesETag(lambda: self.client.delete(f"/api/shipments/{self.shipments[1].id}/"))
+    
+    def upload(self, rows, **options):
+        upload = SimpleUploadedFile("shipments.csv", make_csv(rows))
+        return self.client.post("/api/shipments/upload_csv/", dict(options, file=upload), format="multipart")
+    
+    def test_import_changes_the_etag(self):
+        self.assertChangesETag(lambda: self.upload([csv_row(10), csv_row(11)]))
+        self.assertChangesETag(lambda: self.upload([csv_row(12)]), url="/api/addresses/")
+        # Only new shipments and packages this time: the addresses are reused
+        self.assertChangesETag(lambda: self.upload([csv_row(10), csv_row(11)]))
+    
+    def test_upsert_update_changes_the_etag(self):
+        self.upload([csv_row(10)])
+        self.assertChangesETag(lambda: self.upload([csv_row(10, weight_lbs=9)], upsert="true"))
+    
+    def test_repricing_changes_the_etag(self):
+        ids = [shipment.id for shipment in self.shipments]
+        self.assertChangesETag(lambda: self.client.post(
+            "/api/shipments/bulk_update_shipping_service/", {"ids": ids, "service_id": self.priority.id}, format="json"
+        ))
+        self.assertChangesETag(lambda: self.client.post(
+            "/api/shipments/bulk_update_shipping_service/", {"ids": ids, "option": "cheapest"}, format="json"
+        ))
+    
+    def test_bulk_validation_changes_the_etag(self):
+        ids = [shipment.id for shipment in self.shipments]
+        self.assertChangesETag(lambda: self.client.post(
+            "/api/shipments/bulk_validate_addresses/", {"ids": ids}, format="json"
+        ))
+    
+    def test_bulk_update_and_delete_change_the_etag(self):
+        ids = [shipment.id for shipment in self.shipments]
+        self.assertChangesETag(lambda: self.client.post(
+            "/api/shipments/bulk_update/", {"ids": ids, "updates": {"status": "ready"}}, format="json"
+        ))
+        self.assertChangesETag(lambda: self.client.post("/api/shipments/bulk_delete/", {"ids": ids[:2]}, format="json"))
+    
+    def test_shipping_service_change_changes_the_etag(self):
+        def write():
+            self.ground.base_price = Decimal("6.00")
+            self.ground.save()
+            return mock.Mock(status_code=200)
+        
+        self.assertChangesETag(write)
+
+
+@override_settings(SHIPMENT_TOTALS_ENABLED=True)
+class ShipmentTotalsTests(TestCase):
+    """The ShipmentTotal summary must always equal the aggregate over the shipments it summarizes"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.ground = ShippingService.objects.create(name="ground", base_price="5.00", per_oz_rate="0.1")
+        cls.priority = ShippingService.objects.create(name="priority", base_price="8.00", per_oz_rate="0.2")
+    
+    def setUp(self):
+        # The summary's signal receivers are only connected when the setting is on at startup
+        post_save.connect(signals.shipment_changed, sender=Shipment, dispatch_uid="shipment_totals_save")
+        post_delete.connect(signals.shipment_changed, sender=Shipment, dispatch_uid="shipment_totals_delete")
+        self.client = APIClient()
+        self.numbers = itertools.count(100)
+        ServiceCatalog.clear()
+    
+    def tearDown(self):
+        post_save.disconnect(sender=Shipment, dispatch_uid="shipment_totals_save")
+        post_delete.disconnect(sender=Shipment, dispatch_uid="shipment_totals_delete")
+    
+    def create(self, count, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [make_shipment(next(self.numbers), **kwargs) for _ in range(count)]
+    
+    def assertSummaryMatches(self):
+        expected = {
+            (row["day"], row["status"], row["shipping_service_id"] or 0): (row["shipments"], row["priced"], row["total"] or 0)
+            for row in Shipment.objects.annotate(day=TruncDate("created_at")).values(
+                "day", "status", "shipping_service_id"
+            ).annotate(shipments=Count("id"), priced=Count("shipping_price"), total=Sum("shipping_price"))
+        }
+        summary = {
+            (row.day, row.status, row.shipping_service_id): (row.shipments, row.priced, row.total)
+            for row in ShipmentTotal.objects.all()
+        }
+        self.assertEqual(summary, expected)
+        self.assertEqual(
+            ShipmentTotals.from_summary(breakdown=["status", "service"]),
+            ShipmentTotals.from_queryset(Shipment.objects.all(), ["status", "service"])
+        )
+    
+    def test_single_saves(self):
+        shipments = self.create(3, service=self.ground, shipping_price=Decimal("5.10"))
+        self.create(1)
+        self.assertSummaryMatches()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            shipments[0].status = "purchased"
+            shipments[0].save()
+            shipments[1].shipping_price = Decimal("7.25")
+            shipments[1].shipping_service = self.priority
+            shipments[1].save()
+        self.assertSummaryMatches()
+    
+    def test_earlier_days_are_kept_apart(self):
+        self.create(2, service=self.ground, shipping_price=Decimal("5.10"))
+        Shipment.objects.filter(id=Shipment.objects.first().id).update(created_at=timezone.now() - timedelta(days=3))
+        ShipmentTotals.rebuild()
+        self.assertEqual(ShipmentTotal.objects.count(), 2)
+        
+        self.create(1, service=self.ground, shipping_price=Decimal("1.00"))
+        self.assertSummaryMatches()
+    
+    def test_deletes(self):
+        shipments = self.create(4, service=self.ground, shipping_price=Decimal("5.10"))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/shipments/{shipments[0].id}/")
+        self.assertSummaryMatches()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/shipments/bulk_delete/", {"ids": [shipments[1].id, shipments[2].id]}, format="json")
+        self.assertSummaryMatches()
+        self.assertEqual(ShipmentTotal.objects.get().shipments, 1)
+    
+    def test_imports(self):
+        self.create(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            ShipmentImporter().import_file(io.BytesIO(make_csv([csv_row(idx) for idx in range(5)])))
+        self.assertSummaryMatches()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            ShipmentImporter(upsert=True).import_file(io.BytesIO(make_csv([csv_row(1, weight_lbs=2)])))
+        self.assertSummaryMatches()
+    
+    def test_repricing(self):
+        shipments = self.create(4)
+        ids = [shipment.id for shipment in shipments]
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            ShipmentRepricer.apply_service(ids[:2], self.priority)
+        self.assertSummaryMatches()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            ShipmentRepricer.apply_cheapest(ids)
+        self.assertSummaryMatches()
+    
+    def test_deleting_a_service_rebuilds_the_summary(self):
+        self.create(2, service=self.priority, shipping_price=Decimal("9.00"))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.priority.delete()
+        
+        self.assertSummaryMatches()
+    
+    def test_breakdown_sums_are_exact(self):
+        self.create(3, service=self.ground, shipping_price=Decimal("0.10"))
+        self.create(3, service=self.priority, shipping_price=Decimal("0.20"), status="purchased")
+        self.create(1, service=self.priority)
+        
+        for enabled in (True, False):
+            with self.subTest(summary=enabled), override_settings(SHIPMENT_TOTALS_ENABLED=enabled):
+                data = self.client.get("/api/shipments/total_price/", {"breakdown": "status,service"}).data
+                self.assertEqual((data["total"], data["count"]), (Decimal("0.90"), 6))
+                self.assertIsInstance(data["total"], Decimal)
+                self.assertEqual(data["by_status"], [
+                    {"status": "pending", "count": 3, "total": Decimal("0.30")},
+                    {"status": "purchased", "count": 3, "total": Decimal("0.60")},
+                ])
+                self.assertEqual(data["by_service"], [
+                    {"service_id": self.ground.id, "service": "ground", "count": 3, "total": Decimal("0.30")},
+                    {"service_id": self.priority.id, "service": "priority", "count": 3, "total": Decimal("0.60")},
+                ])
+
+
+# Priority has a rate table (with dimensional weight); ground is priced by its formula
+RATE_SERVICES = {"priority": {"prices": "priority.csv", "dim_divisor": 166, "dim_min_volume": 1728}}
+RATE_PRICES = [
+    ["weight_lbs", "1", "2", "3", "4", "5", "6", "7", "8", "9"],
+    ["0.5", "7.75", "7.95", "8.15", "8.35", "8.55", "8.75", "8.95", "9.15", "9.35"],
+    ["1", "8.80", "9.10", "9.40", "9.70", "10.00", "10.30", "10.60", "10.90", "11.20"],
+    ["2", "10.05", "10.65", "11.25", "11.85", "12.45", "13.05", "13.65", "14.25", "14.85"],
+    ["5", "13.80", "15.30", "16.80", "18.30", "19.80", "21.30", "22.80", "24.30", "25.80"],
+    ["10", "20.05", "23.05", "26.05", "29.05", "32.05", "35.05", "38.05", "41.05", "44.05"],
+    ["20", "32.55", "38.55", "44.55", "50.55", "56.55", "62.55", "68.55", "74.55", "80.55"],
+]
+RATE_ZONES = [
+    ["origin_zip3", "dest_zip3_start", "dest_zip3_end", "zone"],
+    ["787", "750", "799", "1"],
+    ["787", "100", "149", "4"],
+    ["917", "750", "799", "6"],
+    ["917", "100", "149", "8"],
+]
+
+
+def write_rate_tables(directory, services=RATE_SERVICES, prices=RATE_PRICES, zones=RATE_ZONES):
+    with open(os.path.join(directory, "services.json"), "w") as f:
+        json.dump(services, f)
+    for name, rows in (("priority.csv", prices), ("zones.csv", zones)):
+        with open(os.path.join(directory, name), "w", newline="") as f:
+            csv.writer(f).writerows(rows)
+
+
+class RateTableTestCase(TestCase):
+    """Prices from small rate tables written to a temporary RATE_TABLES_DIR"""
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        write_rate_tables(cls.tmpdir.name)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+    
+    def setUp(self):
+        overrides = override_settings(
+            RATE_TABLES_DIR=self.tmpdir.name, RATE_DEFAULT_ORIGIN_ZIP="78701", CATALOG_CHECK_INTERVAL=0
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        ServiceCatalog.clear()
+
+
+class ShipmentRepricerTests(RateTableTestCase):
+    """Set-based repricing must store exactly what a calculate_price loop over the rows would"""
+    
+    # (weight_lbs, weight_oz, (length, width, height), ship_from ZIP, ship_to ZIP)
+    PACKAGES = [
+        (0, 0, ("4", "4", "1"), "78701", "78701"),
+        (0, 5, ("6", "4", "2.5"), "78701", "10001"),
+        (1, 0, ("10", "8", "4"), "91764", "78702"),
+        (2, 7, ("12.25", "12", "12"), "91764", "10010"),
+        (4, 15, ("8", "8", "8"), None, "75001"),
+        (12, 0, ("20", "10", "10"), "78701", "10001"),
+        (30, 0, ("10", "10", "10"), "78701", "78701"),
+        (1, 3, ("10", "8", "4"), "78701", "99501"),
+        (1, 3, ("10", "8", "4"), "78701", "ABCDE"),
+    ]
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.ground = ShippingService.objects.create(name="ground", base_price="4.50", per_oz_rate="0.1375")
+        cls.priority = ShippingService.objects.create(name="priority", base_price="7.00", per_oz_rate="0.2")
+        cls.shipments = []
+        for idx, (lbs, oz, (length, width, height), from_zip, to_zip) in enumerate(cls.PACKAGES):
+            shipment = make_shipment(idx)
+            Package.objects.filter(id=shipment.package_id).update(
+                weight_lbs=lbs, weight_oz=oz, length=length, width=width, height=height
+            )
+            Address.objects.filter(id=shipment.ship_to_id).update(zip_code=to_zip)
+            if from_zip:
+                Address.objects.filter(id=shipment.ship_from_id).update(zip_code=from_zip)
+            else:
+                Shipment.objects.filter(id=shipment.id).update(ship_from=None)
+            cls.shipments.append(shipment.id)
+    
+    def quotes(self, service):
+        """Prices from calculate_price, one shipment at a time"""
+        return {
+            shipment.id: service.calculate_price(
+                shipment.package, shipment.ship_from.zip_code if shipment.ship_from else None, shipment.ship_to.zip_code
+            )
+            for shipment in Shipment.objects.select_related("package", "ship_from", "ship_to")
+        }
+    
+    def stored(self):
+        return {pk: (service_id, price) for pk, service_id, price in
+                Shipment.objects.values_list("id", "shipping_service_id", "shipping_price")}
+    
+    def save_one_by_one(self, choices):
+        """Store {shipment id: (service, price)} through save(), as the per-row code did"""
+        for shipment in Shipment.objects.filter(id__in=list(choices)):
+            shipment.shipping_service, shipment.shipping_price = choices[shipment.id]
+            shipment.save()
+        return self.stored()
+    
+    def test_both_pricing_kinds_are_exercised(self):
+        table_prices = RateEngine.quote_packages(
+            "priority", [shipment.package for shipment in Shipment.objects.select_related("package")],
+            ["78701"] * len(self.PACKAGES), [to_zip for *_, to_zip in self.PACKAGES]
+        )
+        self.assertTrue(any(price is not None for price in table_prices))
+        self.assertTrue(any(price is None for price in table_prices))
+        self.assertIsNone(RateEngine.quote_packages("ground", [], [], []))
+    
+    def test_apply_service_matches_calculate_price(self):
+        for service in (self.priority, self.ground):
+            with self.subTest(service=service.name):
+                updated = ShipmentRepricer.apply_service(self.shipments, ServiceCatalog.get(service.id))
+                self.assertEqual(updated, len(self.shipments))
+                bulk = self.stored()
+                
+                quotes = self.quotes(service)
+                expected = self.save_one_by_one({pk: (service, price) for pk, price in quotes.items()})
+                self.assertEqual(bulk, expected)
+    
+    def test_apply_cheapest_matches_a_per_row_minimum(self):
+        result = ShipmentRepricer.apply_cheapest(self.shipments)
+        bulk = self.stored()
+        
+        services = sorted([self.ground, self.priority], key=lambda service: service.id)
+        quotes = {service.id: self.quotes(service) for service in services}
+        cents = {
+            service.id: {pk: round(Decimal(str(price)) * 100) for pk, price in prices.items()}
+            for service, prices in zip(services, quotes.values())
+        }
+        choices = {}
+        for pk in self.shipments:
+            # Ties go to the lower service id
+            best = min(services, key=lambda service: (cents[service.id][pk], service.id))
+            choices[pk] = (best, quotes[best.id][pk])
+        expected = self.save_one_by_one(choices)
+        
+        self.assertEqual(bulk, expected)
+        self.assertEqual(result["updated"], len(self.shipments))
+        self.assertEqual(
+            result["services"],
+            {service.name: sum(1 for best, _ in choices.values() if best == service) for service in services}
+        )
+        baseline = self.ground.id
+        savings = sum(cents[baseline][pk] - cents[best.id][pk] for pk, (best, _) in choices.items())
+        self.assertAlmostEqual(result["savings"], savings / 100)
+        self.assertEqual({best.name for best, _ in choices.values()}, {"ground", "priority"})
+    
+    def test_unknown_service_is_rejected(self):
+        before = self.stored()
+        
+        response = APIClient().post(
+            "/api/shipments/bulk_update_shipping_service/", {"ids": self.shipments, "service_id": 999999}, format="json"
+        )
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored(), before)
+
+
+def reference_price(weight_oz, dims, origin_zip, dest_zip):
+    """Priority price straight from RATE_PRICES and RATE_ZONES in Decimal, or None if there isn't one"""
+    origin_zip = origin_zip or "78701"
+    if not (origin_zip[:3].isdigit() and dest_zip[:3].isdigit()):
+        return None
+    zone = next(
+        (int(zone) for origin, start, end, zone in RATE_ZONES[1:]
+         if origin == origin_zip[:3] and int(start) <= int(dest_zip[:3]) <= int(end)),
+        None
+    )
+    if zone is None:
+        return None
+    billable_lbs = Decimal(max(weight_oz, 1)) / 16
+    volume = math.prod(Decimal(dim) for dim in dims)
+    if volume > RATE_SERVICES["priority"]["dim_min_volume"]:
+        billable_lbs = max(billable_lbs, math.ceil(volume / RATE_SERVICES["priority"]["dim_divisor"]))
+    for row in RATE_PRICES[1:]:
+        if billable_lbs <= Decimal(row[0]):
+            return Decimal(row[zone])
+    return None
+
+
+class RateEngineTests(RateTableTestCase):
+    """The compiled tables must price like a plain walk over the CSV files"""
+    
+    WEIGHTS_OZ = [0, 1, 7, 8, 9, 16, 17, 32, 33, 79, 80, 81, 320, 321]
+    DIMENSIONS = [
+        ("10", "8", "4"),
+        ("12", "12", "12"),       # exactly dim_min_volume: actual weight only
+        ("12", "12", "12.01"),
+        ("14", "12", "12"),
+        ("12.25", "11.5", "13.75"),
+        ("30", "20", "20"),
+    ]
+    ROUTES = [
+        ("78701", "78701"), ("78712-1234", "75001"), ("78701", "79999"), ("78701", "74999"),
+        ("78701", "10001"), ("78701", "14999"), ("91764", "78701"), ("91764", "10010"),
+        (None, "10001"), ("", "78701"), ("78701", "99501"), ("00000", "78701"), ("78701", "ABCDE"),
+    ]
+    
+    def test_quotes_match_the_decimal_reference(self):
+        cases = list(itertools.product(self.WEIGHTS_OZ, self.DIMENSIONS, self.ROUTES))
+        packages = [
+            Package(weight_lbs=weight_oz // 16, weight_oz=weight_oz % 16, length=length, width=width, height=height)
+            for weight_oz, (length, width, height), _ in cases
+        ]
+        quotes = RateEngine.quote_packages(
+            "priority", packages, [origin for *_, (origin, _) in cases], [dest for *_, (_, dest) in cases]
+        )
+        
+        expected = [reference_price(weight_oz, dims, origin, dest) for weight_oz, dims, (origin, dest) in cases]
+        self.assertEqual(quotes, expected)
+        # Every branch of the reference is reached
+        self.assertIn(None, expected)
+        self.assertGreater(len(set(expected)), 20)
+    
+    def test_dimensional_weight_only_applies_over_the_minimum_volume(self):
+        table = RateEngine.table("priority")
+        
+        # 1 oz in zone 1: 12x12x12 bills the 0.5 lb break, 12x12x12.01 bills 10.4 lbs, rounded up to 11 (the 20 lb break)
+        cents = table.quote_batch([1, 1], [1200, 1200], [1200, 1200], [1200, 1201], [1, 1])
+        
+        self.assertEqual(cents.tolist(), [775, 3255])
+    
+    def test_services_without_a_table_are_not_quoted(self):
+        self.assertIsNone(RateEngine.quote_packages("ground", [Package(length=1, width=1, height=1)], [None], ["78701"]))
+    
+    def test_changed_files_are_recompiled(self):
+        version = RateEngine.book().version
+        prices = [row[:] for row in RATE_PRICES]
+        prices[1][1] = "17.75"
+        write_rate_tables(self.tmpdir.name, prices=prices)
+        self.addCleanup(write_rate_tables, self.tmpdir.name)
+        
+        package = Package(weight_lbs=0, weight_oz=4, length=1, width=1, height=1)
+        self.assertEqual(RateEngine.quote_packages("priority", [package], ["78701"], ["78701"]), [Decimal("17.75")])
+        self.assertNotEqual(RateEngine.book().version, version)
+
+
+class ShippingQuoterTests(RateTableTestCase):
+    """Memoized quotes must equal calculate_price and never outlive the table they came from"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.ground = ShippingService.objects.create(name="ground", base_price="4.50", per_oz_rate="0.1375")
+        cls.priority = ShippingService.objects.create(name="priority", base_price="7.00", per_oz_rate="0.2")
+    
+    def setUp(self):
+        super().setUp()
+        ShippingQuoter.clear()
+        self.addCleanup(ShippingQuoter.clear)
+        self.packages = [
+            Package(weight_lbs=lbs, weight_oz=oz, length=length, width="8", height="4")
+            for lbs, oz, length in ((0, 3, "10"), (1, 0, "10"), (2, 7, "60.5"), (30, 0, "10"), (0, 3, "10"))
+        ]
+        self.origins = ["78701", None, "91764", "78701", "78701"]
+        self.destinations = ["78701", "10001", "10010", "75001", "99501"]
+    
+    def quote(self):
+        before = ShippingQuoter.stats()
+        quotes = ShippingQuoter.quote(self.packages, self.origins, self.destinations)
+        after = ShippingQuoter.stats()
+        return quotes, after["hits"] - before["hits"], after["misses"] - before["misses"]
+    
+    def expected(self):
+        return [
+            [
+                (service, Decimal(str(service.calculate_price(package, origin, destination))).quantize(Decimal("0.01")))
+                for service in ServiceCatalog.all()
+            ]
+            for package, origin, destination in zip(self.packages, self.origins, self.destinations)
+        ]
+    
+    def test_quotes_match_calculate_price(self):
+        quotes, _, _ = self.quote()
+        
+        self.assertEqual(quotes, self.expected())
+    
+    def test_repeat_quotes_are_memoized(self):
+        _, hits, misses = self.quote()
+        # The first and last packages share a key for ground, whose price only depends on weight
+        self.assertEqual((hits, misses), (0, 10))
+        self.assertEqual(ShippingQuoter.stats()["entries"], 9)
+        
+        quotes, hits, misses = self.quote()
+        
+        self.assertEqual((hits, misses), (10, 0))
+        self.assertEqual(quotes, self.expected())
+    
+    def test_new_table_version_is_not_served_from_memo(self):
+        self.quote()
+        prices = [row[:] for row in RATE_PRICES]
+        prices[1][1] = "17.75"
+        write_rate_tables(self.tmpdir.name, prices=prices)
+        self.addCleanup(write_rate_tables, self.tmpdir.name)
+        
+        quotes, hits, misses = self.quote()
+        
+        # Only the priority quotes were keyed on the old table version
+        self.assertEqual((hits, misses), (5, 5))
+        self.assertEqual(quotes, self.expected())
+        self.assertEqual(quotes[0][1], (self.priority, Decimal("17.75")))
+    
+    def test_changed_rates_are_not_served_from_memo(self):
+        self.quote()
+        with self.captureOnCommitCallbacks(execute=True):
+            ShippingService.objects.filter(id=self.ground.id).update(base_price="5.00")
+            ServiceCatalog.invalidate()
+        
+        quotes, hits, misses = self.quote()
+        
+        self.assertEqual((hits, misses), (5, 5))
+        self.assertEqual(quotes, self.expected())
+        self.assertEqual(quotes[0][0][1], Decimal("5.41"))
+    
+    @override_settings(QUOTE_CACHE_SIZE=4)
+    def test_memo_is_bounded(self):
+        self.quote()
+        
+        self.assertEqual(ShippingQuoter.stats()["entries"], 4)
+        quotes, _, _ = self.quote()
+        self.assertEqual(quotes, self.expected())
+
+
+class ServiceCatalogTests(TestCase):
+    """Cached services must follow saves and deletes once they commit, in this process and others"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.ground = ShippingService.objects.create(name="ground", base_price="4.50", per_oz_rate="0.1375")
+        cls.priority = ShippingService.objects.create(name="priority", base_price="7.00", per_oz_rate="0.2")
+    
+    def setUp(self):
+        overrides = override_settings(CATALOG_CHECK_INTERVAL=60)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        ServiceCatalog.clear()
+        self.addCleanup(ServiceCatalog.clear)
+    
+    def test_save_is_picked_up_on_commit(self):
+        version = ServiceCatalog.version()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            service = ShippingService.objects.get(id=self.ground.id)
+            service.base_price = Decimal("5.25")
+            service.save()
+            # Other requests in this process keep the committed copy until then
+            self.assertEqual(ServiceCatalog.get(self.ground.id).base_price, Decimal("4.50"))
+        
+        self.assertEqual(ServiceCatalog.get(self.ground.id).base_price, Decimal("5.25"))
+        self.assertEqual(ServiceCatalog.version(), version + 1)
+        self.assertEqual(CacheVersion.current(ServiceCatalog.VERSION_KEY), version + 1)
+    
+    def test_other_processes_see_the_bump_after_the_check_interval(self):
+        ServiceCatalog.all()
+        # Another process's change: the version row moves, but nothing clears this copy
+        ShippingService.objects.filter(id=self.priority.id).update(base_price="8.00")
+        CacheVersion.bump(ServiceCatalog.VERSION_KEY)
+        
+        self.assertEqual(ServiceCatalog.get(self.priority.id).base_price, Decimal("7.00"))
+        with override_settings(CATALOG_CHECK_INTERVAL=0):
+            self.assertEqual(ServiceCatalog.get(self.priority.id).base_price, Decimal("8.00"))
+    
+    def test_new_and_deleted_services(self):
+        ServiceCatalog.all()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            express = ShippingService.objects.create(name="priority", base_price="12.00")
+        self.assertEqual(ServiceCatalog.get(express.id), express)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ground.delete()
+        self.assertEqual(ServiceCatalog.all(), [self.priority, express])
+        self.assertIsNone(ServiceCatalog.get(self.ground.id))
+        self.assertEqual(ServiceCatalog.by_name("priority"), self.priority)
+    
+    def test_unknown_id_checks_the_version_first(self):
+        ServiceCatalog.all()
+        # Created by another process: only the version row tells this one
+        express = ShippingService.objects.create(name="priority", base_price="12.00")
+        
+        self.assertEqual(ServiceCatalog.get(express.id), express)
+        self.assertIsNone(ServiceCatalog.get(999999))
+        self.assertIsNone(ServiceCatalog.get("not an id"))
+    
+    def test_rolled_back_change_keeps_the_catalog(self):
+        version = ServiceCatalog.version()
+        
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    ShippingService.objects.filter(id=self.ground.id).update(base_price="1.00")
+                    ServiceCatalog.invalidate()
+                    raise ValueError
+            except ValueError:
+                pass
+        
+        self.assertEqual(callbacks, [])
+        self.assertEqual(CacheVersion.current(ServiceCatalog.VERSION_KEY), version)
+        with override_settings(CATALOG_CHECK_INTERVAL=0):
+            self.assertEqual(ServiceCatalog.get(self.ground.id).base_price, Decimal("4.50"))
+
+
+@override_settings(CSV_IMPORT_CHUNK_SIZE=5, CSV_IMPORT_BATCH_SIZE=2)
+class CSVUploadTests(TestCase):
+    """Uploads are decoded chunk by chunk and saved batch by batch, but succeed or fail as a whole"""
+    
+    NAMES = ["José", "Zoë Ærøskøbing", "François", "Ñandú", "Müller"]
+    
+    def rows(self):
+        rows = []
+        for idx, name in enumerate(self.NAMES):
+            row = csv_row(idx)
+            row[7] = name
+            rows.append(row)
+        return rows
+    
+    def upload(self, body):
+        return APIClient().post(
+            "/api/shipments/upload_csv/", {"file": SimpleUploadedFile("shipments.csv", body)}, format="multipart"
+        )
+    
+    def assertImported(self, body, encoding):
+        self.assertEqual(CSVParser.detect_encoding(io.BytesIO(body)), encoding)
+        
+        response = self.upload(body)
+        
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["count"], len(self.NAMES))
+        self.assertEqual(
+            list(Shipment.objects.order_by("id").values_list("ship_to__first_name", flat=True)), self.NAMES
+        )
+    
+    def test_latin1_upload(self):
+        self.assertImported(make_csv(self.rows(), "latin-1"), "latin-1")
+    
+    def test_utf8_bom_upload(self):
+        # Multi-byte characters straddle the 5-byte chunks
+        self.assertImported(make_csv(self.rows(), "utf-8-sig"), "utf-8-sig")
+    
+    @override_settings(CSV_IMPORT_CHUNK_SIZE=4096)
+    def test_late_parse_error_rolls_back_every_batch(self):
+        # Two batches are saved before the oversized field is reached
+        body = make_csv(self.rows()) + b'"' + b"x" * (csv.field_size_limit() + 1) + b'"\n'
+        
+        response = self.upload(body)
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("CSV parsing failed", response.json()["error"])
+        self.assertEqual((Shipment.objects.count(), Address.objects.count(), Package.objects.count()), (0, 0, 0))
+
+
+class ImportJobClaimTests(TestCase):
+    """Each queued job must go to exactly one worker"""
+    
+    def setUp(self):
+        self.jobs = [ImportJob.objects.create(file=f"imports/{idx}.csv", original_name=f"{idx}.csv") for idx in range(3)]
+    
+    def test_jobs_are_claimed_oldest_first_and_once(self):
+        ImportJob.objects.filter(id=self.jobs[0].id).update(status="completed")
+        
+        claimed = [ImportJobRunner.claim_next() for _ in range(4)]
+        
+        self.assertEqual([job.id if job else None for job in claimed], [self.jobs[1].id, self.jobs[2].id, None, None])
+        self.assertEqual(claimed[0].status, "running")
+        self.assertIsNotNone(claimed[0].started_at)
+    
+    def test_job_claimed_by_another_worker_meanwhile_is_skipped(self):
+        first = self.jobs[0]
+        real_now = timezone.now
+        
+        def other_worker_claims_first():
+            # Runs after claim_next has read the queued ids but before its UPDATE
+            if ImportJob.objects.filter(id=first.id, status="queued").exists():
+                ImportJob.objects.filter(id=first.id).update(status="running", started_at=real_now())
+            return real_now()
+        
+        with mock.patch("shipping.services.timezone.now", side_effect=other_worker_claims_first):
+            claimed = ImportJobRunner.claim_next()
+        
+        self.assertEqual(claimed.id, self.jobs[1].id)
+        self.assertEqual(
+            list(ImportJob.objects.order_by("id").values_list("status", flat=True)), ["running", "running", "queued"]
+        )
+
+
+class ParallelParseTests(TestCase):
+    """The process pool must yield exactly what the serial parser does, in the same order"""
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.TemporaryDirectory()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+    
+    def write(self, body):
+        path = os.path.join(self.tmpdir.name, f"{self._testMethodName}.csv")
+        with open(path, "wb") as f:
+            f.write(body)
+        return path
+    
+    def rows(self, count):
+        rows = []
+        for idx in range(count):
+            row = csv_row(idx)
+            if idx % 3 == 0:
+                # Quoted newlines, commas and quotes inside fields
+                row[10] = f"Suite {idx}\nBuilding \"B\", rear"
+            if idx % 7 == 0:
+                row[7] = f"Zoë\r\n{idx}"
+            if idx % 5 == 0:
+                # Order numbers made up from the row number
+                row[21] = ""
+            if idx % 11 == 0:
+                # Skipped for a missing ship-to address
+                row[9] = ""
+            rows.append(row)
+        return rows
+    
+    def serial(self, path, encoding):
+        with open(path, "rb") as f:
+            return list(CSVParser.iter_rows(CSVParser._iter_lines(f, encoding, 64)))
+    
+    def test_quoted_newlines_parse_the_same_in_parallel(self):
+        for encoding in ("utf-8-sig", "latin-1"):
+            with self.subTest(encoding=encoding):
+                path = self.write(make_csv(self.rows(60), encoding))
+                serial = self.serial(path, encoding)
+                
+                # Small segments put many boundaries next to multi-line records
+                parallel = list(CSVParser.iter_rows_parallel(path, encoding, workers=3, segment_size=256))
+                
+                self.assertEqual(parallel, serial)
+                self.assertEqual([row_num for row_num, _, _ in parallel], list(range(3, 63)))
+                self.assertIn(None, [data for _, data, _ in parallel])
+                self.assertEqual(parallel[3][1]["ship_to"]["address_line2"], 'Suite 3\nBuilding "B", rear')
+                self.assertEqual(parallel[50][1]["order_number"], "ORD-53")
+    
+    @override_settings(CSV_PARALLEL_PARSE_THRESHOLD=0, CSV_PARALLEL_PARSE_WORKERS=2, CSV_PARALLEL_SEGMENT_SIZE=512)
+    def test_large_files_on_disk_take_the_parallel_path(self):
+        path = self.write(make_csv(self.rows(40)))
+        
+        with open(path, "rb") as f, mock.patch.object(
+            CSVParser, "iter_rows_parallel", wraps=CSVParser.iter_rows_parallel
+        ) as parallel:
+            f.temporary_file_path = lambda: path
+            rows = list(CSVParser.iter_file_rows(f))
+        
+        parallel.assert_called_once()
+        self.assertEqual(rows, self.serial(path, "utf-8-sig"))
+    
+    def test_headers_only_is_a_parse_error(self):
+        path = self.write(make_csv([]))
+        
+        with self.assertRaises(CSVParseError):
+            list(CSVParser.iter_rows_parallel(path, "utf-8-sig", workers=2))
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ShipmentExportTests(TestCase):
+    """Exports stream in chunks, and a CSV export re-imports to the same shipments"""
+    
+    FIELDS = [
+        "order_number", *(f"{side}__{field}" for side in ("ship_from", "ship_to") for field in (
+            "first_name", "last_name", "address_line1", "address_line2", "city", "state", "zip_code", "phone"
+        )),
+        "package__weight_lbs", "package__weight_oz", "package__length", "package__width", "package__height",
+        "package__item_sku",
+    ]
+    
+    @classmethod
+    def setUpTestData(cls):
+        rows = [csv_row(idx, weight_lbs=idx) for idx in range(5)]
+        rows[0][7:11] = ["Zoë, \"Jr\"", "Ærø", "1 Main St", "Suite 5\nRear door"]
+        rows[1][16:19] = ["12.25", "0.5", "7"]
+        rows[2][21] = ""
+        rows[3] = csv_row(3, ship_from=False)
+        rows[4][19:21] = ["", "555-0199"]
+        ShipmentImporter().import_file(io.BytesIO(make_csv(rows)))
+    
+    def snapshot(self):
+        return list(Shipment.objects.order_by("id").values_list(*self.FIELDS))
+    
+    def test_csv_export_reimports_to_the_same_shipments(self):
+        before = self.snapshot()
+        response = APIClient().get("/api/shipments/export_csv/")
+        self.assertEqual(response.status_code, 200)
+        chunks = list(response.streaming_content)
+        # Flushed every EXPORT_CHUNK_SIZE rows: 2 + 2 + 1
+        self.assertEqual(len(chunks), 3)
+        body = b"".join(chunks)
+        Shipment.objects.all().delete()
+        Address.objects.all().delete()
+        Package.objects.all().delete()
+        
+        response = APIClient().post(
+            "/api/shipments/upload_csv/", {"file": SimpleUploadedFile("shipments.csv", body)}, format="multipart"
+        )
+        
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["errors"], [])
+        self.assertEqual(self.snapshot(), before)
+    
+    def test_ndjson_lines_match_the_serializer(self):
+        response = APIClient().get("/api/shipments/export_ndjson/")
+        
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        expected = ShipmentSerializer(Shipment.objects.order_by("id"), many=True).data
+        self.assertEqual([json.loads(line) for line in lines], json.loads(JSONRenderer().render(expected)))
+    
+    def test_filters_apply_to_exports(self):
+        Shipment.objects.filter(order_number="ORDER-1").update(status="purchased")
+        
+        response = APIClient().get("/api/shipments/export_csv/?status=purchased")
+        
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode("utf-8"))))
+        self.assertEqual([row[21] for row in rows[2:]], ["ORDER-1"])
+
+
+def typo_fixing_handler(method, url, json=None, **kwargs):
+    """Like smarty_handler, but also corrects "Mian" to "Main" so the address's fingerprint changes"""
+    response = smarty_handler(method, url, json=json)
+    results = response.json()
+    for result in results:
+        result["delivery_line_1"] = result["delivery_line_1"].replace("MIAN", "MAIN")
+    return stub_response(body=results)
+
+
+@override_settings(
+    **PROVIDER_SETTINGS,
+    ADDRESS_VALIDATION_PROVIDERS=["smarty"],
+    ADDRESS_VALIDATION_RATE_LIMITS={},
+)
+class BulkAddressValidationTests(ProviderTestCase):
+    """Corrected addresses that match a stored one are merged into it instead of duplicated"""
+    
+    def setUp(self):
+        super().setUp()
+        self.stub("smarty", typo_fixing_handler)
+    
+    def address(self, line1, **kwargs):
+        fields = {"first_name": "Pat", "city": "Austin", "state": "TX", "zip_code": "78701"}
+        return Address.objects.create(address_line1=line1, **{**fields, **kwargs})
+    
+    def shipment(self, ship_to, ship_from=None):
+        package = Package.objects.create(length=10, width=8, height=4, weight_lbs=1)
+        return Shipment.objects.create(ship_to=ship_to, ship_from=ship_from, package=package)
+    
+    def validate(self, shipments, types=("to", "from")):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post(
+                "/api/shipments/bulk_validate_addresses/",
+                {"ids": [shipment.id for shipment in shipments], "types": list(types)},
+                format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def ship_to_ids(self, shipments):
+        return list(
+            Shipment.objects.filter(id__in=[shipment.id for shipment in shipments])
+            .order_by("id").values_list("ship_to_id", flat=True)
+        )
+    
+    def test_corrected_address_is_repointed_to_the_stored_match(self):
+        stored = self.address("1 Main St")
+        typo = self.address("1 Mian St")
+        sender = self.address("9 Mian St", first_name="Warehouse")
+        shipments = [self.shipment(typo, sender), self.shipment(typo), self.shipment(stored)]
+        
+        result = self.validate(shipments)
+        
+        self.assertEqual(result["validated"], 3)
+        self.assertEqual(self.ship_to_ids(shipments), [stored.id] * 3)
+        self.assertEqual(
+            [entry["addresses"]["to"]["address_id"] for entry in result["shipments"]], [stored.id] * 3
+        )
+        # The typo row is left for nothing to use rather than rewritten into a duplicate
+        typo.refresh_from_db()
+        self.assertEqual(typo.address_line1, "1 Mian St")
+        # Addresses with no stored match are corrected in place
+        sender.refresh_from_db()
+        self.assertEqual(sender.address_line1, "9 MAIN ST")
+        self.assertEqual(Shipment.objects.get(id=shipments[0].id).ship_from_id, sender.id)
+        self.assertEqual(set(Shipment.objects.values_list("status", flat=True)), {"validated"})
+    
+    def test_addresses_in_one_batch_that_correct_to_the_same_place_merge(self):
+        # The typo comes first, and corrects to the fingerprint the second one already holds
+        typo = self.address("2 Mian St")
+        correct = self.address("2 Main St")
+        other_typo = self.address("2 Mian St", first_name="Sam")
+        shipments = [self.shipment(typo), self.shipment(correct)]
+        
+        self.validate(shipments, types=["to"])
+        
+        self.assertEqual(self.ship_to_ids(shipments), [correct.id, correct.id])
+        self.assertEqual(Address.objects.get(id=correct.id).address_line1, "2 MAIN ST")
+        # Only addresses of the validated shipments are touched
+        self.assertEqual(Address.objects.get(id=other_typo.id).address_line1, "2 Mian St")
+    
+    def test_only_the_requested_address_types_are_validated(self):
+        sender = self.address("3 Mian St", first_name="Warehouse")
+        shipment = self.shipment(self.address("4 Mian St"), sender)
+        
+        result = self.validate([shipment], types=["to"])
+        
+        self.assertEqual(list(result["shipments"][0]["addresses"]), ["to"])
+        self.assertEqual(Address.objects.get(id=sender.id).address_line1, "3 Mian St")
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    api_root, AddressViewSet, PackageViewSet, SavedAddressViewSet,
+    api_root, quotes, AddressViewSet, ImportJobViewSet, PackageViewSet, SavedAddressViewSet,
     SavedPackageViewSet, ShippingServiceViewSet, ShipmentViewSet
 )
 
@@ -12,8 +12,10 @@ router.register(r"saved-addresses", SavedAddressViewSet)
 router.register(r"saved-packages", SavedPackageViewSet)
 router.register(r"shipping-services", ShippingServiceViewSet)
 router.register(r"shipments", ShipmentViewSet)
+router.register(r"import-jobs", ImportJobViewSet)
 
 urlpatterns = [
     path("", api_root, name="api-root"),
+    path("api/quotes/", quotes, name="quotes"),
     path("api/", include(router.urls)),
 ]
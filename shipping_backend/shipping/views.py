@@ -1,17 +1,33 @@
 import logging
+from datetime import datetime
+from typing import List
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
 from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
 
-from .models import Address, Package, SavedAddress, SavedPackage, ShippingService, Shipment
+from .catalog import ServiceCatalog
+from .models import Address, ImportJob, Package, SavedAddress, SavedPackage, ShippingService, Shipment
+from .pagination import CreatedCursorPagination, IdCursorPagination
+from .renderers import FastJSONRenderer
 from .serializers import (
-    AddressSerializer, PackageSerializer, SavedAddressSerializer,
-    SavedPackageSerializer, ShippingServiceSerializer, ShipmentSerializer
+    AddressSerializer, ImportJobSerializer, PackageSerializer, QuoteRequestSerializer, SavedAddressSerializer,
+    SavedPackageSerializer, ServiceQuoteSerializer, ShippingServiceSerializer, ShipmentListSerializer, ShipmentSerializer,
+    parse_fieldset
+)
+from .services import (
+    AddressValidator, CSVParseError, ExpiredCursorError, ResourceVersions, ShipmentAddressValidator, ShipmentChangefeed,
+    ShipmentExporter, ShipmentImporter, ShipmentRepricer, ShipmentTotals, ShippingQuoter
 )
-from .services import CSVParser, AddressValidator, CSVParseError
 
 logger = logging.getLogger("shipping")
 
@@ -25,35 +41,182 @@ def api_root(request):
         "status": "active",
         "endpoints": {
             "shipments": "/api/shipments/",
+            "shipment_changes": "/api/shipments/changes/",
             "upload_csv": "/api/shipments/upload_csv/",
+            "import_jobs": "/api/import-jobs/",
             "addresses": "/api/addresses/",
             "packages": "/api/packages/",
             "saved_addresses": "/api/saved-addresses/",
             "saved_packages": "/api/saved-packages/",
             "shipping_services": "/api/shipping-services/",
+            "quotes": "/api/quotes/",
             "admin": "/admin/"
         }
     })
 
 
-class AddressViewSet(viewsets.ModelViewSet):
+@api_view(['POST'])
+def quotes(request):
+    """
+    Price one package (an object) or many (a list) with every shipping service.
+    
+    Each entry has either package (dimensions and weight) or saved_package_id, plus
+    optional ship_from_zip and ship_to_zip. Nothing is saved.
+    """
+    many = isinstance(request.data, list)
+    serializer = QuoteRequestSerializer(data=request.data, many=many)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    entries = serializer.validated_data if many else [serializer.validated_data]
+    
+    max_packages = getattr(settings, "QUOTE_MAX_PACKAGES", 1000)
+    if len(entries) > max_packages:
+        return Response(
+            {"error": f"At most {max_packages} packages can be quoted per request"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    saved_ids = {entry["saved_package_id"] for entry in entries if "saved_package_id" in entry}
+    saved = SavedPackage.objects.select_related("package").in_bulk(saved_ids)
+    missing = sorted(saved_ids - set(saved))
+    if missing:
+        return Response(
+            {"error": f"Saved packages not found: {', '.join(str(pk) for pk in missing)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    packages = [
+        saved[entry["saved_package_id"]].package if "saved_package_id" in entry else Package(**entry["package"])
+        for entry in entries
+    ]
+    results = []
+    for service_prices in ShippingQuoter.quote(
+        packages,
+        [entry["ship_from_zip"] for entry in entries],
+        [entry["ship_to_zip"] for entry in entries]
+    ):
+        cheapest = min(service_prices, key=lambda quote: quote[1], default=None)
+        results.append({
+            "quotes": ServiceQuoteSerializer(
+                [{"service": service, "price": price} for service, price in service_prices], many=True
+            ).data,
+            "cheapest_service_id": cheapest[0].id if cheapest else None,
+        })
+    return Response(results if many else results[0])
+
+
+class SparseFieldsViewMixin:
+    """
+    ?fields= and ?expand= on list and detail reads (see parse_fieldset).
+    
+    The parsed fieldset goes into the serializer context, and the queryset only joins
+    and loads what the remaining fields read.
+    """
+    
+    fieldset_actions = ("list", "retrieve")
+    
+    def get_fieldset(self):
+        if not hasattr(self, "_fieldset"):
+            self._fieldset = None
+            if self.action in self.fieldset_actions:
+                params = self.request.query_params
+                try:
+                    self._fieldset = parse_fieldset(
+                        self.get_serializer_class()(), params.get("fields", ""), params.get("expand", "")
+                    )
+                except ValueError as e:
+                    raise ValidationError({"error": str(e)})
+        return self._fieldset
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fieldset"] = self.get_fieldset()
+        return context
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.get_fieldset() is None:
+            return queryset
+        paths = self.get_serializer().read_paths()
+        if paths is None:
+            return queryset
+        related, only = paths
+        # Cursor pagination reads its ordering fields from each row
+        ordering = getattr(self.pagination_class, "ordering", None) or ()
+        ordering = [ordering] if isinstance(ordering, str) else list(ordering)
+        return queryset.select_related(None).select_related(*related).only(
+            *only, *(field.lstrip("-") for field in ordering)
+        )
+
+
+class ConditionalGetMixin:
+    """
+    ETags for list and detail reads, built from the CacheVersion counters named in
+    version_keys (see ResourceVersions). A request whose If-None-Match still matches gets
+    a 304 after one indexed lookup, without running the list query or the serializer.
+    """
+    version_keys = ()
+    
+    def get_versions(self) -> List[int]:
+        versions = ResourceVersions.current(self.version_keys)
+        return [versions[key] for key in self.version_keys]
+    
+    def not_modified(self, request):
+        """A 304 response if the client's copy is current, else None"""
+        versions = "-".join(str(version) for version in self.get_versions())
+        self.etag = f'W/"{versions}-{request.accepted_renderer.format}"'
+        return get_conditional_response(request, etag=self.etag)
+    
+    def list(self, request, *args, **kwargs):
+        response = self.not_modified(request)
+        return response if response is not None else super().list(request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        response = self.not_modified(request)
+        return response if response is not None else super().retrieve(request, *args, **kwargs)
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "etag", None) and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response["ETag"] = self.etag
+            # Let browsers keep the response but check it with If-None-Match before reuse
+            response["Cache-Control"] = "no-cache"
+        return response
+
+
+class AddressViewSet(SparseFieldsViewMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Address model"""
     queryset = Address.objects.all()
     serializer_class = AddressSerializer
+    version_keys = ("addresses",)
+    pagination_class = IdCursorPagination
     
     def create(self, request, *args, **kwargs):
         logger.info("Creating new address")
-        return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        # Reuse an existing address for the same recipient and location
+        address, created = Address.get_or_create_matching(serializer.validated_data)
+        if not created:
+            logger.info(f"Reusing existing address {address.id}")
+        
+        return Response(
+            self.get_serializer(address).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
     
     def update(self, request, *args, **kwargs):
         logger.info(f"Updating address {kwargs.get('pk')}")
         return super().update(request, *args, **kwargs)
 
 
-class PackageViewSet(viewsets.ModelViewSet):
+class PackageViewSet(SparseFieldsViewMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Package model"""
     queryset = Package.objects.all()
     serializer_class = PackageSerializer
+    version_keys = ("packages",)
+    pagination_class = IdCursorPagination
     
     def create(self, request, *args, **kwargs):
         logger.info("Creating new package")
@@ -64,10 +227,11 @@ class PackageViewSet(viewsets.ModelViewSet):
         return super().update(request, *args, **kwargs)
 
 
-class SavedAddressViewSet(viewsets.ModelViewSet):
+class SavedAddressViewSet(SparseFieldsViewMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for SavedAddress model"""
-    queryset = SavedAddress.objects.all()
+    queryset = SavedAddress.objects.select_related("address")
     serializer_class = SavedAddressSerializer
+    version_keys = ("saved_addresses", "addresses")
     
     def create(self, request, *args, **kwargs):
         logger.info("Creating saved address")
@@ -75,7 +239,14 @@ class SavedAddressViewSet(viewsets.ModelViewSet):
         address_serializer = AddressSerializer(data=address_data)
         
         if address_serializer.is_valid():
-            address = address_serializer.save()
+            address, created = Address.get_or_create_matching(address_serializer.validated_data)
+            
+            # An address can only be saved once; return the existing entry instead
+            existing = None if created else SavedAddress.objects.filter(address=address).first()
+            if existing:
+                logger.info(f"Address {address.id} is already saved as {existing.id}")
+                return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+            
             saved_address = SavedAddress.objects.create(
                 name=request.data.get("name"),
                 address=address
@@ -86,10 +257,11 @@ class SavedAddressViewSet(viewsets.ModelViewSet):
         return Response(address_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class SavedPackageViewSet(viewsets.ModelViewSet):
+class SavedPackageViewSet(SparseFieldsViewMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for SavedPackage model"""
-    queryset = SavedPackage.objects.all()
+    queryset = SavedPackage.objects.select_related("package")
     serializer_class = SavedPackageSerializer
+    version_keys = ("saved_packages", "packages")
     
     def create(self, request, *args, **kwargs):
         logger.info("Creating saved package")
@@ -108,21 +280,64 @@ class SavedPackageViewSet(viewsets.ModelViewSet):
         return Response(package_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ShippingServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class ShippingServiceViewSet(SparseFieldsViewMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for ShippingService model (read-only)"""
     queryset = ShippingService.objects.all()
     serializer_class = ShippingServiceSerializer
+    version_keys = (ServiceCatalog.VERSION_KEY,)
+
+
+class ImportJobViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet for background CSV import jobs (read-only progress reporting)"""
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
 
 
-class ShipmentViewSet(viewsets.ModelViewSet):
+class ShipmentViewSet(SparseFieldsViewMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Shipment model"""
-    queryset = Shipment.objects.all()
+    # The nested shipping service comes from ServiceCatalog, so it isn't joined
+    queryset = Shipment.objects.select_related("ship_from", "ship_to", "package")
     serializer_class = ShipmentSerializer
+    version_keys = ("shipments", "addresses", "packages")
+    pagination_class = CreatedCursorPagination
+    fieldset_actions = ("list", "retrieve", "changes")
+    
+    def list(self, request, *args, **kwargs):
+        """List shipments through ShipmentListSerializer (same JSON, much faster) unless SHIPMENT_FAST_LIST is off"""
+        if not getattr(settings, "SHIPMENT_FAST_LIST", True):
+            return super().list(request, *args, **kwargs)
+        
+        response = self.not_modified(request)
+        if response is not None:
+            return response
+        fieldset = self.get_fieldset()
+        rows = ShipmentListSerializer.rows(self.filter_queryset(self.get_queryset()), fieldset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(ShipmentListSerializer.to_representation(page, fieldset))
+        return Response(ShipmentListSerializer.to_representation(rows, fieldset))
+    
+    def get_versions(self):
+        # Nested services come from this process's catalog, so tag the version it has loaded
+        return super().get_versions() + [ServiceCatalog.version()]
+    
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action == "changes" or self.action == "list" and getattr(settings, "SHIPMENT_FAST_LIST", True):
+            # List data has no floats, so orjson output matches JSONRenderer's byte for byte
+            renderers = [FastJSONRenderer() if type(renderer) is JSONRenderer else renderer for renderer in renderers]
+        return renderers
     
     def create(self, request, *args, **kwargs):
         logger.info("Creating new shipment")
         return super().create(request, *args, **kwargs)
     
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            ShipmentChangefeed.record_deletes([instance.id])
+            super().perform_destroy(instance)
+        ResourceVersions.mark(Shipment)
+    
     def update(self, request, *args, **kwargs):
         logger.info(f"Updating shipment {kwargs.get('pk')}")
         instance = self.get_object()
@@ -130,6 +345,9 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         # If shipping service is updated, recalculate price
         if "shipping_service_id" in request.data:
             instance.shipping_service_id = request.data["shipping_service_id"]
+            service = ServiceCatalog.get(instance.shipping_service_id)
+            if service is not None:
+                instance.shipping_service = service
             instance.calculate_shipping_price()
         
         serializer = self.get_serializer(instance, data=request.data, partial=True)
@@ -138,6 +356,105 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.data)
     
+    @staticmethod
+    def _filter_shipments(queryset, params):
+        """
+        Narrow a shipment queryset with the optional ids, status, order_number,
+        shipping_service, created_after and created_before query parameters.
+        Raises ValueError for malformed values.
+        """
+        if params.get("ids"):
+            queryset = queryset.filter(id__in=[int(value) for value in params["ids"].split(",")])
+        if params.get("status"):
+            queryset = queryset.filter(status__in=params["status"].split(","))
+        if params.get("order_number"):
+            queryset = queryset.filter(order_number=params["order_number"])
+        if params.get("shipping_service"):
+            queryset = queryset.filter(shipping_service_id=int(params["shipping_service"]))
+        for param, lookup in (("created_after", "created_at__gte"), ("created_before", "created_at__lt")):
+            if params.get(param):
+                queryset = queryset.filter(**{lookup: ShipmentViewSet._parse_created(param, params[param])})
+        return queryset
+    
+    @staticmethod
+    def _parse_created(param, raw):
+        """Parse a created_after/created_before date or datetime as an aware datetime"""
+        value = parse_datetime(raw)
+        if value is None:
+            day = parse_date(raw)
+            if day is None:
+                raise ValueError(f"Invalid {param}: {raw}")
+            value = datetime.combine(day, datetime.min.time())
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+    
+    @staticmethod
+    def _summary_filters(params):
+        """
+        The same filters as ShipmentTotals.from_summary arguments, or None when they need a
+        real query (ids, order_number, or created_after/created_before not at midnight).
+        """
+        if params.get("ids") or params.get("order_number"):
+            return None
+        filters = {
+            "statuses": params["status"].split(",") if params.get("status") else None,
+            "service_id": int(params["shipping_service"]) if params.get("shipping_service") else None,
+        }
+        for param, key in (("created_after", "start_day"), ("created_before", "end_day")):
+            filters[key] = None
+            if params.get(param):
+                value = timezone.localtime(ShipmentViewSet._parse_created(param, params[param]))
+                if value.time() != datetime.min.time():
+                    return None
+                filters[key] = value.date()
+        return filters
+    
+    def _export(self, request, content, content_type, extension):
+        try:
+            queryset = self._filter_shipments(Shipment.objects.all(), request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        logger.info(f"Streaming shipment export as {extension}")
+        response = StreamingHttpResponse(content(queryset), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="shipments.{extension}"'
+        return response
+    
+    @action(detail=False, methods=["get"])
+    def export_csv(self, request):
+        """Stream shipments as CSV in the Template.csv layout, so exports can be re-imported"""
+        return self._export(request, ShipmentExporter.iter_csv, "text/csv", "csv")
+    
+    @action(detail=False, methods=["get"])
+    def export_ndjson(self, request):
+        """Stream shipments as newline-delimited JSON"""
+        return self._export(request, ShipmentExporter.iter_ndjson, "application/x-ndjson", "ndjson")
+    
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """
+        Shipments created, updated or deleted since ?since=<cursor>, up to page_size at a time.
+        Without since, returns a cursor to take before loading the full list.
+        """
+        since = request.query_params.get("since")
+        if not since:
+            return Response({"cursor": ShipmentChangefeed.start(), "has_more": False, "changed": [], "deleted": []})
+        
+        try:
+            result = ShipmentChangefeed.changes(since, self.paginator.get_page_size(request), self.get_fieldset())
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ExpiredCursorError as e:
+            return Response({"error": str(e)}, status=status.HTTP_410_GONE)
+        return Response(result)
+    
+    @staticmethod
+    def _flag(request, name):
+        """Read a boolean option from the query string or the form body"""
+        value = request.query_params.get(name, request.data.get(name, ""))
+        return str(value).lower() in ("1", "true", "yes")
+    
     @action(detail=False, methods=["post"], parser_classes=[MultiPartParser, FormParser], url_path="upload_csv")
     def upload_csv(self, request):
         """Upload and parse CSV file"""
@@ -150,109 +467,59 @@ class ShipmentViewSet(viewsets.ModelViewSet):
             )
         
         file = request.FILES["file"]
+        # In streaming mode the created shipments are not echoed back, so memory use
+        # is bounded by the import batch size instead of the file size
+        stream = self._flag(request, "stream")
+        # In upsert mode rows update the shipment with the same order number, and
+        # unpurchased_only leaves purchased shipments out of the matching
+        upsert = self._flag(request, "upsert")
+        unpurchased_only = self._flag(request, "unpurchased_only")
+        
+        if self._flag(request, "async"):
+            # Store the upload and let run_import_worker process it in the background
+            job = ImportJob.objects.create(
+                file=file,
+                original_name=file.name,
+                upsert=upsert,
+                unpurchased_only=unpurchased_only
+            )
+            logger.info(f"Queued import job {job.id} for {file.name} ({file.size} bytes)")
+            return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
         
         try:
-            # Read file content - try different encodings
-            try:
-                file_content = file.read().decode("utf-8")
-            except UnicodeDecodeError:
-                try:
-                    file.seek(0)  # Reset file pointer
-                    file_content = file.read().decode("utf-8-sig")  # Handle BOM
-                except UnicodeDecodeError:
-                    file.seek(0)
-                    file_content = file.read().decode("latin-1")  # Fallback encoding
-            
-            logger.info(f"CSV file read successfully, size: {len(file_content)} bytes")
+            logger.info(f"CSV file received, size: {file.size} bytes")
             
-            # Parse CSV
-            parser = CSVParser()
-            shipments_data, errors = parser.parse_csv(file_content)
+            # Parse and create shipments batch by batch, in one transaction so that a parse
+            # error part-way through the file leaves nothing behind
+            importer = ShipmentImporter(keep_shipments=not stream, upsert=upsert, unpurchased_only=unpurchased_only)
+            importer.import_file(file, atomic=True)
             
-            if not shipments_data:
+            if not importer.parsed_count:
                 return Response(
-                    {"error": "No valid shipments found in CSV", "errors": errors},
+                    {"error": "No valid shipments found in CSV", "errors": importer.parse_errors},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Create shipments
-            created_shipments = []
-            creation_errors = []
-            
-            with transaction.atomic():
-                for idx, shipment_data in enumerate(shipments_data):
-                    try:
-                        # Create or get addresses
-                        ship_to_data = shipment_data["ship_to"]
-                        
-                        # Check if ship_to address already exists
-                        ship_to = Address.objects.filter(
-                            address_line1=ship_to_data["address_line1"],
-                            city=ship_to_data["city"],
-                            zip_code=ship_to_data["zip_code"]
-                        ).first()
-                        
-                        if not ship_to:
-                            ship_to = Address.objects.create(**ship_to_data)
-                        else:
-                            # Update existing address with new data
-                            for key, value in ship_to_data.items():
-                                setattr(ship_to, key, value)
-                            ship_to.save()
-                        
-                        ship_from = None
-                        if shipment_data.get("ship_from") and shipment_data["ship_from"].get("address_line1"):
-                            ship_from_data = shipment_data["ship_from"]
-                            
-                            # Check if ship_from address already exists
-                            ship_from = Address.objects.filter(
-                                address_line1=ship_from_data["address_line1"],
-                                city=ship_from_data["city"],
-                                zip_code=ship_from_data["zip_code"]
-                            ).first()
-                            
-                            if not ship_from:
-                                ship_from = Address.objects.create(**ship_from_data)
-                            else:
-                                # Update existing address with new data
-                                for key, value in ship_from_data.items():
-                                    setattr(ship_from, key, value)
-                                ship_from.save()
-                        
-                        # Create package
-                        package_data = shipment_data["package"]
-                        package = Package.objects.create(**package_data)
-                        
-                        # Create shipment
-                        shipment = Shipment.objects.create(
-                            ship_from=ship_from,
-                            ship_to=ship_to,
-                            package=package,
-                            order_number=shipment_data["order_number"],
-                            status="pending"
-                        )
-                        created_shipments.append(shipment)
-                        
-                    except Exception as e:
-                        error_msg = f"Error creating shipment {idx + 1}: {str(e)}"
-                        logger.error(error_msg)
-                        creation_errors.append(error_msg)
-                        continue
-            
-            logger.info(f"Successfully created {len(created_shipments)} shipments from CSV")
+            logger.info(
+                f"Successfully created {importer.created_count} and updated {importer.updated_count} shipments from CSV"
+            )
             
-            if not created_shipments:
+            if not (importer.created_count or importer.updated_count or importer.unchanged_count):
                 return Response(
-                    {"error": "Failed to create any shipments", "errors": errors + creation_errors},
+                    {"error": "Failed to create any shipments", "errors": importer.errors},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            serializer = ShipmentSerializer(created_shipments, many=True)
-            return Response({
-                "shipments": serializer.data,
-                "count": len(created_shipments),
-                "errors": errors + creation_errors
-            }, status=status.HTTP_201_CREATED)
+            response_data = {}
+            if not stream:
+                response_data["shipments"] = ShipmentSerializer(importer.created_shipments, many=True).data
+            response_data["count"] = importer.created_count
+            if upsert:
+                response_data["updated"] = importer.updated_count
+                response_data["unchanged"] = importer.unchanged_count
+                response_data["duplicates"] = importer.duplicate_count
+            response_data["errors"] = importer.errors
+            return Response(response_data, status=status.HTTP_201_CREATED)
             
         except CSVParseError as e:
             logger.error(f"CSV parsing error: {str(e)}")
@@ -286,11 +553,21 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         is_valid, validated_data, error = AddressValidator.validate_address(address_data)
         
         if is_valid:
-            # Update address with validated data
-            for key, value in validated_data.items():
-                if key != "id" and hasattr(address, key):
-                    setattr(address, key, value)
-            address.save()
+            # A corrected address may now match one that is already stored; point the
+            # shipment at that one, as bulk validation does, instead of a duplicate
+            corrected = dict(address_data, **validated_data)
+            existing = Address.objects.filter(
+                fingerprint=Address.fingerprint_for(corrected)
+            ).exclude(pk=address.pk).first()
+            if existing:
+                address = existing
+                setattr(shipment, "ship_from" if address_type == "from" else "ship_to", existing)
+            else:
+                # Update address with validated data
+                for key, value in validated_data.items():
+                    if key != "id" and hasattr(address, key):
+                        setattr(address, key, value)
+                address.save()
             shipment.status = "validated"
             shipment.save()
         
@@ -300,6 +577,52 @@ class ShipmentViewSet(viewsets.ModelViewSet):
             "error": error
         })
     
+    @action(detail=False, methods=["post"])
+    def bulk_validate_addresses(self, request):
+        """
+        Validate the addresses of many shipments in one request.
+        
+        Takes ids (a list) and/or the export filters (status, order_number,
+        shipping_service, created_after, created_before) in the body or query string, and
+        types: ["to", "from"] (the default). Each distinct address is validated once.
+        """
+        params = request.query_params.dict()
+        params.update({key: value for key, value in request.data.items() if key not in ("ids", "types")})
+        ids = request.data.get("ids")
+        if isinstance(ids, list):
+            params["ids"] = ",".join(str(value) for value in ids)
+        elif ids:
+            params["ids"] = str(ids)
+        
+        filters = ("ids", "status", "order_number", "shipping_service", "created_after", "created_before")
+        if not any(params.get(name) for name in filters):
+            return Response(
+                {"error": "Provide shipment ids or a filter"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        address_types = request.data.get("types") or ["to", "from"]
+        if isinstance(address_types, str):
+            address_types = address_types.split(",")
+        if any(address_type not in ShipmentAddressValidator.ADDRESS_TYPES for address_type in address_types):
+            return Response(
+                {"error": 'types must contain only "to" and "from"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            queryset = self._filter_shipments(Shipment.objects.all(), params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        summary = ShipmentAddressValidator.validate_shipments(queryset, address_types)
+        valid = sum(1 for entry in summary if entry["is_valid"])
+        return Response({
+            "validated": valid,
+            "failed": len(summary) - valid,
+            "shipments": summary,
+        })
+    
     @action(detail=False, methods=["post"])
     def bulk_update(self, request):
         """Bulk update shipments"""
@@ -329,7 +652,11 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         
         logger.info(f"Bulk deleting {len(shipment_ids)} shipments")
         
-        deleted_count, _ = Shipment.objects.filter(id__in=shipment_ids).delete()
+        with transaction.atomic():
+            shipments = Shipment.objects.filter(id__in=shipment_ids)
+            ShipmentChangefeed.record_deletes(shipments.values_list("id", flat=True))
+            deleted_count, _ = shipments.delete()
+        ResourceVersions.mark(Shipment)
         
         logger.info(f"Successfully deleted {deleted_count} shipments")
         return Response({"deleted": deleted_count})
@@ -344,15 +671,15 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         logger.info(f"Bulk updating shipping service for {len(shipment_ids)} shipments")
         
         if service_option == "cheapest":
-            # Get cheapest service
-            services = ShippingService.objects.all()
-            cheapest_service = min(services, key=lambda s: float(s.base_price))
-            service_id = cheapest_service.id
+            # Rate-shop: each shipment gets whichever service prices it lowest
+            result = ShipmentRepricer.apply_cheapest(list(shipment_ids))
+            logger.info(f"Rate-shopped {result['updated']} shipments: {result['services']}, saving {result['savings']:.2f}")
+            return Response(result)
         elif service_option == "priority":
-            service = ShippingService.objects.filter(name="priority").first()
+            service = ServiceCatalog.by_name("priority")
             service_id = service.id if service else None
         elif service_option == "ground":
-            service = ShippingService.objects.filter(name="ground").first()
+            service = ServiceCatalog.by_name("ground")
             service_id = service.id if service else None
         
         if not service_id:
@@ -361,23 +688,37 @@ class ShipmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        shipments = Shipment.objects.filter(id__in=shipment_ids)
-        updated_count = 0
+        service = ServiceCatalog.get(service_id)
+        if service is None:
+            return Response(
+                {"error": "Invalid service option"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        with transaction.atomic():
-            for shipment in shipments:
-                shipment.shipping_service_id = service_id
-                shipment.calculate_shipping_price()
-                updated_count += 1
+        updated_count = ShipmentRepricer.apply_service(list(shipment_ids), service)
         
         logger.info(f"Successfully updated shipping service for {updated_count} shipments")
         return Response({"updated": updated_count})
     
     @action(detail=False, methods=["get"])
     def total_price(self, request):
-        """Calculate total price for all shipments"""
-        shipments = Shipment.objects.filter(shipping_price__isnull=False)
-        total = sum(float(s.shipping_price) for s in shipments)
+        """
+        Total price of priced shipments, narrowed by the export filters.
+        
+        breakdown=status,service adds per-status and per-service totals. The ShipmentTotal
+        summary answers when it is enabled and the filters allow it; otherwise the totals
+        are aggregated in the database.
+        """
+        params = request.query_params
+        breakdown = [value for value in params.get("breakdown", "").split(",") if value]
+        try:
+            filters = self._summary_filters(params) if ShipmentTotals.enabled() else None
+            if filters is not None:
+                result = ShipmentTotals.from_summary(breakdown=breakdown, **filters)
+            else:
+                result = ShipmentTotals.from_queryset(self._filter_shipments(Shipment.objects.all(), params), breakdown)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        logger.info(f"Calculated total price: ${total:.2f}")
-        return Response({"total": round(total, 2)})
+        logger.info(f"Calculated total price: ${result['total']:.2f}")
+        return Response(result)
@@ -139,6 +139,10 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Uploaded files (background CSV imports are stored here until processed)
+MEDIA_URL = "media/"
+MEDIA_ROOT = Path(os.environ.get("MEDIA_ROOT", BASE_DIR / "media"))
+
 # WhiteNoise for static files in production
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
@@ -159,6 +163,20 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cursor pagination for the shipment, address and package lists (see shipping/pagination.py).
+# Clients can ask for up to LIST_MAX_PAGE_SIZE rows with ?page_size=
+LIST_PAGE_SIZE = int(os.environ.get("LIST_PAGE_SIZE", 100))
+LIST_MAX_PAGE_SIZE = int(os.environ.get("LIST_MAX_PAGE_SIZE", 1000))
+
+# Serve shipment lists through ShipmentListSerializer and orjson (same JSON as ShipmentSerializer)
+SHIPMENT_FAST_LIST = os.environ.get("SHIPMENT_FAST_LIST", "true").lower() == "true"
+
+# Shipment changefeed (/api/shipments/changes/): caught-up cursors trail now by CHANGEFEED_LAG
+# seconds so late-committing writes are not skipped, and deletes are reported for
+# CHANGEFEED_RETENTION_DAYS (see prune_shipment_tombstones)
+CHANGEFEED_LAG = int(os.environ.get("CHANGEFEED_LAG", 5))
+CHANGEFEED_RETENTION_DAYS = int(os.environ.get("CHANGEFEED_RETENTION_DAYS", 7))
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -214,3 +232,91 @@ LOGGING = {
         },
     },
 }
+
+# CSV import settings
+# Uploads are decoded in chunks of CSV_IMPORT_CHUNK_SIZE bytes and persisted in
+# batches of CSV_IMPORT_BATCH_SIZE rows, which bounds memory use per upload
+CSV_IMPORT_CHUNK_SIZE = int(os.environ.get("CSV_IMPORT_CHUNK_SIZE", 64 * 1024))
+CSV_IMPORT_BATCH_SIZE = int(os.environ.get("CSV_IMPORT_BATCH_SIZE", 1000))
+
+# Maximum number of row errors stored on a background ImportJob
+IMPORT_JOB_MAX_ERRORS = int(os.environ.get("IMPORT_JOB_MAX_ERRORS", 1000))
+
+# A running ImportJob that has not reported progress (after each batch) for this
+# many seconds is assumed to have lost its worker and is marked failed
+IMPORT_JOB_STALE_SECONDS = int(os.environ.get("IMPORT_JOB_STALE_SECONDS", 600))
+
+# Files on disk at least this large are parsed across a process pool
+# (set CSV_PARALLEL_PARSE_WORKERS=1 to always parse serially)
+CSV_PARALLEL_PARSE_THRESHOLD = int(os.environ.get("CSV_PARALLEL_PARSE_THRESHOLD", 32 * 1024 * 1024))
+CSV_PARALLEL_PARSE_WORKERS = int(os.environ.get("CSV_PARALLEL_PARSE_WORKERS", os.cpu_count() or 1))
+CSV_PARALLEL_SEGMENT_SIZE = int(os.environ.get("CSV_PARALLEL_SEGMENT_SIZE", 4 * 1024 * 1024))
+
+# Rows fetched from the database (and flushed to the client) per chunk when exporting
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 2000))
+
+# Zone x weight-break rate tables (see shipping/rates.py). Services without a table, or
+# shipments whose zone can't be found, use the linear base + per-oz pricing. Shipments
+# without a ship from address are zoned from RATE_DEFAULT_ORIGIN_ZIP.
+RATE_TABLES_DIR = Path(os.environ.get("RATE_TABLES_DIR", BASE_DIR / "rates"))
+RATE_DEFAULT_ORIGIN_ZIP = os.environ.get("RATE_DEFAULT_ORIGIN_ZIP", "")
+
+# How often (seconds) each process checks whether shipping services or rate table
+# files changed elsewhere (see shipping/catalog.py)
+CATALOG_CHECK_INTERVAL = float(os.environ.get("CATALOG_CHECK_INTERVAL", 5))
+
+# Keep the ShipmentTotal summary table up to date so total_price is a constant-time read.
+# Run "python manage.py rebuild_shipment_totals" after turning it on (needs a restart)
+SHIPMENT_TOTALS_ENABLED = os.environ.get("SHIPMENT_TOTALS_ENABLED", "false").lower() == "true"
+
+# POST /api/quotes/: packages per request, and how many memoized prices each process keeps
+QUOTE_MAX_PACKAGES = int(os.environ.get("QUOTE_MAX_PACKAGES", 1000))
+QUOTE_CACHE_SIZE = int(os.environ.get("QUOTE_CACHE_SIZE", 10000))
+
+# Address validation providers. Without credentials the validator only checks
+# that the required fields are present.
+USPS_API_URL = os.environ.get("USPS_API_URL", "https://secure.shippingapis.com/ShippingAPI.dll")
+USPS_USER_ID = os.environ.get("USPS_USER_ID", "")
+SMARTY_API_URL = os.environ.get("SMARTY_API_URL", "https://us-street.api.smartystreets.com/street-address")
+SMARTY_AUTH_ID = os.environ.get("SMARTY_AUTH_ID", "")
+SMARTY_AUTH_TOKEN = os.environ.get("SMARTY_AUTH_TOKEN", "")
+
+# Providers tried in order, and addresses sent per request by validate_bulk_addresses
+# (USPS Verify accepts up to 5 per request, SmartyStreets up to 100)
+ADDRESS_VALIDATION_PROVIDERS = os.environ.get("ADDRESS_VALIDATION_PROVIDERS", "usps,smarty").split(",")
+ADDRESS_VALIDATION_BATCH_SIZES = {"usps": 5, "smarty": 100}
+
+# Offline ZIP5 -> city/state index (built with `manage.py build_zip_index`) checked before
+# any provider call. Validation skips this tier if the file doesn't exist.
+ZIP_INDEX_PATH = Path(os.environ.get("ZIP_INDEX_PATH", BASE_DIR / "data" / "zip_index.bin"))
+
+# Per-provider request timeouts (seconds) and rate limits (requests per second)
+ADDRESS_VALIDATION_TIMEOUTS = {"usps": 5.0, "smarty": 5.0}
+ADDRESS_VALIDATION_RATE_LIMITS = {"usps": 20, "smarty": 50}
+# Provider requests in flight at once in validate_bulk_addresses, and its overall deadline (seconds)
+ADDRESS_VALIDATION_CONCURRENCY = int(os.environ.get("ADDRESS_VALIDATION_CONCURRENCY", 16))
+ADDRESS_VALIDATION_BULK_DEADLINE = float(os.environ.get("ADDRESS_VALIDATION_BULK_DEADLINE", 120))
+# Keep-alive connections per provider and how long (seconds) a request waits for a free
+# one, retries for transient errors (with jittered exponential backoff from RETRY_BACKOFF
+# seconds), and the circuit breaker that skips a provider for BREAKER_RESET seconds after
+# BREAKER_THRESHOLD consecutive failures (5xx responses, timeouts and connection errors)
+ADDRESS_VALIDATION_POOL_SIZE = int(os.environ.get("ADDRESS_VALIDATION_POOL_SIZE", ADDRESS_VALIDATION_CONCURRENCY))
+ADDRESS_VALIDATION_POOL_TIMEOUT = float(os.environ.get("ADDRESS_VALIDATION_POOL_TIMEOUT", 2))
+ADDRESS_VALIDATION_RETRIES = int(os.environ.get("ADDRESS_VALIDATION_RETRIES", 2))
+ADDRESS_VALIDATION_RETRY_BACKOFF = 0.1
+ADDRESS_VALIDATION_BREAKER_THRESHOLD = int(os.environ.get("ADDRESS_VALIDATION_BREAKER_THRESHOLD", 5))
+ADDRESS_VALIDATION_BREAKER_RESET = float(os.environ.get("ADDRESS_VALIDATION_BREAKER_RESET", 30))
+# Hedged single-address validation: if the first provider hasn't answered within its p95
+# latency (DEFAULT_DELAY until enough samples exist), also ask the second provider. At most
+# MAX_RATE of calls are hedged.
+ADDRESS_VALIDATION_HEDGE_ENABLED = os.environ.get("ADDRESS_VALIDATION_HEDGE_ENABLED", "false").lower() == "true"
+ADDRESS_VALIDATION_HEDGE_DEFAULT_DELAY = 0.5
+ADDRESS_VALIDATION_HEDGE_MAX_RATE = float(os.environ.get("ADDRESS_VALIDATION_HEDGE_MAX_RATE", 0.1))
+
+# Validation results are cached per normalized address: in process (LRU, entries) and in
+# the AddressValidationResult table. Rejections use the shorter negative TTL (seconds);
+# the fallback returned while every provider is failing is not cached.
+ADDRESS_VALIDATION_CACHE_ENABLED = os.environ.get("ADDRESS_VALIDATION_CACHE_ENABLED", "true").lower() == "true"
+ADDRESS_VALIDATION_CACHE_SIZE = int(os.environ.get("ADDRESS_VALIDATION_CACHE_SIZE", 10000))
+ADDRESS_VALIDATION_CACHE_TTL = int(os.environ.get("ADDRESS_VALIDATION_CACHE_TTL", 30 * 24 * 3600))
+ADDRESS_VALIDATION_CACHE_NEGATIVE_TTL = int(os.environ.get("ADDRESS_VALIDATION_CACHE_NEGATIVE_TTL", 3600))